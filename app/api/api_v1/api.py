@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 from app.routers import auth
-from app.api.api_v1.routers import chat, users, students
+from app.api.api_v1.routers import chat, users, students, dashboard, training, knowledge
 
 api_router = APIRouter()
 
@@ -8,4 +8,7 @@ api_router = APIRouter()
 api_router.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 api_router.include_router(users.router, prefix="/users", tags=["Users"])
 api_router.include_router(students.router, prefix="/students", tags=["Students"])
-api_router.include_router(chat.router, prefix="/chat", tags=["chat"])
\ No newline at end of file
+api_router.include_router(chat.router, prefix="/chat", tags=["chat"])
+api_router.include_router(dashboard.router, prefix="/dashboard", tags=["Dashboard"])
+api_router.include_router(training.router, prefix="/training", tags=["Training"])
+api_router.include_router(knowledge.router, prefix="/knowledge", tags=["Knowledge"])
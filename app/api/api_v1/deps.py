@@ -1,12 +1,13 @@
-from typing import Generator, Optional
+from typing import AsyncGenerator, Generator, Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from pydantic import ValidationError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import Settings
-from app.database.session import SessionLocal
+from app.database.session import SessionLocal, AsyncSessionLocal
+from app.core.principal_cache import Principal, principal_cache
 from app.models.user import User
 from app.shared.enums import UserRole
 
@@ -27,11 +28,15 @@ def get_db() -> Generator:
     finally:
         db.close()
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """Dependency để lấy AsyncSession (dùng cho route async def)"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def get_current_user(
-    db: Session = Depends(get_db),
     token: str = Depends(reusable_oauth2)
-) -> User:
-    """Giải mã token và lấy User hiện tại"""
+) -> Principal:
+    """Giải mã token và lấy principal (id, role, is_active) của user hiện tại"""
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
@@ -48,25 +53,33 @@ def get_current_user(
             detail="Could not validate credentials",
         )
     
-    # Lấy user từ DB dựa trên email hoặc ID (tùy vào cách bạn gen token ở auth.py)
-    # Ở đây giả sử "sub" chứa user_id. Nếu "sub" chứa email thì đổi thành filter(User.email == token_data)
-    user = db.query(User).filter(User.id == token_data).first()
+    # Ưu tiên lấy từ cache, chỉ truy vấn DB khi cache miss (hoặc hết TTL)
+    principal = principal_cache.get(token_data)
+    if principal is not None:
+        return principal
+
+    # Ở đây giả sử "sub" chứa user_id. Chỉ lấy các cột cần cho phân quyền
+    with SessionLocal() as db:
+        row = db.query(User.id, User.role, User.is_active).filter(User.id == token_data).first()
     
-    if not user:
+    if not row:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+
+    principal = Principal(id=row.id, role=row.role, is_active=row.is_active)
+    principal_cache.set(principal.id, principal)
+    return principal
 
 def get_current_active_user(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: Principal = Depends(get_current_user),
+) -> Principal:
     """Kiểm tra user có đang active không"""
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
 def get_current_active_superuser(
-    current_user: User = Depends(get_current_active_user),
-) -> User:
+    current_user: Principal = Depends(get_current_active_user),
+) -> Principal:
     """Chỉ cho phép Admin"""
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(
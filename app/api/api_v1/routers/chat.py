@@ -1,29 +1,37 @@
-from fastapi import APIRouter, Depends, Query, HTTPException, UploadFile, File, Form, status
+from fastapi import APIRouter, Depends, Query, HTTPException, Response, UploadFile, File, Form, status
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
 from app.api.api_v1 import deps
-from app.services.chat_service import ChatService
+from app.services.chat_service import ChatService, AsyncChatService
 from app.services.file_service import FileService
-from app.schemas.chat_schema import ConversationResponse, PaginatedMessagesResponse
+from app.schemas.chat_schema import ConversationResponse, PaginatedMessagesResponse, CursorMessagesResponse
 from app.shared.enums import ChatStatus, MessageType
-from app.models.user import User
+from app.core.principal_cache import Principal
+from app.rag.semantic_cache import get_semantic_cache
 
 router = APIRouter()
 
 @router.get("/conversations", response_model=List[ConversationResponse])
 def get_conversations(
+    response: Response,
     status: Optional[ChatStatus] = None,
-    limit: int = 20,
+    limit: int = Query(20, ge=1, le=100),
+    before: Optional[str] = Query(None, description="Cursor trang trước (lấy từ header X-Next-Cursor)"),
     db: Session = Depends(deps.get_db),
     # Đổi tên thành _current_user để tránh cảnh báo unused variable
-    _current_user: User = Depends(deps.get_current_active_superuser) 
+    _current_user: Principal = Depends(deps.get_current_active_superuser) 
 ):
     """
-    Web Admin: Lấy danh sách hội thoại.
+    Web Admin: Lấy danh sách hội thoại (kèm preview tin nhắn cuối, số tin chưa đọc).
+    Cursor trang tiếp theo trả về trong header X-Next-Cursor.
     """
     service = ChatService(db)
-    return service.get_conversations(status, limit)
+    items, next_cursor = service.get_conversations(status, limit, before)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
 
 @router.get("/conversations/{conversation_id}/messages", response_model=PaginatedMessagesResponse)
 def get_messages(
@@ -31,7 +39,7 @@ def get_messages(
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
     db: Session = Depends(deps.get_db),
-    _current_user: User = Depends(deps.get_current_active_user)
+    _current_user: Principal = Depends(deps.get_current_active_user)
 ):
     """
     Lấy lịch sử tin nhắn chi tiết.
@@ -46,37 +54,66 @@ def get_messages(
         items=result["items"]
     )
 
+@router.get("/conversations/{conversation_id}/messages/cursor", response_model=CursorMessagesResponse)
+def get_messages_cursor(
+    conversation_id: str,
+    before: Optional[str] = Query(None, description="Cursor để tải các tin nhắn cũ hơn"),
+    after: Optional[str] = Query(None, description="Cursor để tải các tin nhắn mới hơn"),
+    size: int = Query(20, ge=1, le=100),
+    include_total: bool = False,
+    db: Session = Depends(deps.get_db),
+    _current_user: Principal = Depends(deps.get_current_active_user)
+):
+    """
+    Lấy lịch sử tin nhắn theo cursor (keyset pagination).
+    Endpoint phân trang theo page/size cũ vẫn giữ nguyên cho client đời cũ.
+    """
+    service = ChatService(db)
+    return service.get_messages_cursor(conversation_id, size, before, after, include_total)
+
 @router.post("/conversations/{conversation_id}/assign")
 async def assign_agent(
     conversation_id: str,
     agent_id: str = Query(..., description="ID của Admin/Agent được gán"),
-    db: Session = Depends(deps.get_db),
-    _current_user: User = Depends(deps.get_current_active_superuser)
+    db: AsyncSession = Depends(deps.get_async_db),
+    _current_user: Principal = Depends(deps.get_current_active_superuser)
 ):
     """
     Web Admin: Gán Agent.
     """
-    service = ChatService(db)
+    service = AsyncChatService(db)
     return await service.assign_agent(conversation_id, agent_id)
 
+@router.post("/conversations/{conversation_id}/read")
+async def mark_conversation_read(
+    conversation_id: str,
+    db: AsyncSession = Depends(deps.get_async_db),
+    _current_user: Principal = Depends(deps.get_current_active_superuser)
+):
+    """
+    Web Admin: Đánh dấu đã đọc hội thoại (reset unread_count).
+    """
+    service = AsyncChatService(db)
+    return await service.mark_read(conversation_id)
+
 @router.put("/conversations/{conversation_id}/status")
 async def update_status(
     conversation_id: str,
     status: ChatStatus,
-    db: Session = Depends(deps.get_db),
-    _current_user: User = Depends(deps.get_current_active_superuser)
+    db: AsyncSession = Depends(deps.get_async_db),
+    _current_user: Principal = Depends(deps.get_current_active_superuser)
 ):
     """
     Web Admin: Cập nhật trạng thái hội thoại.
     """
-    service = ChatService(db)
+    service = AsyncChatService(db)
     return await service.update_status(conversation_id, status)
 
 @router.post("/upload", response_model=dict)
 async def upload_chat_file(
     file: UploadFile = File(...),
     type: MessageType = Form(MessageType.IMAGE),
-    _current_user: User = Depends(deps.get_current_active_user)
+    _current_user: Principal = Depends(deps.get_current_active_user)
 ):
     """
     Upload ảnh/file khi chat.
@@ -97,7 +134,7 @@ async def upload_chat_file(
         ]
 
     try:
-        file_url = await file_service.save_file(
+        stored = await file_service.store_file(
             file=file, 
             sub_folder=sub_folder, 
             allowed_types=allowed_types
@@ -108,7 +145,29 @@ async def upload_chat_file(
         raise HTTPException(status_code=500, detail="Upload failed")
     
     return {
-        "url": file_url,
+        "url": stored.url,
         "type": type.value,
-        "filename": file.filename
-    }
\ No newline at end of file
+        "filename": file.filename,
+        "size": stored.size,
+        "sha256": stored.sha256,
+        # URL ảnh thumb/medium (tạo nền sau upload, hoặc lazy khi request lần đầu)
+        "derivatives": file_service.schedule_derivatives(stored.url) if type == MessageType.IMAGE else None
+    }
+
+@router.get("/bot/semantic-cache/stats")
+def read_semantic_cache_stats(
+    _current_user: Principal = Depends(deps.get_current_active_superuser)
+):
+    """
+    Web Admin: Tỉ lệ câu hỏi được trả lời từ semantic cache (worker hiện tại).
+    """
+    return get_semantic_cache().stats()
+
+@router.delete("/bot/semantic-cache", status_code=status.HTTP_204_NO_CONTENT)
+def clear_semantic_cache(
+    _current_user: Principal = Depends(deps.get_current_active_superuser)
+):
+    """
+    Web Admin: Xóa toàn bộ câu trả lời đã cache (worker hiện tại).
+    """
+    get_semantic_cache().clear()
@@ -1 +1,31 @@
-# Admin dashboard endpoints placeholder
+from fastapi import APIRouter, Depends, Query
+
+from app.api.api_v1 import deps
+from app.core.principal_cache import Principal
+from app.services.dashboard_metrics import dashboard_metrics, DASHBOARD_ROOM
+
+router = APIRouter()
+
+@router.get("/overview")
+async def get_overview(
+    hours: int = Query(24, ge=1, le=168, description="Số giờ gần nhất cho biểu đồ tin nhắn / thời gian phản hồi"),
+    _current_user: Principal = Depends(deps.get_current_active_superuser)
+):
+    """
+    Web Admin: Số liệu tổng quan (đọc từ bộ đếm cộng dồn, không quét bảng tin nhắn).
+    Cập nhật trực tiếp: join Socket.IO room "admin_dashboard" để nhận event `dashboard_update`.
+    """
+    overview = await dashboard_metrics.overview(hours)
+    return {**overview, "live_room": DASHBOARD_ROOM}
+
+@router.post("/rebuild")
+async def rebuild_counters(
+    days: int = Query(7, ge=1, le=90),
+    _current_user: Principal = Depends(deps.get_current_active_superuser)
+):
+    """
+    Web Admin: Tính lại bộ đếm từ dữ liệu gốc (khi số liệu bị lệch; lần đầu bật tính năng server tự dựng).
+    Chỉ chính xác khi server chạy một worker hoặc không có traffic chat: delta chưa flush
+    của các worker khác sẽ bị cộng thêm lên số vừa tính lại.
+    """
+    return await dashboard_metrics.rebuild(days)
@@ -1 +1,127 @@
-# CRUD for FAQ/Knowledge placeholder
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, Query, Request, Response, status
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.api.api_v1 import deps
+from app.core.principal_cache import Principal
+from app.rag.ingestion import ingest_article
+from app.schemas.rag_schema import (
+    KnowledgeArticleCreate, KnowledgeArticleListResponse, KnowledgeArticleResponse,
+    KnowledgeArticleUpdate, KnowledgeChangesResponse
+)
+from app.services.knowledge_service import KnowledgeService, article_etag, list_etag
+from app.shared.enums import ArticleStatus, UserRole
+
+router = APIRouter()
+
+def _not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Gắn ETag vào response; trả về 304 nếu If-None-Match của client khớp phiên bản hiện tại"""
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    response.headers.update(headers)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in tags or etag in tags:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return None
+
+def _is_admin(user: Principal) -> bool:
+    return user.role == UserRole.ADMIN
+
+@router.get("/articles", response_model=KnowledgeArticleListResponse)
+def get_articles(
+    request: Request,
+    response: Response,
+    category: Optional[str] = None,
+    faculty: Optional[str] = None,
+    status: Optional[ArticleStatus] = Query(None, description="Chỉ Admin, người dùng khác luôn là PUBLISHED"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_active_user)
+):
+    """
+    Danh sách bài viết (màn hình FAQ / Admin). Hỗ trợ If-None-Match -> 304 khi kho tri thức không đổi.
+    """
+    service = KnowledgeService(db)
+    is_admin = _is_admin(current_user)
+    not_modified = _not_modified(request, response, list_etag(service.current_version(), "a" if is_admin else "p"))
+    if not_modified:
+        return not_modified
+    return service.list_articles(category, faculty, status, limit, offset, include_unpublished=is_admin)
+
+@router.get("/articles/{article_id}", response_model=KnowledgeArticleResponse)
+def get_article(
+    article_id: str,
+    request: Request,
+    response: Response,
+    db: Session = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_active_user)
+):
+    """
+    Chi tiết bài viết. ETag = revision của bài, gửi lại qua If-None-Match để nhận 304.
+    """
+    article = KnowledgeService(db).get_article(article_id, include_unpublished=_is_admin(current_user))
+    return _not_modified(request, response, article_etag(article.revision)) or article
+
+@router.get("/changes", response_model=KnowledgeChangesResponse)
+def get_changes(
+    since: int = Query(0, ge=0, description="`version` trả về ở lần đồng bộ trước (0 = từ đầu)"),
+    limit: int = Query(200, ge=1, le=1000),
+    db: Session = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_active_user)
+):
+    """
+    Đồng bộ tăng dần: các bài viết thay đổi sau phiên bản `since`.
+    Bài đã xóa / không còn hiển thị trả về dạng deleted=true (với người dùng thường: chỉ bài đã từng
+    xuất bản, bài nháp không xuất hiện). Gọi tiếp với since=version khi has_more.
+    """
+    return KnowledgeService(db).get_changes(since, limit, include_unpublished=_is_admin(current_user))
+
+@router.post("/articles", response_model=KnowledgeArticleResponse, status_code=status.HTTP_201_CREATED)
+def create_article(
+    payload: KnowledgeArticleCreate,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(deps.get_db),
+    _current_user: Principal = Depends(deps.get_current_active_superuser)
+):
+    """
+    Web Admin: Tạo bài viết. Bài PUBLISHED được đưa vào index RAG ở background.
+    """
+    article = KnowledgeService(db).create_article(payload)
+    background_tasks.add_task(ingest_article, article)
+    response.headers["ETag"] = article_etag(article.revision)
+    return article
+
+@router.put("/articles/{article_id}", response_model=KnowledgeArticleResponse)
+def update_article(
+    article_id: str,
+    payload: KnowledgeArticleUpdate,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    if_match: Optional[str] = Header(None, description="ETag lúc mở bài, bài đã bị sửa bởi người khác -> 412"),
+    db: Session = Depends(deps.get_db),
+    _current_user: Principal = Depends(deps.get_current_active_superuser)
+):
+    """
+    Web Admin: Sửa bài viết / đổi trạng thái. Index RAG và semantic cache của bài được cập nhật ở background.
+    """
+    article = KnowledgeService(db).update_article(article_id, payload, if_match)
+    background_tasks.add_task(ingest_article, article)
+    response.headers["ETag"] = article_etag(article.revision)
+    return article
+
+@router.delete("/articles/{article_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_article(
+    article_id: str,
+    background_tasks: BackgroundTasks,
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(deps.get_db),
+    _current_user: Principal = Depends(deps.get_current_active_superuser)
+):
+    """
+    Web Admin: Xóa mềm bài viết (gỡ khỏi index RAG, client nhận deleted=true qua /changes).
+    """
+    article = KnowledgeService(db).delete_article(article_id, if_match)
+    background_tasks.add_task(ingest_article, article)
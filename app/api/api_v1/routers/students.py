@@ -5,7 +5,7 @@ from app.api.api_v1 import deps
 from app.schemas.user_schema import PaginatedStudentResponse, StudentProfileResponse
 from app.services.student_service import StudentService
 from app.shared.enums import AcademicStatus, UserRole
-from app.models.user import User
+from app.core.principal_cache import Principal
 
 router = APIRouter()
 
@@ -16,7 +16,7 @@ def read_students(
     keyword: Optional[str] = None,
     status: Optional[AcademicStatus] = None,
     db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_active_superuser), # Chỉ Admin mới xem được
+    current_user: Principal = Depends(deps.get_current_active_superuser), # Chỉ Admin mới xem được
 ):
     """
     Web Admin: Danh sách sinh viên, filter, paging
@@ -28,7 +28,7 @@ def read_students(
 def read_student_detail(
     user_id: str,
     db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_active_superuser),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
 ):
     """
     Web Admin: Xem chi tiết sinh viên cụ thể (Lịch sử, GPA...)
@@ -1 +1,84 @@
-# Endpoints for reviewing training candidates placeholder
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.api.api_v1 import deps
+from app.core.principal_cache import Principal
+from app.models.training import AITrainingCandidate
+from app.schemas.rag_schema import KnowledgeArticleCreate, TrainingCandidateListResponse, TrainingCandidateResponse, TrainingCandidateUpdate, TrainingMineRequest
+from app.services.knowledge_service import KnowledgeService
+from app.services.training_miner import mining_lock, run_mining_job
+from app.shared.enums import ArticleStatus, TrainingStatus
+
+router = APIRouter()
+
+@router.get("/candidates", response_model=TrainingCandidateListResponse)
+def get_candidates(
+    status: Optional[TrainingStatus] = TrainingStatus.NEW,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(deps.get_db),
+    _current_user: Principal = Depends(deps.get_current_active_superuser)
+):
+    """
+    Web Admin: Câu hỏi hay gặp chưa có trong kho tri thức, xếp theo điểm (hỏi nhiều + chưa bao phủ lên đầu).
+    """
+    query = db.query(AITrainingCandidate)
+    if status:
+        query = query.filter(AITrainingCandidate.status == status)
+    total = query.count()
+    items = (
+        query.order_by(AITrainingCandidate.score.desc(), AITrainingCandidate.id)
+        .offset(offset).limit(limit).all()
+    )
+    return TrainingCandidateListResponse(total=total, items=items)
+
+@router.post("/mine", status_code=status.HTTP_202_ACCEPTED)
+def mine_candidates(
+    background_tasks: BackgroundTasks,
+    payload: TrainingMineRequest = TrainingMineRequest(),
+    _current_user: Principal = Depends(deps.get_current_active_superuser)
+):
+    """
+    Web Admin: Chạy nền job khai thác log chat (kết quả ghi vào bảng ai_training_candidates).
+    """
+    if mining_lock.locked():
+        raise HTTPException(status_code=409, detail="Mining job is already running")
+    background_tasks.add_task(run_mining_job, payload.days)
+    return {"detail": "Mining job scheduled"}
+
+@router.patch("/candidates/{candidate_id}", response_model=TrainingCandidateResponse)
+def review_candidate(
+    candidate_id: str,
+    payload: TrainingCandidateUpdate,
+    db: Session = Depends(deps.get_db),
+    _current_user: Principal = Depends(deps.get_current_active_superuser)
+):
+    """
+    Web Admin: Duyệt / từ chối candidate. Duyệt kèm câu trả lời sẽ tạo bài viết DRAFT trong kho tri thức.
+    """
+    candidate = db.get(AITrainingCandidate, candidate_id)
+    if not candidate:
+        raise HTTPException(status_code=404, detail="Candidate not found")
+
+    if payload.question:
+        candidate.question = payload.question
+    if payload.answer is not None:
+        candidate.answer = payload.answer
+    candidate.status = payload.status
+
+    if payload.status == TrainingStatus.APPROVED and not candidate.article_id:
+        if not candidate.answer:
+            raise HTTPException(status_code=400, detail="Answer is required to approve a candidate")
+        article = KnowledgeService(db).create_article(KnowledgeArticleCreate(
+            title=candidate.question[:255],
+            content=candidate.answer,
+            category=payload.category,
+            faculty=payload.faculty,
+            status=ArticleStatus.DRAFT
+        ), commit=False)
+        candidate.article_id = article.id
+
+    db.commit()
+    db.refresh(candidate)
+    return candidate
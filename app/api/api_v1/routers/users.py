@@ -3,15 +3,16 @@ from fastapi import APIRouter, Depends, UploadFile, File, Form, status
 from sqlalchemy.orm import Session
 from app.api.api_v1 import deps
 from app.schemas.user_schema import StudentProfileResponse, UpdateProfileRequest
+from app.services.auth_service import AuthService
 from app.services.student_service import StudentService
-from app.models.user import User
+from app.core.principal_cache import Principal, principal_cache
 
 router = APIRouter()
 
 @router.get("/me", response_model=StudentProfileResponse)
 def read_user_me(
     db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ):
     """
     Mobile: Lấy thông tin cá nhân (Profile) của user đang đăng nhập.
@@ -29,7 +30,7 @@ async def update_user_me(
     avatar: Optional[UploadFile] = File(None),
     
     db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ):
     """
     Mobile: Cập nhật thông tin cá nhân và Avatar.
@@ -40,4 +41,25 @@ async def update_user_me(
     
     # 2. Gọi Service xử lý (Service sẽ lo việc lưu file avatar nếu có)
     service = StudentService(db)
-    return await service.update_profile(current_user.id, update_data, avatar)
\ No newline at end of file
+    return await service.update_profile(current_user.id, update_data, avatar)
+
+@router.patch("/{user_id}/active")
+def set_user_active(
+    user_id: str,
+    is_active: bool = Form(...),
+    db: Session = Depends(deps.get_db),
+    _current_user: Principal = Depends(deps.get_current_active_superuser),
+):
+    """
+    Web Admin: Khóa / mở khóa tài khoản.
+    """
+    return AuthService.set_user_active(db, user_id, is_active)
+
+@router.get("/principal-cache/stats")
+def read_principal_cache_stats(
+    _current_user: Principal = Depends(deps.get_current_active_superuser),
+):
+    """
+    Web Admin: Thống kê hit/miss của cache principal (worker hiện tại) để điều chỉnh kích thước.
+    """
+    return principal_cache.stats()
\ No newline at end of file
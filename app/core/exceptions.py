@@ -1 +1,15 @@
-# Custom exception handlers placeholder
+# Custom exception handlers
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+
+class PasswordHasherBusyError(Exception):
+    """Hàng đợi băm mật khẩu đã đầy (login storm)"""
+
+
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusyError) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Hệ thống đang bận, vui lòng thử lại sau giây lát"},
+        headers={"Retry-After": "1"},
+    )
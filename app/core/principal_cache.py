@@ -0,0 +1,27 @@
+from dataclasses import dataclass
+
+from app.core.config import settings
+from app.shared.enums import UserRole
+from app.utils.helpers import TTLCache
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Thông tin tối thiểu của user đã xác thực (đủ cho phân quyền ở các route)"""
+    id: str
+    role: UserRole
+    is_active: bool
+
+
+# Cache principal theo user_id trong từng worker.
+# Dữ liệu cũ tối đa PRINCIPAL_CACHE_TTL_SECONDS giây ở các worker khác (chỉ worker xử lý
+# thay đổi mới invalidate ngay), vì vậy TTL nên để ngắn.
+principal_cache = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_MAX_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS
+)
+
+
+def invalidate_principal(user_id: str) -> None:
+    """Gọi sau khi đổi mật khẩu / khóa tài khoản / cập nhật profile"""
+    principal_cache.pop(user_id)
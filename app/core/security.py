@@ -1,11 +1,16 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from app.core.config import settings
+from app.core.exceptions import PasswordHasherBusyError
 
-# Cấu hình mã hóa mật khẩu
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Cấu hình mã hóa mật khẩu (số vòng bcrypt lấy từ settings)
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 
 # Cấu hình JWT
 ALGORITHM = "HS256"
@@ -13,14 +18,90 @@ SECRET_KEY = settings.SECRET_KEY if hasattr(settings, "SECRET_KEY") else "YOUR_S
 ACCESS_TOKEN_EXPIRE_MINUTES = 30  # Access token có hiệu lực 30 phút
 REFRESH_TOKEN_EXPIRE_DAYS = 7  # Refresh token có hiệu lực 7 ngày
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """So sánh mật khẩu nhập vào và hash trong DB"""
+# --- BĂM MẬT KHẨU TRONG PROCESS POOL RIÊNG ---
+# bcrypt tốn CPU: chạy trong pool tiến trình riêng để không chiếm threadpool của các route sync
+# (chat, student...). Số job đang chờ bị giới hạn, vượt quá -> PasswordHasherBusyError (HTTP 503).
+_hash_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_pending_jobs = 0
+
+def _bcrypt_cost(hashed_password: str) -> Optional[int]:
+    """Đọc cost từ hash dạng $2b$12$..."""
+    try:
+        return int(hashed_password.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
-def get_password_hash(password: str) -> str:
-    """Mã hóa mật khẩu để lưu vào DB"""
+def _hash(password: str) -> str:
     return pwd_context.hash(password)
 
+def _verify_and_rehash(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Chạy trong worker: verify, nếu đúng mà cost khác cấu hình hiện tại thì băm lại"""
+    if not pwd_context.verify(plain_password, hashed_password):
+        return False, None
+    if _bcrypt_cost(hashed_password) != settings.BCRYPT_ROUNDS:
+        return True, pwd_context.hash(plain_password)
+    return True, None
+
+def _get_hash_pool() -> ProcessPoolExecutor:
+    global _hash_pool
+    if _hash_pool is None:
+        _hash_pool = ProcessPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            # spawn: không fork tiến trình đang chạy event loop / thread
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _hash_pool
+
+def _release_job(_future: Future) -> None:
+    global _pending_jobs
+    with _pool_lock:
+        _pending_jobs -= 1
+
+def _submit(fn, *args) -> Future:
+    global _pending_jobs
+    with _pool_lock:
+        if _pending_jobs >= settings.PASSWORD_HASH_MAX_QUEUE:
+            raise PasswordHasherBusyError()
+        _pending_jobs += 1
+        try:
+            future = _get_hash_pool().submit(fn, *args)
+        except Exception:
+            _pending_jobs -= 1
+            raise
+    future.add_done_callback(_release_job)
+    return future
+
+def shutdown_password_hasher() -> None:
+    """Gọi khi tắt server"""
+    global _hash_pool
+    with _pool_lock:
+        if _hash_pool is not None:
+            _hash_pool.shutdown(wait=False, cancel_futures=True)
+            _hash_pool = None
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify mật khẩu (async, không chặn event loop).
+    Trả về (hợp lệ, hash mới) - hash mới khác None khi cần nâng cấp cost bcrypt.
+    """
+    return await asyncio.wrap_future(_submit(_verify_and_rehash, plain_password, hashed_password))
+
+async def get_password_hash_async(password: str) -> str:
+    """Mã hóa mật khẩu (async)"""
+    return await asyncio.wrap_future(_submit(_hash, password))
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """So sánh mật khẩu nhập vào và hash trong DB (bản sync cho route sync)"""
+    return _submit(_verify, plain_password, hashed_password).result()
+
+def get_password_hash(password: str) -> str:
+    """Mã hóa mật khẩu để lưu vào DB (bản sync cho route sync)"""
+    return _submit(_hash, password).result()
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Tạo JWT Access Token chứa thông tin user (sub, role)"""
     to_encode = data.copy()
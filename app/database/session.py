@@ -1,13 +1,50 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
 engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Driver async tương ứng với driver sync trong DATABASE_URL
+_ASYNC_DRIVERS = {
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "mysql+mysqlconnector": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "mysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def _to_async_url(url: str) -> str:
+    """Chuyển DATABASE_URL (sync) sang URL dùng driver async"""
+    scheme, sep, rest = url.partition("://")
+    return f"{_ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+def _create_async_engine():
+    url = settings.ASYNC_DATABASE_URL or _to_async_url(settings.DATABASE_URL)
+    try:
+        return create_async_engine(url, pool_pre_ping=True)
+    except ImportError as e:
+        raise RuntimeError(
+            f"Async DB driver for '{url.partition('://')[0]}' is not installed ({e}). "
+            "Install it (asyncpg / aiomysql / aiosqlite) or set ASYNC_DATABASE_URL to a URL with an installed async driver."
+        ) from e
+
+# Engine async: dùng cho Socket.IO handlers và các route async def,
+# để query/commit không chặn event loop
+async_engine = _create_async_engine()
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,56 @@
+# Nâng cấp schema cho DB đã có dữ liệu: create_all chỉ tạo bảng mới, không thêm cột / index vào bảng cũ
+import logging
+from typing import List
+
+from sqlalchemy import inspect, literal
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import Column, Table
+
+from app.database.base import Base
+
+logger = logging.getLogger(__name__)
+
+
+def _column_ddl(table: Table, column: Column, engine: Engine) -> str:
+    preparer = engine.dialect.identifier_preparer
+    ddl = (
+        f"ALTER TABLE {preparer.format_table(table)} "
+        f"ADD COLUMN {preparer.format_column(column)} {column.type.compile(dialect=engine.dialect)}"
+    )
+    # Bảng đã có dữ liệu: chỉ NOT NULL khi có server_default để điền cho các dòng cũ
+    if column.server_default is not None:
+        default = column.server_default.arg
+        if isinstance(default, str):
+            default = literal(default).compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+        ddl += f" DEFAULT {default}"
+        if not column.nullable:
+            ddl += " NOT NULL"
+    return ddl
+
+
+def upgrade_schema(engine: Engine) -> List[str]:
+    """
+    Thêm các cột / index có trong model nhưng chưa có trong bảng hiện tại (gọi sau create_all).
+    Chỉ thêm, không đổi kiểu hay xóa cột. Trả về danh sách thay đổi đã áp dụng.
+    """
+    inspector = inspect(engine)
+    changes: List[str] = []
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    conn.exec_driver_sql(_column_ddl(table, column, engine))
+                    changes.append(f"{table.name}.{column.name}")
+
+            existing_indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(bind=conn)
+                    changes.append(f"index {index.name}")
+
+    for change in changes:
+        logger.info(f"Schema upgrade: added {change}")
+    return changes
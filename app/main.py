@@ -3,20 +3,30 @@ from contextlib import asynccontextmanager
 
 import socketio
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import text
 
 # Import Config & Database
 from app.core.config import Settings
-from app.database.session import engine, SessionLocal
+from app.core.exceptions import PasswordHasherBusyError, password_hasher_busy_handler
+from app.core.security import shutdown_password_hasher
+from app.services.message_writer import message_writer
+from app.rag.llm_agent import bot_agent
+from app.services.dashboard_metrics import dashboard_metrics
+from app.services.student_activity import student_activity
+from app.services.student_service import StudentService
+from app.services.file_service import FileService, shutdown_image_pool
+from app.utils.media_files import MediaStaticFiles
+from app.database.session import engine, SessionLocal, async_engine
 from app.database.base import Base
+from app.database.upgrade import upgrade_schema
 from app.api.api_v1.api import api_router
 import app.models  # Import models để SQLAlchemy nhận diện được các bảng khi create_all
 
 # Import Socket
-from app.sockets.manager import sio
+from app.sockets.manager import sio, close_client_manager
 from app.sockets import events  # QUAN TRỌNG: Import để đăng ký các sự kiện @sio.on
+from app.sockets.flow_control import typing_coalescer
 
 # Khởi tạo Settings
 settings = Settings()
@@ -27,24 +37,67 @@ async def lifespan(app: FastAPI):
     Quản lý vòng đời ứng dụng:
     1. Khởi tạo Database Tables (nếu chưa có).
     2. Kiểm tra kết nối DB.
+    3. Khởi động / dừng các tác vụ nền (flush dữ liệu còn trong buffer khi tắt).
     """
     print("⏳ Đang khởi tạo và kết nối Database...")
     
     try:
+        # Postgres: cần extension pg_trgm cho trigram index tìm kiếm sinh viên
+        if engine.dialect.name == "postgresql":
+            with engine.begin() as conn:
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
         # Tạo bảng dựa trên metadata của Base
         Base.metadata.create_all(bind=engine)
+        # Bảng đã có từ trước: bổ sung các cột / index mới thêm vào model
+        added = upgrade_schema(engine)
+        if added:
+            print(f"🔧 Đã nâng cấp schema: {', '.join(added)}")
         print("✅ Đã tạo cấu trúc bảng (Schema) thành công!")
         
         # Thử kết nối DB
         with SessionLocal() as db:
             db.execute(text("SELECT 1"))
             print("✅ Kết nối Database (Ping) thành công!")
+
+            # Điền search_text (không dấu) cho sinh viên cũ
+            StudentService(db).backfill_search_text()
+
+        # Dọn các blob upload không còn được tham chiếu
+        if settings.UPLOAD_CONTENT_ADDRESSED:
+            removed = FileService().cleanup_unreferenced_blobs()
+            print(f"🧹 Đã dọn {removed} blob upload không còn tham chiếu")
             
     except Exception as e:
         print(f"❌ Lỗi nghiêm trọng khi kết nối DB: {e}")
+
+    # Bật ghi tin nhắn theo lô (write-behind) nếu được cấu hình
+    if settings.CHAT_WRITE_BEHIND_ENABLED:
+        message_writer.start()
+
+    # Cộng dồn bộ đếm Dashboard theo chu kỳ (DB cũ chưa có bộ đếm -> dựng lại từ dữ liệu gốc trước)
+    try:
+        if await dashboard_metrics.seed():
+            print("📊 Đã dựng bộ đếm Dashboard từ dữ liệu hiện có")
+    except Exception as e:
+        print(f"⚠️ Không dựng được bộ đếm Dashboard: {e}")
+    dashboard_metrics.start()
+    student_activity.start()
+    # Dọn trạng thái typing hết hạn / đã dừng
+    typing_coalescer.start()
     
     yield
     print("🛑 Server đang tắt...")
+    # Flush toàn bộ tin nhắn còn trong buffer trước khi đóng kết nối DB
+    await bot_agent.stop()
+    await message_writer.stop()
+    await dashboard_metrics.stop()
+    await student_activity.stop()
+    await typing_coalescer.stop()
+    shutdown_password_hasher()
+    shutdown_image_pool()
+    await close_client_manager()
+    await async_engine.dispose()
 
 # Khởi tạo FastAPI App
 app = FastAPI(
@@ -62,6 +115,7 @@ if hasattr(settings, 'BACKEND_CORS_ORIGINS') and settings.BACKEND_CORS_ORIGINS:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor"],
     )
 else:
     # Fallback cho môi trường dev nếu chưa config trong .env
@@ -71,8 +125,11 @@ else:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor"],
     )
 
+app.add_exception_handler(PasswordHasherBusyError, password_hasher_busy_handler)
+
 @app.get("/")
 def health_check():
     return {"message": "Database is ready!", "status": "connected"}
@@ -85,8 +142,8 @@ app.include_router(api_router, prefix=settings.API_V1_STR)
 if not os.path.exists("static"):
     os.makedirs("static")
 
-# Mount thư mục static để phục vụ file ảnh/upload
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Mount thư mục static để phục vụ file ảnh/upload (kèm tạo lazy ảnh thumb/medium)
+app.mount("/static", MediaStaticFiles(directory="static"), name="static")
 
 # --- TÍCH HỢP SOCKET.IO ---
 # Wrap FastAPI app bằng SocketIO ASGIApp
@@ -1,4 +1,8 @@
 from .user import User, Student, Agent
 from .chat import Conversation, Message
+from .upload import UploadBlob
+from .knowledge import KnowledgeArticle, KnowledgeRevision
+from .dashboard import DashboardCounter
+from .training import AITrainingCandidate
 
-__all__ = ["User", "Student", "Agent", "Conversation", "Message"]
\ No newline at end of file
+__all__ = ["User", "Student", "Agent", "Conversation", "Message", "UploadBlob", "KnowledgeArticle", "KnowledgeRevision", "DashboardCounter", "AITrainingCandidate"]
\ No newline at end of file
@@ -1,13 +1,17 @@
 import uuid
 from datetime import datetime
 from typing import List, Optional
-from sqlalchemy import String, DateTime, Text, Enum, func
+from sqlalchemy import String, DateTime, Text, Enum, Index, Integer, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship, foreign
 from app.database.base import Base
 from app.shared.enums import ChatStatus
 
 class Conversation(Base):
     __tablename__ = "conversations"
+    __table_args__ = (
+        # Inbox Admin: lọc theo status, phân trang keyset theo (last_message_at, id)
+        Index("ix_conversations_status_last_message", "status", "last_message_at", "id"),
+    )
 
     id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     title: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
@@ -20,9 +24,18 @@ class Conversation(Base):
     
     # Thời gian tin nhắn cuối cùng để sort
     last_message_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+    # --- DENORMALIZE CHO INBOX (tránh query tin nhắn cuối cho từng hội thoại) ---
+    last_message_preview: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    last_message_sender_id: Mapped[Optional[str]] = mapped_column(String(36), nullable=True)
+    last_message_type: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)
+    # Số tin nhắn của sinh viên mà Admin/Agent chưa đọc
+    unread_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
     
     status: Mapped[ChatStatus] = mapped_column(Enum(ChatStatus), default=ChatStatus.OPEN)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Thời điểm cán bộ / bot trả lời lần đầu (tính thời gian phản hồi cho Dashboard)
+    first_response_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
 
     messages: Mapped[List["Message"]] = relationship(
         "Message", 
@@ -33,6 +46,11 @@ class Conversation(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Index phục vụ phân trang keyset theo (created_at, id) trong từng hội thoại
+        Index("ix_messages_conversation_created_id", "conversation_id", "created_at", "id"),
+    )
+
     id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     
     conversation_id: Mapped[str] = mapped_column(String(36), index=True)
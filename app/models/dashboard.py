@@ -0,0 +1,20 @@
+from datetime import datetime
+from sqlalchemy import String, DateTime, BigInteger
+from sqlalchemy.orm import Mapped, mapped_column
+from app.database.base import Base
+
+# Bucket dùng cho các bộ đếm dạng gauge (không chia theo giờ)
+GAUGE_BUCKET = datetime(1970, 1, 1)
+
+class DashboardCounter(Base):
+    """
+    Bộ đếm cộng dồn cho Dashboard Admin, khóa (metric, bucket, dimension):
+    - gauge: bucket = GAUGE_BUCKET, vd. ("conversations_by_status", -, "OPEN")
+    - theo giờ: bucket = đầu giờ, vd. ("messages", 2024-05-01 09:00, "student")
+    """
+    __tablename__ = "dashboard_counters"
+
+    metric: Mapped[str] = mapped_column(String(50), primary_key=True)
+    bucket: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    dimension: Mapped[str] = mapped_column(String(64), primary_key=True, default="")
+    value: Mapped[int] = mapped_column(BigInteger, default=0)
@@ -1,3 +1,42 @@
+import uuid
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import String, DateTime, Text, Enum, Index, Integer
+from sqlalchemy.orm import Mapped, mapped_column
 from app.database.base import Base
-# ... (Copy nội dung các class KnowledgeArticle, AITrainingCandidate vào đây)
-# Nhớ import các thư viện cần thiết
\ No newline at end of file
+from app.shared.enums import ArticleStatus
+
+class KnowledgeArticle(Base):
+    """Bài viết / FAQ trong kho tri thức, nguồn dữ liệu cho RAG"""
+    __tablename__ = "knowledge_articles"
+    __table_args__ = (
+        # Danh sách bài viết sắp theo thời gian sửa gần nhất
+        Index("ix_knowledge_articles_updated_id", "updated_at", "id"),
+    )
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    title: Mapped[str] = mapped_column(String(255))
+    content: Mapped[str] = mapped_column(Text)
+
+    # Phân loại để lọc khi tìm kiếm: Học phí, Đào tạo... / Khoa áp dụng (None = toàn trường)
+    category: Mapped[Optional[str]] = mapped_column(String(100), index=True, nullable=True)
+    faculty: Mapped[Optional[str]] = mapped_column(String(100), index=True, nullable=True)
+
+    status: Mapped[ArticleStatus] = mapped_column(Enum(ArticleStatus), default=ArticleStatus.DRAFT)
+    version: Mapped[int] = mapped_column(Integer, default=1)
+    # Số thứ tự thay đổi toàn cục (KnowledgeRevision) lúc ghi gần nhất: ETag, /changes?since=, checkpoint ingestion
+    revision: Mapped[int] = mapped_column(Integer, default=0, server_default="0", index=True)
+    # Xóa mềm: giữ dòng để client / ingestion đồng bộ được việc xóa qua /changes
+    deleted_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    # Lần đầu bài ở trạng thái PUBLISHED: bài chưa từng xuất bản không gửi tombstone cho người dùng thường
+    published_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class KnowledgeRevision(Base):
+    """Bộ đếm phiên bản toàn cục của kho tri thức (một dòng id = 1), tăng mỗi lần ghi bài viết"""
+    __tablename__ = "knowledge_revision"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    value: Mapped[int] = mapped_column(Integer, default=0)
@@ -1 +1,34 @@
-# AITrainingCandidate model placeholder
+import uuid
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import String, DateTime, Text, Enum, Integer, Float
+from sqlalchemy.orm import Mapped, mapped_column
+from app.database.base import Base
+from app.shared.enums import TrainingStatus
+
+class AITrainingCandidate(Base):
+    """Nhóm câu hỏi hay gặp của sinh viên (khai thác từ log chat), chờ Admin duyệt để bổ sung kho tri thức"""
+    __tablename__ = "ai_training_candidates"
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+
+    # Câu hỏi đại diện cho cụm (gần tâm cụm nhất) + vài câu ví dụ (JSON list)
+    question: Mapped[str] = mapped_column(Text)
+    sample_questions: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    # Số tin nhắn trong cụm ở lần khai thác gần nhất
+    frequency: Mapped[int] = mapped_column(Integer, default=0)
+    # Độ tương đồng cao nhất với kho tri thức hiện có (1 = đã có câu trả lời)
+    coverage: Mapped[float] = mapped_column(Float, default=0.0)
+    # Điểm xếp hạng: hỏi nhiều + chưa có trong kho tri thức -> điểm cao
+    score: Mapped[float] = mapped_column(Float, default=0.0, index=True)
+
+    status: Mapped[TrainingStatus] = mapped_column(Enum(TrainingStatus), default=TrainingStatus.NEW, index=True)
+    # Câu trả lời Admin nhập khi duyệt + bài viết (DRAFT) được tạo từ đó
+    answer: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    article_id: Mapped[Optional[str]] = mapped_column(String(36), nullable=True)
+
+    first_seen_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_seen_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
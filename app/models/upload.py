@@ -0,0 +1,19 @@
+from datetime import datetime
+from sqlalchemy import String, DateTime, Integer, BigInteger
+from sqlalchemy.orm import Mapped, mapped_column
+from app.database.base import Base
+
+class UploadBlob(Base):
+    """File upload lưu theo nội dung (content-addressed): các upload giống nhau dùng chung 1 blob"""
+    __tablename__ = "upload_blobs"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    
+    # Đường dẫn URL tương đối: static/uploads/blobs/ab/<sha256>.jpg
+    path: Mapped[str] = mapped_column(String(500), unique=True)
+    size: Mapped[int] = mapped_column(BigInteger)
+    content_type: Mapped[str] = mapped_column(String(100), nullable=True)
+
+    # Số nơi đang tham chiếu (avatar, tin nhắn...). 0 -> job dọn dẹp được phép xóa
+    ref_count: Mapped[int] = mapped_column(Integer, default=1)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
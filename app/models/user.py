@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import String, Boolean, Enum, Integer, Float, DateTime
+from sqlalchemy import String, Boolean, Enum, Integer, Float, DateTime, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship, foreign
 from app.database.base import Base
 from app.shared.enums import UserRole, AcademicStatus 
@@ -38,6 +38,14 @@ class User(Base):
 
 class Student(Base):
     __tablename__ = "students"
+    __table_args__ = (
+        # Trigram index (Postgres + pg_trgm) cho tìm kiếm LIKE '%kw%' không dấu.
+        # Các DB khác bỏ qua tham số postgresql_* và tạo index thường.
+        Index(
+            "ix_students_search_text_trgm", "search_text",
+            postgresql_using="gin", postgresql_ops={"search_text": "gin_trgm_ops"}
+        ),
+    )
     id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     
     user_id: Mapped[str] = mapped_column(String(36), index=True)
@@ -54,6 +62,9 @@ class Student(Base):
     last_contact: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     total_chats: Mapped[int] = mapped_column(Integer, default=0)
 
+    # Họ tên + mã SV + email đã bỏ dấu, lowercase (phục vụ tìm kiếm Admin)
+    search_text: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+
     user: Mapped["User"] = relationship(
         "User", 
         back_populates="student_profile", 
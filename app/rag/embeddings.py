@@ -1 +1,262 @@
-# Embeddings creation (OpenAI/HuggingFace) placeholder
+# Embeddings: backend tạo vector + cache theo hash nội dung + gom batch các request đồng thời
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.utils.helpers import fold_vietnamese
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Chuẩn hóa trước khi embed / tính hash: NFC, gộp khoảng trắng, lowercase"""
+    return _SPACES.sub(" ", unicodedata.normalize("NFC", text)).strip().lower()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def _l2_normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32, copy=False)
+
+
+# --- BACKENDS ---
+class EmbeddingBackend(ABC):
+    """Interface backend: nhận list text, trả về ma trận float32 (n, dim) đã chuẩn hóa L2"""
+    name: str
+    dim: int
+
+    @abstractmethod
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        ...
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    Embedding cục bộ, tất định (không cần model / mạng), dùng cho offline và test.
+    Hashing trick trên: âm tiết (bỏ dấu + giữ dấu), cặp âm tiết liền nhau, trigram ký tự.
+    """
+    name = "hashing"
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[Tuple[str, float]]:
+        folded = _WORD.findall(fold_vietnamese(text))
+        features = [(f"w:{t}", 1.0) for t in folded]
+        features += [(f"b:{a}_{b}", 1.0) for a, b in zip(folded, folded[1:])]
+        # Giữ dấu để phân biệt "ma" / "mà" / "má"...
+        features += [(f"o:{t}", 0.5) for t in _WORD.findall(text.lower())]
+        for token in folded:
+            padded = f"#{token}#"
+            features += [(f"c:{padded[i:i + 3]}", 0.25) for i in range(len(padded) - 2)]
+        return features
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                # blake2b (không dùng hash() vì bị random hóa giữa các tiến trình)
+                h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                vectors[row, h % self.dim] += weight if h >> 63 else -weight
+        return _l2_normalize(vectors)
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """Model CPU nhỏ qua sentence-transformers (import lazy, là dependency tùy chọn)"""
+    name = "st"
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"st:{model_name}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = self.model.encode(list(texts), convert_to_numpy=True, normalize_embeddings=True)
+        return vectors.astype(np.float32, copy=False)
+
+
+def create_backend(name: str) -> EmbeddingBackend:
+    if name == "hashing":
+        return HashingEmbeddingBackend(settings.EMBEDDING_DIM)
+    if name == "sentence-transformers":
+        return SentenceTransformerBackend(settings.EMBEDDING_MODEL)
+    raise ValueError(f"Unsupported EMBEDDING_BACKEND: {name}")
+
+
+# --- CACHE TRÊN ĐĨA ---
+class EmbeddingCache:
+    """
+    Cache vector theo hash của text đã chuẩn hóa (SQLite, WAL nên nhiều worker dùng chung được).
+    Key gồm cả tên backend + dim để đổi model không đọc nhầm vector cũ.
+    """
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._conn.commit()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        if not items:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, vector.astype(np.float32).tobytes()) for key, vector in items.items()]
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# --- SERVICE ---
+class EmbeddingService:
+    """
+    - embed_batch (sync): dùng cho ingestion / job batch, đọc cache trước, chỉ embed phần thiếu
+    - embed (async): gom các request đồng thời thành một lần gọi model,
+      chờ tối đa `window_ms` hoặc đủ `batch_size` text
+    """
+
+    def __init__(self, backend: EmbeddingBackend, cache: Optional[EmbeddingCache], batch_size: int, window_ms: int):
+        self.backend = backend
+        self.cache = cache
+        self.batch_size = batch_size
+        self.window = window_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    @property
+    def dim(self) -> int:
+        return self.backend.dim
+
+    def _cache_key(self, digest: str) -> str:
+        return f"{self.backend.name}:{self.backend.dim}:{digest}"
+
+    def embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed danh sách text -> ma trận float32 (n, dim)"""
+        result = np.empty((len(texts), self.dim), dtype=np.float32)
+        if not texts:
+            return result
+
+        # Gom text trùng nội dung (sau chuẩn hóa) để chỉ embed một lần
+        positions: Dict[str, List[int]] = {}
+        for i, text in enumerate(texts):
+            positions.setdefault(self._cache_key(text_hash(text)), []).append(i)
+
+        cached = self.cache.get_many(list(positions)) if self.cache else {}
+        missing = [key for key in positions if key not in cached]
+
+        computed: Dict[str, np.ndarray] = {}
+        for start in range(0, len(missing), self.batch_size):
+            keys = missing[start:start + self.batch_size]
+            vectors = self.backend.embed([normalize_text(texts[positions[key][0]]) for key in keys])
+            computed.update(zip(keys, vectors))
+        if self.cache and computed:
+            self.cache.put_many(computed)
+
+        for key, rows in positions.items():
+            vector = cached.get(key)
+            if vector is None:
+                vector = computed[key]
+            result[rows] = vector
+        return result
+
+    async def embed_many(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed nhiều text một lần (không chặn event loop)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.embed_batch, list(texts))
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Embed một text (vd. câu hỏi của sinh viên), được gom batch với các request đồng thời"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._batch_worker())
+
+        future = loop.create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _batch_worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                vectors = await loop.run_in_executor(None, self.embed_batch, [text for text, _ in batch])
+                for (_, future), vector in zip(batch, vectors):
+                    if not future.done():
+                        future.set_result(vector)
+            except Exception as e:
+                logger.error(f"Embedding batch failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+
+_service: Optional[EmbeddingService] = None
+_service_lock = threading.Lock()
+
+
+def get_embedding_service() -> EmbeddingService:
+    """Singleton theo tiến trình (khởi tạo lazy để không load model khi không dùng RAG)"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            cache_path = settings.EMBEDDING_CACHE_PATH
+            _service = EmbeddingService(
+                backend=create_backend(settings.EMBEDDING_BACKEND),
+                cache=EmbeddingCache(cache_path) if cache_path else None,
+                batch_size=settings.EMBEDDING_BATCH_SIZE,
+                window_ms=settings.EMBEDDING_BATCH_WINDOW_MS
+            )
+        return _service
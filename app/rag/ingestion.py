@@ -1 +1,423 @@
-# Ingestion pipeline: KnowledgeArticle -> Vector DB placeholder
+# Ingestion pipeline: KnowledgeArticle -> Vector DB (tăng dần, chỉ embed phần thay đổi, có checkpoint)
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.knowledge import KnowledgeArticle
+from app.rag.embeddings import EmbeddingService, get_embedding_service, normalize_text
+from app.rag.retrieval import apply_index_changes
+from app.rag.semantic_cache import invalidate_documents
+from app.rag.vector_store import VectorStore, get_vector_store
+from app.shared.enums import ArticleStatus
+from app.utils.docx_parser import FAQRecord, iter_faq_records
+
+logger = logging.getLogger(__name__)
+
+_PARAGRAPHS = re.compile(r"\n\s*\n")
+_SENTENCES = re.compile(r"(?<=[.!?;:])\s+")
+
+
+@dataclass
+class SourceDocument:
+    """Tài liệu nguồn dạng chung (bài viết DB, file DOCX...) trước khi chia chunk"""
+    id: str
+    title: str
+    content: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    # False -> gỡ toàn bộ chunk của tài liệu khỏi index (bài bị ẩn / lưu trữ)
+    active: bool = True
+    # Vị trí trong nguồn (vd. revision của bài viết) để lưu checkpoint, không đưa vào index
+    position: Optional[Any] = None
+
+    @property
+    def source(self) -> str:
+        return self.metadata.get("source", "")
+
+
+@dataclass
+class IngestionStats:
+    documents: int = 0
+    indexed: int = 0
+    unchanged: int = 0
+    removed: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return self.__dict__.copy()
+
+
+def chunk_text(title: str, content: str, max_chars: int = 800, overlap: int = 100) -> List[str]:
+    """
+    Chia nội dung theo đoạn văn, gộp các đoạn ngắn tới `max_chars`.
+    Đoạn quá dài được cắt theo câu, giữ `overlap` ký tự cuối của chunk trước làm ngữ cảnh.
+    Mỗi chunk có tiêu đề ở đầu để vector mang đủ ngữ cảnh.
+    """
+    pieces: List[str] = []
+    for paragraph in _PARAGRAPHS.split(content.strip()):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        current = ""
+        for sentence in _SENTENCES.split(paragraph):
+            if current and len(current) + len(sentence) + 1 > max_chars:
+                pieces.append(current)
+                current = current[-overlap:] if overlap else ""
+            current = f"{current} {sentence}".strip()
+            # Câu dài bất thường (không có dấu câu) -> cắt cứng
+            while len(current) > max_chars:
+                pieces.append(current[:max_chars])
+                current = current[max_chars - overlap:] if overlap else current[max_chars:]
+        if current:
+            pieces.append(current)
+
+    chunks: List[str] = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 2 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return [f"{title}\n{chunk}" for chunk in chunks] or ([title] if title else [])
+
+
+def _chunk_hash(text: str, metadata: Dict[str, Any]) -> str:
+    """Hash nội dung + metadata: đổi metadata (vd. khoa) cũng cập nhật index, nhưng vector lấy từ cache"""
+    payload = normalize_text(text) + "\x00" + json.dumps(metadata, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class IngestionManifest:
+    """
+    Sổ ghi (SQLite) hash của từng chunk đã index + checkpoint của lần quét gần nhất.
+    Dùng để bỏ qua chunk không đổi và chạy tiếp sau khi bị dừng giữa chừng.
+    """
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "doc_id TEXT NOT NULL, chunk_no INTEGER NOT NULL, source TEXT NOT NULL, hash TEXT NOT NULL, "
+                "PRIMARY KEY (doc_id, chunk_no))"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS checkpoints (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._conn.commit()
+
+    def get_hashes(self, doc_id: str) -> Dict[int, str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT chunk_no, hash FROM chunks WHERE doc_id = ?", (doc_id,)).fetchall()
+        return dict(rows)
+
+    def doc_ids(self, source: str) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT doc_id FROM chunks WHERE source = ?", (source,))
+            return [row[0] for row in rows]
+
+    def replace(self, doc_id: str, source: str, hashes: Dict[int, str]) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+            self._conn.executemany(
+                "INSERT INTO chunks (doc_id, chunk_no, source, hash) VALUES (?, ?, ?, ?)",
+                [(doc_id, no, source, h) for no, h in hashes.items()]
+            )
+            self._conn.commit()
+
+    def get_checkpoint(self, name: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM checkpoints WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_checkpoint(self, name: str, value: Any) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (name, value) VALUES (?, ?)", (name, json.dumps(value))
+            )
+            self._conn.commit()
+
+    def clear_checkpoint(self, name: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM checkpoints WHERE name = ?", (name,))
+            self._conn.commit()
+
+
+class IngestionPipeline:
+    """
+    SourceDocument -> chunk -> so hash với manifest -> embed phần thay đổi theo batch -> cập nhật index.
+    Thứ tự ghi khi flush: vector store (save delta) -> manifest -> checkpoint,
+    nên nếu dừng giữa chừng, lần chạy sau chỉ làm lại batch dang dở (idempotent theo chunk id).
+    Nhiều tiến trình có thể gọi: phần ghi được khóa bằng flock trên thư mục vector store.
+    """
+
+    def __init__(
+        self,
+        store: VectorStore,
+        embedder: EmbeddingService,
+        manifest: IngestionManifest,
+        chunk_size: int = 800,
+        chunk_overlap: int = 100,
+        batch_size: int = 256
+    ):
+        self.store = store
+        self.embedder = embedder
+        self.manifest = manifest
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.batch_size = batch_size
+        self._thread_lock = threading.Lock()
+
+    @contextmanager
+    def _writer_lock(self) -> Iterator[None]:
+        with self._thread_lock, open(os.path.join(self.store.path, ".writer.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # Tiến trình khác có thể vừa ghi -> đọc lại trước khi sửa
+                self.store.maybe_reload()
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def chunk_id(doc_id: str, chunk_no: int) -> str:
+        return f"{doc_id}:{chunk_no}"
+
+    def _diff(self, doc: SourceDocument) -> Tuple[List[Tuple[str, str, Dict[str, Any]]], List[str], Dict[int, str], int]:
+        """Trả về (chunk cần embed, chunk id cần xóa, hash mới, số chunk không đổi)"""
+        old = self.manifest.get_hashes(doc.id)
+        if not doc.active:
+            return [], [self.chunk_id(doc.id, no) for no in old], {}, 0
+
+        chunks = chunk_text(doc.title, doc.content, self.chunk_size, self.chunk_overlap)
+        changed, new_hashes, unchanged = [], {}, 0
+        for no, text in enumerate(chunks):
+            metadata = {**doc.metadata, "doc_id": doc.id, "title": doc.title, "chunk_no": no, "text": text}
+            digest = _chunk_hash(text, metadata)
+            new_hashes[no] = digest
+            if old.get(no) == digest:
+                unchanged += 1
+            else:
+                changed.append((self.chunk_id(doc.id, no), text, metadata))
+        removed = [self.chunk_id(doc.id, no) for no in old if no >= len(chunks)]
+        return changed, removed, new_hashes, unchanged
+
+    def _flush(
+        self,
+        pending: List[Tuple[str, str, Dict[str, Any]]],
+        removed: List[str],
+        manifests: Dict[str, Tuple[str, Dict[int, str]]]
+    ) -> None:
+        if pending:
+            vectors = self.embedder.embed_batch([text for _, text, _ in pending])
+            self.store.add([cid for cid, _, _ in pending], vectors, [meta for _, _, meta in pending])
+        if removed:
+            self.store.delete(removed)
+        if pending or removed:
+            self.store.save()
+            # Câu trả lời đã cache dựa trên các tài liệu này không còn đúng
+            invalidate_documents({meta["doc_id"] for _, _, meta in pending} | {cid.rsplit(":", 1)[0] for cid in removed})
+            apply_index_changes([(cid, text) for cid, text, _ in pending], removed)
+        for doc_id, (source, hashes) in manifests.items():
+            self.manifest.replace(doc_id, source, hashes)
+
+    def ingest_document(self, doc: SourceDocument) -> IngestionStats:
+        """Cập nhật một tài liệu (vd. sửa một FAQ): thường chỉ embed 1-2 chunk, không rebuild index"""
+        return self.ingest_documents([doc])
+
+    def ingest_documents(self, docs: Iterable[SourceDocument], checkpoint: Optional[str] = None) -> IngestionStats:
+        """
+        Ingest một luồng tài liệu. Nếu có `checkpoint`, `doc.position` của tài liệu cuối cùng
+        được lưu sau mỗi lần flush thành công để lần sau chạy tiếp từ đó.
+        """
+        stats = IngestionStats()
+        pending: List[Tuple[str, str, Dict[str, Any]]] = []
+        removed: List[str] = []
+        manifests: Dict[str, Tuple[str, Dict[int, str]]] = {}
+        last_position = None
+
+        with self._writer_lock():
+            for doc in docs:
+                changed, gone, hashes, unchanged = self._diff(doc)
+                stats.documents += 1
+                stats.indexed += len(changed)
+                stats.removed += len(gone)
+                stats.unchanged += unchanged
+                pending.extend(changed)
+                removed.extend(gone)
+                manifests[doc.id] = (doc.source, hashes)
+                if checkpoint and doc.position is not None:
+                    last_position = doc.position
+
+                if len(pending) >= self.batch_size:
+                    self._flush(pending, removed, manifests)
+                    if last_position is not None:
+                        self.manifest.set_checkpoint(checkpoint, last_position)
+                    pending, removed, manifests = [], [], {}
+
+            self._flush(pending, removed, manifests)
+            if last_position is not None:
+                self.manifest.set_checkpoint(checkpoint, last_position)
+        return stats
+
+    def remove_documents(self, doc_ids: Iterable[str]) -> int:
+        docs = (SourceDocument(id=doc_id, title="", content="", active=False) for doc_id in doc_ids)
+        return self.ingest_documents(docs).removed
+
+    def remove_document(self, doc_id: str) -> int:
+        return self.remove_documents([doc_id])
+
+    def prune(self, source: str, existing_ids: Iterable[str]) -> int:
+        """Gỡ các tài liệu của một nguồn đã bị xóa hẳn khỏi nguồn đó"""
+        existing = set(existing_ids)
+        return self.remove_documents([doc_id for doc_id in self.manifest.doc_ids(source) if doc_id not in existing])
+
+
+# --- NGUỒN: KNOWLEDGE ARTICLE ---
+ARTICLE_CHECKPOINT = "knowledge_articles"
+
+
+def article_to_document(article: KnowledgeArticle) -> SourceDocument:
+    return SourceDocument(
+        id=article.id,
+        title=article.title,
+        content=article.content or "",
+        metadata={
+            "source": "article",
+            "category": article.category,
+            "faculty": article.faculty
+        },
+        active=article.status == ArticleStatus.PUBLISHED and article.deleted_at is None
+    )
+
+
+def _iter_changed_articles(db: Session, after: Optional[int], batch_size: int) -> Iterator[SourceDocument]:
+    """Quét bài viết theo revision > checkpoint (gồm cả bài đã xóa mềm), đọc theo lô để không load hết vào RAM"""
+    query = db.query(KnowledgeArticle).order_by(KnowledgeArticle.revision, KnowledgeArticle.id)
+    if after:
+        query = query.filter(KnowledgeArticle.revision > after)
+    for article in query.execution_options(yield_per=batch_size):
+        doc = article_to_document(article)
+        doc.position = article.revision
+        yield doc
+
+
+def run_incremental_ingestion(db: Session, full: bool = False) -> IngestionStats:
+    """
+    Đồng bộ bài viết đã thay đổi kể từ checkpoint.
+    full=True: quét lại từ đầu (chunk không đổi vẫn được bỏ qua nhờ hash) + gỡ bài đã bị xóa hẳn.
+    """
+    pipeline = get_ingestion_pipeline()
+    if full:
+        pipeline.manifest.clear_checkpoint(ARTICLE_CHECKPOINT)
+    after = pipeline.manifest.get_checkpoint(ARTICLE_CHECKPOINT)
+    if not isinstance(after, int):
+        # Checkpoint cũ dạng [updated_at, id] -> quét lại một lần (chunk không đổi được bỏ qua nhờ hash)
+        after = None
+
+    stats = pipeline.ingest_documents(
+        _iter_changed_articles(db, after, pipeline.batch_size), checkpoint=ARTICLE_CHECKPOINT
+    )
+    if full:
+        existing = (row[0] for row in db.query(KnowledgeArticle.id).execution_options(yield_per=1000))
+        stats.removed += pipeline.prune("article", existing)
+    logger.info(f"Knowledge ingestion done: {stats.as_dict()}")
+    return stats
+
+
+def ingest_article(article: KnowledgeArticle) -> IngestionStats:
+    """Gọi sau khi tạo / sửa / đổi trạng thái một bài viết"""
+    return get_ingestion_pipeline().ingest_document(article_to_document(article))
+
+
+# --- NGUỒN: FILE FAQ (DOCX) ---
+FAQ_SOURCE = "faq"
+
+
+def faq_to_documents(records: Iterable[FAQRecord], source_name: str) -> Iterator[SourceDocument]:
+    """FAQRecord -> SourceDocument. Id theo nội dung câu hỏi nên ổn định khi thêm / đổi thứ tự câu hỏi"""
+    for record in records:
+        key = f"{source_name}\x00{record.category or ''}\x00{normalize_text(record.question)}"
+        yield SourceDocument(
+            id=f"{FAQ_SOURCE}:{hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]}",
+            title=record.question,
+            content=record.answer,
+            metadata={
+                "source": FAQ_SOURCE,
+                "file": source_name,
+                "category": record.category,
+                "subcategory": record.subcategory
+            }
+        )
+
+
+def ingest_faq_docx(path: str) -> IngestionStats:
+    """Đọc file FAQ dạng stream và đồng bộ vào index; câu hỏi đã bị xóa khỏi file được gỡ khỏi index"""
+    pipeline = get_ingestion_pipeline()
+    source_name = os.path.basename(path)
+    seen: List[str] = []
+
+    def docs() -> Iterator[SourceDocument]:
+        for doc in faq_to_documents(iter_faq_records(path), source_name):
+            seen.append(doc.id)
+            yield doc
+
+    stats = pipeline.ingest_documents(docs())
+    # Chỉ gỡ câu hỏi thuộc đúng file này (các file FAQ khác giữ nguyên)
+    seen_ids = set(seen)
+    stale = [
+        doc_id for doc_id in pipeline.manifest.doc_ids(FAQ_SOURCE)
+        if doc_id not in seen_ids and (pipeline.store.get(pipeline.chunk_id(doc_id, 0)) or {}).get("file") == source_name
+    ]
+    stats.removed += pipeline.remove_documents(stale)
+    logger.info(f"FAQ ingestion ({source_name}) done: {stats.as_dict()}")
+    return stats
+
+
+_pipeline: Optional[IngestionPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_ingestion_pipeline() -> IngestionPipeline:
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = IngestionPipeline(
+                store=get_vector_store(),
+                embedder=get_embedding_service(),
+                manifest=IngestionManifest(settings.INGESTION_MANIFEST_PATH),
+                chunk_size=settings.INGESTION_CHUNK_SIZE,
+                chunk_overlap=settings.INGESTION_CHUNK_OVERLAP,
+                batch_size=settings.INGESTION_BATCH_SIZE
+            )
+        return _pipeline
+
+
+if __name__ == "__main__":
+    import sys
+
+    from app.database.session import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    docx_files = [arg for arg in sys.argv[1:] if arg.endswith(".docx")]
+    for docx_file in docx_files:
+        ingest_faq_docx(docx_file)
+    if not docx_files:
+        with SessionLocal() as session:
+            run_incremental_ingestion(session, full="--full" in sys.argv)
@@ -1 +1,254 @@
+# LLM Agent: sinh câu trả lời dạng stream (token -> Socket.IO), lưu tin nhắn BOT khi hoàn tất
+import asyncio
+import logging
+import re
+import uuid
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, List, Optional, Sequence
 
+import numpy as np
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.database.session import AsyncSessionLocal
+from app.models.chat import Conversation, Message
+from app.rag.embeddings import get_embedding_service
+from app.rag.retrieval import get_retriever
+from app.rag.semantic_cache import get_semantic_cache, source_fingerprint
+from app.rag.vector_store import SearchHit, get_vector_store
+from app.schemas.chat_schema import MessageCreate
+from app.shared.enums import ChatStatus, MessageType
+from app.sockets.manager import socket_manager
+
+logger = logging.getLogger(__name__)
+
+# sender_id của tin nhắn do bot gửi (không phải user thật)
+BOT_SENDER_ID = "BOT"
+
+# Bot chỉ tự trả lời khi chưa có người phụ trách
+BOT_REPLY_STATUSES = (ChatStatus.OPEN, ChatStatus.PENDING_AGENT)
+
+SYSTEM_PROMPT = (
+    "Bạn là trợ lý ảo hỗ trợ sinh viên Trường Đại học Thủy Lợi. "
+    "Trả lời ngắn gọn, chính xác bằng tiếng Việt, chỉ dựa trên thông tin tham khảo bên dưới. "
+    "Nếu không có thông tin, hãy nói rõ và đề nghị sinh viên chờ cán bộ hỗ trợ."
+)
+
+
+# --- PROVIDERS ---
+class LLMProvider(ABC):
+    """Interface model sinh văn bản: stream() trả về lần lượt các đoạn text"""
+    name: str
+
+    @abstractmethod
+    def stream(self, prompt: str) -> AsyncIterator[str]:
+        ...
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini (google-generativeai, import lazy), gọi async + stream=True"""
+    name = "gemini"
+
+    def __init__(self, api_key: str, model_name: str):
+        import google.generativeai as genai
+
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY is not configured")
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            text = getattr(chunk, "text", "")
+            if text:
+                yield text
+
+
+class FakeStreamingProvider(LLMProvider):
+    """Model giả lập cục bộ cho dev/test: trả về từng từ với độ trễ cố định"""
+    name = "fake"
+
+    def __init__(self, reply: Optional[str] = None, delay: float = 0.02):
+        self.reply = reply
+        self.delay = delay
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        text = self.reply
+        if text is None:
+            # Mặc định: nhắc lại đoạn tham khảo đầu tiên (nếu có)
+            context = prompt.split("### Tham khảo", 1)[-1].split("### Câu hỏi", 1)[0].strip()
+            text = context[:400] if context != "(không có)" else "Xin lỗi, mình chưa có thông tin cho câu hỏi này."
+        for token in re.findall(r"\S+\s*", text):
+            await asyncio.sleep(self.delay)
+            yield token
+
+
+def create_provider(name: str) -> LLMProvider:
+    if name == "fake":
+        return FakeStreamingProvider()
+    if name == "gemini":
+        return GeminiProvider(settings.GEMINI_API_KEY, settings.GEMINI_MODEL)
+    raise ValueError(f"Unsupported LLM_PROVIDER: {name}")
+
+
+# --- AGENT ---
+class LLMAgent:
+    """
+    Trả lời tin nhắn sinh viên:
+    bot_message_start -> nhiều bot_message_delta (gom token theo LLM_DELTA_FLUSH_MS) -> new_message (bản lưu DB).
+    Tin nhắn đã lưu dùng cùng message_id với stream để client thay bong bóng tạm bằng bản chính thức.
+    Mỗi hội thoại chỉ có một câu trả lời đang chạy: tin mới của sinh viên hủy câu trả lời cũ.
+    """
+
+    def __init__(self, provider: Optional[LLMProvider] = None):
+        self._provider = provider
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @property
+    def provider(self) -> LLMProvider:
+        if self._provider is None:
+            self._provider = create_provider(settings.LLM_PROVIDER)
+        return self._provider
+
+    def should_reply(self, conversation: Conversation, message: Message) -> bool:
+        return (
+            settings.LLM_AUTO_REPLY
+            and message.sender_id == conversation.student_id
+            and message.msg_type == MessageType.TEXT.value
+            and conversation.status in BOT_REPLY_STATUSES
+        )
+
+    def schedule_reply(self, conversation_id: str, question: str) -> None:
+        """Chạy nền (không chặn handler gửi tin của sinh viên)"""
+        previous = self._tasks.get(conversation_id)
+        if previous and not previous.done():
+            previous.cancel()
+        task = asyncio.get_running_loop().create_task(self.reply(conversation_id, question))
+        self._tasks[conversation_id] = task
+        task.add_done_callback(lambda t: self._tasks.pop(conversation_id, None) if self._tasks.get(conversation_id) is t else None)
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def retrieve(self, question: str, vector: np.ndarray) -> List[SearchHit]:
+        """Lấy các đoạn tham khảo từ kho tri thức (bỏ qua nếu index chưa có dữ liệu)"""
+        store = get_vector_store()
+        if not len(store):
+            return []
+        loop = asyncio.get_running_loop()
+        if settings.RETRIEVAL_HYBRID_ENABLED:
+            return await loop.run_in_executor(None, get_retriever().search, question, vector, settings.LLM_CONTEXT_CHUNKS)
+        return await loop.run_in_executor(None, store.search, vector, settings.LLM_CONTEXT_CHUNKS)
+
+    @staticmethod
+    def _sources_fresh(sources: Dict[str, str]) -> bool:
+        """Câu trả lời trong cache còn đúng nếu mọi chunk nguồn vẫn còn và chưa bị sửa"""
+        store = get_vector_store()
+        store.maybe_reload()
+        for chunk_id, fingerprint in sources.items():
+            metadata = store.get(chunk_id)
+            if metadata is None or source_fingerprint(metadata.get("text", "")) != fingerprint:
+                return False
+        return True
+
+    async def _load_history(self, conversation_id: str) -> List[Message]:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Message)
+                .where(Message.conversation_id == conversation_id)
+                .order_by(Message.created_at.desc())
+                .limit(settings.LLM_HISTORY_MESSAGES)
+            )
+            return list(reversed(result.scalars().all()))
+
+    @staticmethod
+    def _prior_turns(question: str, history: Sequence[Message]) -> List[Message]:
+        """Các tin nhắn văn bản trước câu hỏi hiện tại (phần 'Hội thoại' của prompt)"""
+        # Tin nhắn cuối chính là câu hỏi hiện tại -> không lặp lại trong phần hội thoại
+        if history and history[-1].content == question:
+            history = history[:-1]
+        return [msg for msg in history if msg.msg_type == MessageType.TEXT.value]
+
+    def build_prompt(self, question: str, contexts: Sequence[str], history: Sequence[Message]) -> str:
+        lines = [SYSTEM_PROMPT, "", "### Tham khảo"]
+        lines += [f"[{i + 1}] {text}" for i, text in enumerate(contexts)] or ["(không có)"]
+        lines += ["", "### Hội thoại"]
+        for msg in self._prior_turns(question, history):
+            role = "Bot" if msg.sender_id == BOT_SENDER_ID else "Người dùng"
+            lines.append(f"{role}: {msg.content}")
+        lines += ["", "### Câu hỏi", question]
+        return "\n".join(lines)
+
+    async def reply(self, conversation_id: str, question: str) -> Optional[str]:
+        message_id = str(uuid.uuid4())
+        base = {"conversation_id": conversation_id, "message_id": message_id}
+        try:
+            vector, history = await asyncio.gather(
+                get_embedding_service().embed(question), self._load_history(conversation_id)
+            )
+            # Cache chỉ khóa theo câu hỏi, còn prompt có cả lịch sử hội thoại ("còn môn đó thì sao?")
+            # -> chỉ đọc / ghi cache cho câu hỏi mở đầu, chưa có lượt trao đổi nào trước đó
+            use_cache = settings.SEMANTIC_CACHE_ENABLED and not self._prior_turns(question, history)
+            cache = get_semantic_cache() if use_cache else None
+            if cache is not None:
+                loop = asyncio.get_running_loop()
+                cached = await loop.run_in_executor(None, cache.lookup, vector, self._sources_fresh)
+                if cached is not None:
+                    await socket_manager.emit_to_room(conversation_id, "bot_message_start", {**base, "cached": True})
+                    await socket_manager.emit_to_room(conversation_id, "bot_message_delta", {**base, "index": 0, "delta": cached.answer})
+                    await self._persist(conversation_id, message_id, cached.answer)
+                    return cached.answer
+
+            hits = await self.retrieve(question, vector)
+            prompt = self.build_prompt(question, [hit.metadata.get("text", "") for hit in hits], history)
+
+            await socket_manager.emit_to_room(conversation_id, "bot_message_start", {**base, "cached": False})
+            parts: List[str] = []
+            buffer: List[str] = []
+            loop = asyncio.get_running_loop()
+            flush_interval = settings.LLM_DELTA_FLUSH_MS / 1000
+            last_flush = loop.time()
+            index = 0
+            async for token in self.provider.stream(prompt):
+                parts.append(token)
+                buffer.append(token)
+                # Token đầu tiên gửi ngay, sau đó gom theo khoảng thời gian để giảm số event
+                if index == 0 or loop.time() - last_flush >= flush_interval:
+                    await socket_manager.emit_to_room(conversation_id, "bot_message_delta", {**base, "index": index, "delta": "".join(buffer)})
+                    buffer, last_flush, index = [], loop.time(), index + 1
+            if buffer:
+                await socket_manager.emit_to_room(conversation_id, "bot_message_delta", {**base, "index": index, "delta": "".join(buffer)})
+
+            answer = "".join(parts).strip()
+            if answer:
+                await self._persist(conversation_id, message_id, answer)
+                # Chỉ cache câu trả lời có căn cứ từ kho tri thức
+                if cache is not None and hits:
+                    sources = {hit.id: source_fingerprint(hit.metadata.get("text", "")) for hit in hits}
+                    cache.put(vector, question, answer, sources)
+            return answer
+        except asyncio.CancelledError:
+            await socket_manager.emit_to_room(conversation_id, "bot_message_cancelled", base)
+            raise
+        except Exception as e:
+            logger.error(f"Bot reply failed for conversation {conversation_id}: {e}")
+            await socket_manager.emit_to_room(conversation_id, "bot_message_error", base)
+            return None
+
+    async def _persist(self, conversation_id: str, message_id: str, answer: str) -> None:
+        # Import tại chỗ để tránh import vòng (chat_service gọi bot_agent)
+        from app.services.chat_service import AsyncChatService
+
+        async with AsyncSessionLocal() as db:
+            await AsyncChatService(db).send_message(
+                BOT_SENDER_ID,
+                MessageCreate(conversation_id=conversation_id, content=answer, msg_type=MessageType.TEXT),
+                message_id=message_id
+            )
+
+
+bot_agent = LLMAgent()
@@ -0,0 +1,235 @@
+# Hybrid retrieval: BM25 (từ khóa, bỏ dấu, theo âm tiết) + vector search, gộp bằng Reciprocal Rank Fusion
+import asyncio
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.rag.embeddings import get_embedding_service
+from app.rag.vector_store import SearchHit, VectorStore, get_vector_store, matches_filter
+from app.utils.helpers import fold_vietnamese
+
+# Âm tiết / mã có dấu nối: "cse101", "2023/qd-dhtl", "k62.cntt"
+_TOKEN = re.compile(r"[a-z0-9]+(?:[./\-][a-z0-9]+)*")
+_SEPARATORS = re.compile(r"[./\-]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Bỏ dấu + tách âm tiết, thêm cặp âm tiết liền nhau ("hoc_phi") để phân biệt từ ghép.
+    Mã có dấu nối được giữ nguyên và thêm từng phần, nên gõ "qd-123" hay "123" đều khớp.
+    """
+    words = _TOKEN.findall(fold_vietnamese(text))
+    tokens: List[str] = []
+    for word in words:
+        tokens.append(word)
+        if _SEPARATORS.search(word):
+            tokens.extend(part for part in _SEPARATORS.split(word) if part)
+    tokens.extend(f"{a}_{b}" for a, b in zip(words, words[1:]))
+    return tokens
+
+
+class BM25Index:
+    """
+    Inverted index BM25 cập nhật tăng dần: term -> {slot: tf}.
+    Slot của tài liệu bị xóa được tái sử dụng nên index không phình ra theo số lần sửa.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._slots: Dict[str, int] = {}
+        self._doc_ids: List[Optional[str]] = []
+        self._doc_terms: List[Tuple[str, ...]] = []
+        self._doc_len: List[int] = []
+        self._texts: Dict[str, str] = {}
+        self._free: List[int] = []
+        self._total_len = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._slots
+
+    def text(self, doc_id: str) -> Optional[str]:
+        return self._texts.get(doc_id)
+
+    def ids(self) -> List[str]:
+        return list(self._slots)
+
+    def add(self, doc_id: str, text: str) -> None:
+        with self._lock:
+            if self._texts.get(doc_id) == text:
+                return
+            self.remove(doc_id)
+            counts = Counter(tokenize(text))
+            if self._free:
+                slot = self._free.pop()
+            else:
+                slot = len(self._doc_ids)
+                self._doc_ids.append(None)
+                self._doc_terms.append(())
+                self._doc_len.append(0)
+            for term, tf in counts.items():
+                self._postings.setdefault(term, {})[slot] = tf
+            length = sum(counts.values())
+            self._doc_ids[slot] = doc_id
+            self._doc_terms[slot] = tuple(counts)
+            self._doc_len[slot] = length
+            self._total_len += length
+            self._slots[doc_id] = slot
+            self._texts[doc_id] = text
+
+    def remove(self, doc_id: str) -> bool:
+        with self._lock:
+            slot = self._slots.pop(doc_id, None)
+            if slot is None:
+                return False
+            for term in self._doc_terms[slot]:
+                postings = self._postings[term]
+                del postings[slot]
+                if not postings:
+                    del self._postings[term]
+            self._total_len -= self._doc_len[slot]
+            self._doc_ids[slot] = None
+            self._doc_terms[slot] = ()
+            self._doc_len[slot] = 0
+            del self._texts[doc_id]
+            self._free.append(slot)
+            return True
+
+    def search(self, query: str, k: int = 10, accept: Optional[Callable[[str], bool]] = None) -> List[Tuple[str, float]]:
+        with self._lock:
+            n_docs = len(self._slots)
+            if not n_docs:
+                return []
+            avg_len = self._total_len / n_docs
+            terms = [t for t in set(tokenize(query)) if t in self._postings]
+            # Term xuất hiện ở quá nửa tài liệu gần như không phân biệt được gì -> bỏ nếu còn term khác
+            rare = [t for t in terms if len(self._postings[t]) <= n_docs / 2]
+            scores: Dict[int, float] = {}
+            for term in rare or terms:
+                postings = self._postings[term]
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for slot, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[slot] / avg_len)
+                    scores[slot] = scores.get(slot, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+            if accept is None:
+                top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+                return [(self._doc_ids[slot], score) for slot, score in top]
+            results = []
+            for slot, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+                if accept(self._doc_ids[slot]):
+                    results.append((self._doc_ids[slot], score))
+                    if len(results) == k:
+                        break
+            return results
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """RRF: score(d) = sum 1 / (k + rank). Không cần chuẩn hóa thang điểm BM25 và cosine"""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+class HybridRetriever:
+    """
+    Một lần gọi = vector search + BM25 trên cùng tập chunk, gộp bằng RRF.
+    BM25 dựng lazy từ metadata của vector store ("text"), cập nhật tăng dần qua ingestion
+    và đồng bộ lại khi vector store được reload (tiến trình khác vừa ghi).
+    """
+
+    def __init__(self, store: VectorStore, candidates: int = 20, rrf_k: int = 60):
+        self.store = store
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.index = BM25Index()
+        self._generation: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _sync(self) -> None:
+        """Đồng bộ BM25 với vector store sau khi store load lại từ đĩa (chỉ xử lý phần khác biệt)"""
+        self.store.maybe_reload()
+        if self._generation == self.store.generation:
+            return
+        with self._lock:
+            if self._generation == self.store.generation:
+                return
+            generation = self.store.generation
+            seen = set()
+            for chunk_id, metadata in self.store.items():
+                seen.add(chunk_id)
+                self.index.add(chunk_id, metadata.get("text", ""))
+            for chunk_id in self.index.ids():
+                if chunk_id not in seen:
+                    self.index.remove(chunk_id)
+            self._generation = generation
+
+    def apply_changes(self, added: Iterable[Tuple[str, str]], removed: Iterable[str]) -> None:
+        """Hook cho ingestion: cập nhật BM25 ngay trong tiến trình vừa ghi"""
+        for chunk_id in removed:
+            self.index.remove(chunk_id)
+        for chunk_id, text in added:
+            self.index.add(chunk_id, text)
+
+    def search(
+        self,
+        query: str,
+        vector: Optional[np.ndarray],
+        k: int = 5,
+        where: Optional[Dict[str, Any]] = None
+    ) -> List[SearchHit]:
+        self._sync()
+        n_candidates = max(self.candidates, k)
+        rankings: List[List[str]] = []
+        if vector is not None:
+            rankings.append([hit.id for hit in self.store.search(vector, n_candidates, where=where)])
+        accept = (lambda cid: matches_filter(self.store.get(cid) or {}, where)) if where else None
+        rankings.append([cid for cid, _ in self.index.search(query, n_candidates, accept)])
+
+        hits = []
+        for chunk_id, score in reciprocal_rank_fusion(rankings, self.rrf_k):
+            metadata = self.store.get(chunk_id)
+            if metadata is not None:
+                hits.append(SearchHit(chunk_id, score, metadata))
+                if len(hits) == k:
+                    break
+        return hits
+
+    async def asearch(self, query: str, k: int = 5, where: Optional[Dict[str, Any]] = None) -> List[SearchHit]:
+        vector = await get_embedding_service().embed(query)
+        return await asyncio.get_running_loop().run_in_executor(None, self.search, query, vector, k, where)
+
+
+_retriever: Optional[HybridRetriever] = None
+_retriever_lock = threading.Lock()
+
+
+def get_retriever() -> HybridRetriever:
+    global _retriever
+    with _retriever_lock:
+        if _retriever is None:
+            _retriever = HybridRetriever(
+                get_vector_store(),
+                candidates=settings.RETRIEVAL_CANDIDATES,
+                rrf_k=settings.RETRIEVAL_RRF_K
+            )
+        return _retriever
+
+
+def apply_index_changes(added: Iterable[Tuple[str, str]], removed: Iterable[str]) -> None:
+    """Hook cho ingestion: bỏ qua nếu worker chưa dựng BM25 (sẽ dựng đầy đủ ở lần tìm đầu tiên)"""
+    if _retriever is not None and _retriever._generation is not None:
+        _retriever.apply_changes(added, removed)
@@ -0,0 +1,175 @@
+# Semantic cache: câu hỏi gần giống (cosine >= ngưỡng) -> trả lại câu trả lời đã sinh, không gọi LLM
+import hashlib
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+from app.core.config import settings
+from app.rag.embeddings import get_embedding_service
+
+
+def source_fingerprint(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    # chunk_id -> fingerprint nội dung chunk lúc sinh câu trả lời
+    sources: Dict[str, str] = field(default_factory=dict)
+    score: float = 0.0
+
+
+class SemanticCache:
+    """
+    Cache trong tiến trình, vector câu hỏi nằm trong một ma trận cấp phát sẵn (maxsize, dim):
+    tra cứu = một phép nhân ma trận-vector.
+    - TTL theo từng entry, đầy thì loại entry lâu không dùng nhất (LRU)
+    - invalidate_documents(): gỡ các câu trả lời dựa trên bài viết vừa thay đổi (worker đang chạy ingestion)
+    - lookup(validate=...): kiểm tra lại nguồn khi hit, để worker khác cũng không trả câu trả lời cũ
+    """
+
+    def __init__(self, dim: int, maxsize: int = 5000, ttl: float = 21600, threshold: float = 0.92):
+        self.dim = dim
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((maxsize, dim), dtype=np.float32)
+        self._expires_at = np.zeros(maxsize, dtype=np.float64)
+        self._last_used = np.zeros(maxsize, dtype=np.float64)
+        self._used = np.zeros(maxsize, dtype=bool)
+        self._entries: List[Optional[CachedAnswer]] = [None] * maxsize
+        # doc_id -> các slot dùng tài liệu đó
+        self._by_doc: Dict[str, Set[int]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _doc_id(chunk_id: str) -> str:
+        return chunk_id.rsplit(":", 1)[0]
+
+    def _free(self, slot: int) -> None:
+        entry = self._entries[slot]
+        if entry is not None:
+            for chunk_id in entry.sources:
+                slots = self._by_doc.get(self._doc_id(chunk_id))
+                if slots is not None:
+                    slots.discard(slot)
+                    if not slots:
+                        del self._by_doc[self._doc_id(chunk_id)]
+        self._entries[slot] = None
+        self._used[slot] = False
+
+    def lookup(
+        self,
+        vector: np.ndarray,
+        validate: Optional[Callable[[Dict[str, str]], bool]] = None
+    ) -> Optional[CachedAnswer]:
+        now = time.monotonic()
+        with self._lock:
+            slot, entry, score = -1, None, 0.0
+            candidates = np.flatnonzero(self._used & (self._expires_at > now))
+            if len(candidates):
+                scores = self._vectors[candidates] @ np.asarray(vector, dtype=np.float32)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    slot = int(candidates[best])
+                    entry, score = self._entries[slot], float(scores[best])
+            if entry is None:
+                self.misses += 1
+                return None
+        # validate có thể nạp lại vector store từ đĩa -> chạy ngoài lock, không chặn lookup / put khác
+        valid = validate is None or validate(entry.sources)
+        with self._lock:
+            # Trong lúc validate, slot có thể đã bị invalidate / thay bằng entry khác: chỉ đụng tới slot nếu vẫn là entry cũ
+            current = self._entries[slot] is entry
+            if valid:
+                if current:
+                    self._last_used[slot] = now
+                self.hits += 1
+                return CachedAnswer(entry.question, entry.answer, entry.sources, score)
+            # Nguồn đã đổi (bài viết được sửa ở worker khác) -> bỏ entry
+            if current:
+                self._free(slot)
+                self.invalidations += 1
+            self.misses += 1
+            return None
+
+    def put(self, vector: np.ndarray, question: str, answer: str, sources: Dict[str, str]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            free = np.flatnonzero(~self._used | (self._expires_at <= now))
+            if len(free):
+                slot = int(free[0])
+            else:
+                slot = int(np.argmin(self._last_used))
+                self.evictions += 1
+            self._free(slot)
+            self._vectors[slot] = vector
+            self._expires_at[slot] = now + self.ttl
+            self._last_used[slot] = now
+            self._used[slot] = True
+            self._entries[slot] = CachedAnswer(question, answer, dict(sources))
+            for chunk_id in sources:
+                self._by_doc.setdefault(self._doc_id(chunk_id), set()).add(slot)
+
+    def invalidate_documents(self, doc_ids: Iterable[str]) -> int:
+        removed = 0
+        with self._lock:
+            for doc_id in doc_ids:
+                for slot in list(self._by_doc.get(doc_id, ())):
+                    self._free(slot)
+                    removed += 1
+            self.invalidations += removed
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            for slot in np.flatnonzero(self._used):
+                self._free(int(slot))
+
+    def __len__(self) -> int:
+        return int(self._used.sum())
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+_cache: Optional[SemanticCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> SemanticCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SemanticCache(
+                dim=get_embedding_service().dim,
+                maxsize=settings.SEMANTIC_CACHE_MAX_SIZE,
+                ttl=settings.SEMANTIC_CACHE_TTL_SECONDS,
+                threshold=settings.SEMANTIC_CACHE_THRESHOLD
+            )
+        return _cache
+
+
+def invalidate_documents(doc_ids: Iterable[str]) -> int:
+    """Hook cho ingestion: không khởi tạo cache nếu worker chưa dùng tới"""
+    return _cache.invalidate_documents(doc_ids) if _cache is not None else 0
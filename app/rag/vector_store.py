@@ -1 +1,492 @@
-# Vector store interface (Pinecone/PGVector) placeholder
+# Vector store nội bộ: IVF-Flat trên NumPy, lưu bằng file memory-mapped (không cần Pinecone/PGVector)
+import json
+import logging
+import os
+import threading
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Số vector tối thiểu trên mỗi cụm để train IVF (ít hơn thì tìm brute-force)
+_MIN_POINTS_PER_LIST = 39
+_ASSIGN_CHUNK = 8192
+
+
+@dataclass
+class SearchHit:
+    id: str
+    score: float
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+def _l2_normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Gán mỗi vector vào centroid gần nhất (cosine), xử lý theo chunk để giới hạn bộ nhớ"""
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), _ASSIGN_CHUNK):
+        out[start:start + _ASSIGN_CHUNK] = np.argmax(vectors[start:start + _ASSIGN_CHUNK] @ centroids.T, axis=1)
+    return out
+
+
+def _kmeans(vectors: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means (vectorized): trả về k centroid đã chuẩn hóa"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        # Cụm rỗng -> lấy ngẫu nhiên một điểm làm centroid mới
+        sums[empty] = vectors[rng.integers(len(vectors), size=int(empty.sum()))]
+        centroids = _l2_normalize(sums)
+    return centroids
+
+
+def _write_atomic(path: str, write) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def matches_filter(metadata: Dict[str, Any], where: Dict[str, Any]) -> bool:
+    """Lọc metadata: giá trị đơn = so bằng, list/tuple/set = thuộc tập"""
+    for key, expected in where.items():
+        value = metadata.get(key)
+        if isinstance(expected, (list, tuple, set, frozenset)):
+            if value not in expected:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+def _write_json(path: str, data: Any) -> None:
+    _write_atomic(path, lambda f: f.write(json.dumps(data, ensure_ascii=False).encode("utf-8")))
+
+
+def _filter_key(where: Dict[str, Any]) -> Tuple:
+    return tuple(sorted((k, tuple(v) if isinstance(v, (list, tuple, set, frozenset)) else v) for k, v in where.items()))
+
+
+def _filter_mask(metadatas: Sequence[Dict[str, Any]], where: Dict[str, Any]) -> np.ndarray:
+    return np.fromiter((matches_filter(m, where) for m in metadatas), dtype=bool, count=len(metadatas))
+
+
+class VectorStore:
+    """
+    Index IVF-Flat (cosine) gồm 2 phần:
+    - base: vectors.<version>.npy mở bằng mmap (các worker dùng chung page cache, khởi động tức thì),
+      sắp theo cụm nên mỗi cụm là một đoạn liên tục, chỉ quét `nprobe` cụm khi tìm kiếm.
+      Base nhỏ hơn `exact_threshold` vector thì quét toàn bộ (nhanh hơn và recall = 1).
+    - delta: các vector mới thêm (quét brute-force), lưu riêng nên save() rẻ
+    Xóa = tombstone. compact() gộp delta vào base và train lại centroid.
+
+    Mỗi lần compact ghi base ra bộ file mới theo version, rồi mới ghi manifest.json trỏ tới version đó:
+    reader không bao giờ ghép vector mới với id cũ, kể cả khi tiến trình ghi chết giữa chừng.
+    Chỉ một tiến trình nên ghi (job ingestion); các worker khác chỉ đọc và tự reload khi file đổi.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        dim: int,
+        nprobe: int = 8,
+        compact_threshold: int = 5000,
+        exact_threshold: int = 20000
+    ):
+        self.path = path
+        self.dim = dim
+        self.nprobe = nprobe
+        self.compact_threshold = compact_threshold
+        self.exact_threshold = exact_threshold
+        self._lock = threading.RLock()
+        self._loaded_mtime: Optional[int] = None
+        # Tăng mỗi lần load lại từ đĩa (index phụ như BM25 dựa vào đây để đồng bộ)
+        self.generation = 0
+        os.makedirs(path, exist_ok=True)
+        self._reset()
+        self.load()
+
+    # --- TRẠNG THÁI TRONG BỘ NHỚ ---
+    def _reset(self) -> None:
+        # Version của bộ file base đang dùng (theo manifest.json, 0 = chưa compact lần nào)
+        self._version = 0
+        self._base_vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self._base_ids: List[str] = []
+        self._base_meta: List[Dict[str, Any]] = []
+        self._base_alive = np.zeros(0, dtype=bool)
+        self._centroids: Optional[np.ndarray] = None
+        # Cụm c = các row [_list_bounds[c], _list_bounds[c + 1]) của base
+        self._list_bounds: Optional[np.ndarray] = None
+        self._filter_cache: Dict[Tuple, np.ndarray] = {}
+
+        self._delta_vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self._delta_alive = np.zeros(0, dtype=bool)
+        self._delta_count = 0
+        self._delta_ids: List[str] = []
+        self._delta_meta: List[Dict[str, Any]] = []
+        self._delta_file: Optional[str] = None
+        # Mask lọc metadata của delta, nối thêm dần khi delta lớn lên (metadata mỗi row không đổi)
+        self._delta_filter_cache: Dict[Tuple, np.ndarray] = {}
+
+        # id -> ("b" | "d", row)
+        self._index: Dict[str, Tuple[str, int]] = {}
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    # --- LOAD / SAVE ---
+    def load(self) -> None:
+        """Đọc base (mmap) + delta từ đĩa"""
+        with self._lock:
+            for attempt in range(3):
+                try:
+                    self._load_files()
+                    return
+                except (FileNotFoundError, ValueError) as e:
+                    # Tiến trình ghi vừa thay bộ file giữa lúc đọc -> đọc lại theo manifest mới
+                    logger.warning(f"Vector store changed while loading ({e}), retrying")
+                    error = e
+            raise error
+
+    def _load_files(self) -> None:
+        self._reset()
+        self.generation += 1
+        # Stat trước khi đọc: save() xảy ra trong lúc load sẽ được maybe_reload() thấy lần sau
+        try:
+            delta_mtime = os.stat(self._file("delta.json")).st_mtime_ns
+        except FileNotFoundError:
+            delta_mtime = None
+
+        manifest_path = self._file("manifest.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            self._load_base(manifest)
+        elif os.path.exists(self._file("base.json")):
+            self._load_legacy_base()
+
+        if delta_mtime is not None:
+            with open(self._file("delta.json"), encoding="utf-8") as f:
+                delta = json.load(f)
+            # Delta của base cũ (compact đang ghi dở) đã nằm trong base mới -> bỏ qua
+            if delta.get("base_version", 0) == self._version:
+                for item_id in delta["deleted"]:
+                    self._delete_one(item_id)
+                self._delta_file = delta.get("vectors", "delta.npy")
+                vectors = np.load(self._file(self._delta_file))
+                if len(vectors) != len(delta["ids"]):
+                    raise ValueError(f"delta has {len(vectors)} vectors for {len(delta['ids'])} ids")
+                self._append_delta(delta["ids"], vectors, delta["metadata"])
+        self._loaded_mtime = delta_mtime
+
+    def _load_base(self, manifest: Dict[str, Any]) -> None:
+        version, count = manifest["version"], manifest["count"]
+        with open(self._file(f"base.{version}.json"), encoding="utf-8") as f:
+            base = json.load(f)
+        vectors = np.load(self._file(f"vectors.{version}.npy"), mmap_mode="r")
+        if vectors.shape != (count, self.dim) or len(base["ids"]) != count:
+            raise ValueError(f"base version {version} does not match its manifest")
+        if manifest.get("ivf"):
+            centroids = np.load(self._file(f"centroids.{version}.npy"))
+            bounds = np.load(self._file(f"bounds.{version}.npy"))
+            if len(bounds) != len(centroids) + 1 or bounds[-1] != count:
+                raise ValueError(f"IVF lists of version {version} do not match its manifest")
+            self._centroids, self._list_bounds = centroids, bounds
+        self._set_base(version, base["ids"], base["metadata"], vectors)
+
+    def _load_legacy_base(self) -> None:
+        """Định dạng cũ (base.json + vectors.npy, chưa có manifest): quét toàn bộ tới lần compact kế tiếp"""
+        with open(self._file("base.json"), encoding="utf-8") as f:
+            base = json.load(f)
+        vectors = np.load(self._file("vectors.npy"), mmap_mode="r")
+        if len(vectors) != len(base["ids"]):
+            raise ValueError("legacy base.json does not match vectors.npy")
+        self._set_base(0, base["ids"], base["metadata"], vectors)
+
+    def _set_base(self, version: int, ids: List[str], metadata: List[Dict[str, Any]], vectors: np.ndarray) -> None:
+        self._version = version
+        self._base_ids = ids
+        self._base_meta = metadata
+        self._base_vectors = vectors
+        self._base_alive = np.ones(len(ids), dtype=bool)
+        for row, item_id in enumerate(ids):
+            self._index[item_id] = ("b", row)
+
+    def maybe_reload(self) -> None:
+        """Worker chỉ đọc: reload nếu tiến trình ghi vừa save/compact"""
+        try:
+            mtime = os.stat(self._file("delta.json")).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._loaded_mtime:
+            self.load()
+
+    def _write_delta(self, ids: List[str], metadata: List[Dict[str, Any]], vectors: np.ndarray, deleted: List[str]) -> None:
+        """Vector delta ghi ra file tên mới, delta.json (ghi sau cùng) trỏ tới file đó"""
+        previous = self._delta_file
+        self._delta_file = f"delta.{uuid.uuid4().hex}.npy"
+        _write_atomic(self._file(self._delta_file), lambda f: np.save(f, vectors))
+        _write_json(self._file("delta.json"), {
+            "base_version": self._version,
+            "vectors": self._delta_file,
+            "ids": ids,
+            "metadata": metadata,
+            "deleted": deleted
+        })
+        self._loaded_mtime = os.stat(self._file("delta.json")).st_mtime_ns
+        if previous and previous != self._delta_file:
+            self._remove(previous)
+
+    def _remove(self, name: str) -> None:
+        try:
+            os.remove(self._file(name))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # Windows: file còn được mmap bởi worker khác, lần compact sau sẽ dọn
+            logger.warning(f"Could not remove {name}: {e}")
+
+    def save(self) -> None:
+        """Lưu delta + tombstone (rẻ). Tự compact khi delta quá lớn"""
+        with self._lock:
+            if self._delta_count >= self.compact_threshold:
+                self.compact()
+                return
+            deleted = [self._base_ids[row] for row in np.flatnonzero(~self._base_alive)]
+            alive = np.flatnonzero(self._delta_alive[:self._delta_count])
+            self._write_delta(
+                [self._delta_ids[row] for row in alive],
+                [self._delta_meta[row] for row in alive],
+                self._delta_vectors[alive],
+                deleted
+            )
+
+    def compact(self) -> None:
+        """Gộp delta vào base, train lại centroid IVF, ghi bộ file base mới rồi mới đổi manifest"""
+        with self._lock:
+            base_rows = np.flatnonzero(self._base_alive)
+            delta_rows = np.flatnonzero(self._delta_alive[:self._delta_count])
+            ids = [self._base_ids[row] for row in base_rows] + [self._delta_ids[row] for row in delta_rows]
+            metadata = [self._base_meta[row] for row in base_rows] + [self._delta_meta[row] for row in delta_rows]
+            matrix = np.vstack([
+                np.asarray(self._base_vectors[base_rows], dtype=np.float32).reshape(-1, self.dim),
+                self._delta_vectors[delta_rows].reshape(-1, self.dim)
+            ])
+
+            nlist = settings.VECTOR_STORE_NLIST or int(np.sqrt(len(matrix)))
+            trained = nlist > 1 and len(matrix) >= nlist * _MIN_POINTS_PER_LIST
+            version = self._version + 1
+
+            if trained:
+                sample = matrix[np.random.default_rng(0).choice(len(matrix), min(len(matrix), nlist * 256), replace=False)]
+                centroids = _kmeans(sample, nlist)
+                assign = _assign(matrix, centroids)
+                # Sắp base theo cụm: mỗi cụm là một đoạn liên tục, search đọc slice thay vì gom row
+                order = np.argsort(assign, kind="stable")
+                matrix = matrix[order]
+                ids = [ids[row] for row in order]
+                metadata = [metadata[row] for row in order]
+                bounds = np.searchsorted(assign[order], np.arange(nlist + 1))
+                _write_atomic(self._file(f"centroids.{version}.npy"), lambda f: np.save(f, centroids))
+                _write_atomic(self._file(f"bounds.{version}.npy"), lambda f: np.save(f, bounds))
+            _write_atomic(self._file(f"vectors.{version}.npy"), lambda f: np.save(f, matrix))
+            _write_json(self._file(f"base.{version}.json"), {"ids": ids, "metadata": metadata})
+
+            # Manifest ghi sau cùng: từ đây reader mới thấy base version mới
+            _write_json(self._file("manifest.json"), {
+                "version": version, "count": len(ids), "dim": self.dim, "ivf": trained
+            })
+            previous = self._version
+            self._version = version
+            # Delta rỗng cho base mới (ghi sau manifest để worker khác reload)
+            self._write_delta([], [], np.zeros((0, self.dim), dtype=np.float32), [])
+
+            stale = [f"{name}.{previous}.{ext}" for name, ext in (
+                ("vectors", "npy"), ("base", "json"), ("centroids", "npy"), ("bounds", "npy")
+            )]
+            stale += ["vectors.npy", "base.json", "centroids.npy", "assign.npy", "delta.npy"]
+            self.load()
+            for name in stale:
+                if os.path.exists(self._file(name)):
+                    self._remove(name)
+            logger.info(f"Vector store compacted: {len(ids)} vectors, version={version}, ivf={'on' if trained else 'off'}")
+
+    # --- GHI ---
+    def _append_delta(self, ids: Sequence[str], vectors: np.ndarray, metadatas: Sequence[Dict[str, Any]]) -> None:
+        needed = self._delta_count + len(ids)
+        if needed > len(self._delta_vectors):
+            capacity = max(needed, 2 * len(self._delta_vectors), 64)
+            grown = np.zeros((capacity, self.dim), dtype=np.float32)
+            grown[:self._delta_count] = self._delta_vectors[:self._delta_count]
+            self._delta_vectors = grown
+            alive = np.zeros(capacity, dtype=bool)
+            alive[:self._delta_count] = self._delta_alive[:self._delta_count]
+            self._delta_alive = alive
+        self._delta_vectors[self._delta_count:needed] = vectors
+        self._delta_alive[self._delta_count:needed] = True
+        for offset, (item_id, meta) in enumerate(zip(ids, metadatas)):
+            self._delta_ids.append(item_id)
+            self._delta_meta.append(meta)
+            self._index[item_id] = ("d", self._delta_count + offset)
+        self._delta_count = needed
+
+    def _delete_one(self, item_id: str) -> bool:
+        location = self._index.pop(item_id, None)
+        if location is None:
+            return False
+        segment, row = location
+        if segment == "b":
+            self._base_alive[row] = False
+        else:
+            self._delta_alive[row] = False
+        return True
+
+    def add(self, ids: Sequence[str], vectors: np.ndarray, metadatas: Optional[Sequence[Dict[str, Any]]] = None) -> None:
+        """Thêm / cập nhật (upsert) vector theo id"""
+        vectors = _l2_normalize(np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dim))
+        metadatas = metadatas or [{} for _ in ids]
+        with self._lock:
+            for item_id in ids:
+                self._delete_one(item_id)
+            self._append_delta(list(ids), vectors, list(metadatas))
+
+    def delete(self, ids: Sequence[str]) -> int:
+        with self._lock:
+            return sum(self._delete_one(item_id) for item_id in ids)
+
+    def get(self, item_id: str) -> Optional[Dict[str, Any]]:
+        location = self._index.get(item_id)
+        if location is None:
+            return None
+        segment, row = location
+        return self._base_meta[row] if segment == "b" else self._delta_meta[row]
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Duyệt (id, metadata) của các vector còn sống"""
+        with self._lock:
+            snapshot = list(self._index.items())
+        for item_id, (segment, row) in snapshot:
+            yield item_id, (self._base_meta[row] if segment == "b" else self._delta_meta[row])
+
+    # --- TÌM KIẾM ---
+    def _base_filter(self, where: Dict[str, Any]) -> np.ndarray:
+        key = _filter_key(where)
+        mask = self._filter_cache.get(key)
+        if mask is None:
+            mask = self._filter_cache[key] = _filter_mask(self._base_meta, where)
+        return mask
+
+    def _delta_filter(self, where: Dict[str, Any]) -> np.ndarray:
+        key = _filter_key(where)
+        mask = self._delta_filter_cache.get(key)
+        done = 0 if mask is None else len(mask)
+        if done < self._delta_count:
+            tail = _filter_mask(self._delta_meta[done:self._delta_count], where)
+            mask = self._delta_filter_cache[key] = tail if mask is None else np.concatenate([mask, tail])
+        return mask
+
+    def _probe_base(self, query: np.ndarray, nprobe: Optional[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """(scores, rows) của base: quét toàn bộ hoặc chỉ các cụm gần query nhất"""
+        n_base = len(self._base_ids)
+        probe = min(nprobe or self.nprobe, len(self._centroids)) if self._centroids is not None else 0
+        # Base nhỏ / probe gần hết các cụm: một phép nhân ma trận trên toàn bộ nhanh hơn IVF
+        if not probe or n_base < self.exact_threshold or 2 * probe >= len(self._centroids):
+            return np.asarray(self._base_vectors @ query), np.arange(n_base)
+
+        nearest = np.sort(np.argpartition(-(self._centroids @ query), probe - 1)[:probe])
+        starts, ends = self._list_bounds[nearest], self._list_bounds[nearest + 1]
+        scores = [np.asarray(self._base_vectors[start:end] @ query) for start, end in zip(starts, ends) if end > start]
+        if not scores:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        rows = np.concatenate([np.arange(start, end) for start, end in zip(starts, ends) if end > start])
+        return np.concatenate(scores), rows
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int = 5,
+        where: Optional[Dict[str, Any]] = None,
+        nprobe: Optional[int] = None
+    ) -> List[SearchHit]:
+        """
+        Top-k theo cosine. where: lọc metadata, vd {"faculty": "CNTT", "status": ["PUBLISHED"]}.
+        nprobe: số cụm IVF cần quét (càng lớn recall càng cao, chậm hơn).
+        """
+        query = _l2_normalize(np.asarray(query, dtype=np.float32).reshape(self.dim))
+        self.maybe_reload()
+        with self._lock:
+            candidates: List[Tuple[np.ndarray, np.ndarray]] = []  # (scores, ids row) theo segment
+            n_base = len(self._base_ids)
+
+            if n_base:
+                scores, rows = self._probe_base(query, nprobe)
+                mask = self._base_alive[rows]
+                if where:
+                    mask &= self._base_filter(where)[rows]
+                if not mask.all():
+                    scores, rows = scores[mask], rows[mask]
+                if len(rows):
+                    candidates.append((scores, rows))
+
+            # Delta: brute-force
+            if self._delta_count:
+                mask = self._delta_alive[:self._delta_count]
+                if where:
+                    mask = mask & self._delta_filter(where)
+                rows = np.flatnonzero(mask)
+                if len(rows):
+                    candidates.append((self._delta_vectors[rows] @ query, rows + n_base))
+
+            if not candidates:
+                return []
+            scores = np.concatenate([c[0] for c in candidates]) if len(candidates) > 1 else candidates[0][0]
+            rows = np.concatenate([c[1] for c in candidates]) if len(candidates) > 1 else candidates[0][1]
+            top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            hits = []
+            for i in top:
+                row = int(rows[i])
+                if row < n_base:
+                    hits.append(SearchHit(self._base_ids[row], float(scores[i]), self._base_meta[row]))
+                else:
+                    hits.append(SearchHit(self._delta_ids[row - n_base], float(scores[i]), self._delta_meta[row - n_base]))
+            return hits
+
+
+_store: Optional[VectorStore] = None
+_store_lock = threading.Lock()
+
+
+def get_vector_store() -> VectorStore:
+    """Singleton theo tiến trình, mở lazy từ VECTOR_STORE_PATH"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = VectorStore(
+                path=settings.VECTOR_STORE_PATH,
+                dim=settings.EMBEDDING_DIM,
+                nprobe=settings.VECTOR_STORE_NPROBE,
+                compact_threshold=settings.VECTOR_STORE_COMPACT_THRESHOLD,
+                exact_threshold=settings.VECTOR_STORE_EXACT_THRESHOLD
+            )
+        return _store
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import jwt, JWTError
 
-from app.database.session import get_db
+from app.database.session import get_db, get_async_db
 from app.services.auth_service import AuthService
 from app.schemas.auth_schema import (
     LoginRequest, TokenResponse, StudentRegisterRequest, 
@@ -44,9 +45,9 @@ def verify_admin_role(current_user: dict = Depends(get_current_user)):
 # --- ENDPOINTS ---
 
 @router.post("/login", response_model=TokenResponse)
-def login(data: LoginRequest, db: Session = Depends(get_db)):
+async def login(data: LoginRequest, db: AsyncSession = Depends(get_async_db)):
     """API Đăng nhập (Dùng chung cho Mobile & Web)"""
-    return AuthService.authenticate_user(db, data)
+    return await AuthService.authenticate_user(db, data)
 
 @router.get("/auth_token", response_model=AuthTokenResponse)
 def verify_auth_token(payload: dict = Depends(authenticateToken), db: Session = Depends(get_db)):
@@ -85,13 +86,13 @@ def create_lecturer(
     return {"message": "Tạo giảng viên thành công", "email": new_user.email}
 
 @router.post("/change-password")
-def change_password(
+async def change_password(
     data: ChangePasswordRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user) # Yêu cầu phải login
 ):
     """API Đổi mật khẩu"""
-    return AuthService.change_password(db, current_user["id"], data.old_password, data.new_password)
+    return await AuthService.change_password(db, current_user["id"], data.old_password, data.new_password)
 
 @router.post("/forgot-password")
 def forgot_password(email: str):
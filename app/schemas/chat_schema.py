@@ -1,7 +1,8 @@
-from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional, List
+from pydantic import AliasChoices, BaseModel, Field, ConfigDict, computed_field
+from typing import Optional, List, Dict
 from datetime import datetime
 from app.shared.enums import ChatStatus, MessageType
+from app.utils.image_derivatives import derivative_urls
 
 # --- Message ---
 class MessageCreate(BaseModel):
@@ -19,6 +20,14 @@ class MessageResponse(BaseModel):
     
     model_config = ConfigDict(from_attributes=True)
 
+    @computed_field
+    @property
+    def derivatives(self) -> Optional[Dict[str, str]]:
+        """URL ảnh thumb/medium cho tin nhắn ảnh (client hiển thị preview thay vì ảnh gốc)"""
+        if self.msg_type != MessageType.IMAGE.value:
+            return None
+        return derivative_urls(self.content)
+
 # --- Conversation ---
 class ConversationResponse(BaseModel):
     id: str
@@ -29,8 +38,13 @@ class ConversationResponse(BaseModel):
     created_at: datetime
     last_message_at: Optional[datetime] = None
     
-    # Có thể include tin nhắn cuối cùng để hiển thị preview
-    last_message: Optional[str] = None 
+    # Preview tin nhắn cuối cùng (cột denormalize last_message_preview)
+    last_message: Optional[str] = Field(
+        None, validation_alias=AliasChoices("last_message", "last_message_preview")
+    )
+    last_message_sender_id: Optional[str] = None
+    last_message_type: Optional[str] = None
+    unread_count: Optional[int] = 0
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -42,4 +56,14 @@ class PaginatedMessagesResponse(BaseModel):
     total: int
     page: int
     size: int
-    items: List[MessageResponse]
\ No newline at end of file
+    items: List[MessageResponse]
+
+class CursorMessagesResponse(BaseModel):
+    """Phân trang keyset: dùng before_cursor để tải tin cũ hơn, after_cursor để lấy tin mới hơn"""
+    items: List[MessageResponse]
+    before_cursor: Optional[str] = None
+    after_cursor: Optional[str] = None
+    has_more: bool
+    has_newer: bool
+    # Tổng số tin nhắn (xấp xỉ, từ cache) - chỉ trả về khi client yêu cầu include_total
+    total: Optional[int] = None
\ No newline at end of file
@@ -1 +1,94 @@
 # Pydantic models for RAG input/output
+import json
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing import Optional, List
+from datetime import datetime
+from app.shared.enums import ArticleStatus, TrainingStatus
+
+# --- Training candidate ---
+class TrainingCandidateResponse(BaseModel):
+    id: str
+    question: str
+    sample_questions: List[str] = []
+    frequency: int
+    coverage: float
+    score: float
+    status: TrainingStatus
+    answer: Optional[str] = None
+    article_id: Optional[str] = None
+    first_seen_at: Optional[datetime] = None
+    last_seen_at: Optional[datetime] = None
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+    @field_validator("sample_questions", mode="before")
+    @classmethod
+    def parse_samples(cls, value):
+        """Cột sample_questions lưu dạng JSON text"""
+        if isinstance(value, str):
+            return json.loads(value)
+        return value or []
+
+class TrainingCandidateUpdate(BaseModel):
+    status: TrainingStatus
+    question: Optional[str] = None
+    answer: Optional[str] = None
+    # Phân loại cho bài viết tạo ra khi duyệt
+    category: Optional[str] = None
+    faculty: Optional[str] = None
+
+class TrainingCandidateListResponse(BaseModel):
+    total: int
+    items: List[TrainingCandidateResponse]
+
+class TrainingMineRequest(BaseModel):
+    days: Optional[int] = Field(None, ge=1, le=730, description="Số ngày log chat gần nhất (mặc định TRAINING_MINER_DAYS)")
+
+# --- Knowledge article ---
+class KnowledgeArticleCreate(BaseModel):
+    title: str = Field(..., min_length=1, max_length=255)
+    content: str
+    category: Optional[str] = None
+    faculty: Optional[str] = None
+    status: ArticleStatus = ArticleStatus.DRAFT
+
+class KnowledgeArticleUpdate(BaseModel):
+    title: Optional[str] = Field(None, min_length=1, max_length=255)
+    content: Optional[str] = None
+    category: Optional[str] = None
+    faculty: Optional[str] = None
+    status: Optional[ArticleStatus] = None
+
+class KnowledgeArticleResponse(BaseModel):
+    id: str
+    title: str
+    content: str
+    category: Optional[str] = None
+    faculty: Optional[str] = None
+    status: ArticleStatus
+    version: int
+    revision: int
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+class KnowledgeArticleListResponse(BaseModel):
+    version: int
+    total: int
+    items: List[KnowledgeArticleResponse]
+
+class KnowledgeChange(BaseModel):
+    id: str
+    revision: int
+    # True: bài đã bị xóa / không còn hiển thị với người gọi -> client xóa bản lưu cục bộ
+    deleted: bool = False
+    article: Optional[KnowledgeArticleResponse] = None
+
+class KnowledgeChangesResponse(BaseModel):
+    since: int
+    # Truyền lại làm `since` cho lần gọi tiếp theo
+    version: int
+    has_more: bool
+    items: List[KnowledgeChange]
@@ -34,6 +34,7 @@ class StudentProfileResponse(BaseModel):
     gpa: Optional[float] = None
     academic_status: Optional[AcademicStatus] = None
     last_contact: Optional[datetime] = None
+    total_chats: Optional[int] = None
     
     model_config = ConfigDict(from_attributes=True)
 
@@ -1,28 +1,42 @@
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 from app.models.user import User, Student, Agent
-from app.core.security import get_password_hash, verify_password, create_access_token, create_refresh_token
+from app.core.principal_cache import invalidate_principal
+from app.core.security import (
+    get_password_hash, get_password_hash_async, verify_and_update_password,
+    create_access_token, create_refresh_token
+)
 from app.schemas.auth_schema import StudentRegisterRequest, LecturerCreateRequest, LoginRequest
 from app.shared.enums import UserRole, AcademicStatus
+from app.utils.helpers import build_search_text
 
 class AuthService:
     
     @staticmethod
-    def authenticate_user(db: Session, login_data: LoginRequest):
+    async def authenticate_user(db: AsyncSession, login_data: LoginRequest):
         """Xử lý đăng nhập và cấp access token + refresh token"""
         # 1. Tìm user theo email
-        user = db.query(User).filter(User.email == login_data.email).first()
+        result = await db.execute(select(User).where(User.email == login_data.email))
+        user = result.scalar_one_or_none()
         if not user:
             raise HTTPException(status_code=400, detail="Email hoặc mật khẩu không chính xác")
         
-        # 2. Kiểm tra mật khẩu
-        if not verify_password(login_data.password, user.password_hash):
+        # 2. Kiểm tra mật khẩu (chạy trong process pool băm mật khẩu)
+        is_valid, new_hash = await verify_and_update_password(login_data.password, user.password_hash)
+        if not is_valid:
             raise HTTPException(status_code=400, detail="Email hoặc mật khẩu không chính xác")
         
         # 3. Kiểm tra active
         if not user.is_active:
              raise HTTPException(status_code=400, detail="Tài khoản đã bị khóa")
 
+        # Nâng cấp hash nếu BCRYPT_ROUNDS đã thay đổi so với lúc tạo hash
+        if new_hash:
+            user.password_hash = new_hash
+            await db.commit()
+
         # 4. Tạo access token và refresh token
         access_token = create_access_token(data={"sub": user.id, "role": user.role.value})
         refresh_token = create_refresh_token(data={"sub": user.id, "role": user.role.value})
@@ -65,7 +79,8 @@ class AuthService:
                 student_code=data.student_code,
                 class_name=data.class_name,
                 faculty=data.faculty,
-                academic_status=AcademicStatus.ACTIVE
+                academic_status=AcademicStatus.ACTIVE,
+                search_text=build_search_text(data.full_name, data.student_code, data.email)
             )
             db.add(new_student)
             db.commit()
@@ -107,18 +122,33 @@ class AuthService:
             raise HTTPException(status_code=500, detail=str(e))
 
     @staticmethod
-    def change_password(db: Session, user_id: str, old_pass: str, new_pass: str):
-        user = db.query(User).filter(User.id == user_id).first()
+    async def change_password(db: AsyncSession, user_id: str, old_pass: str, new_pass: str):
+        result = await db.execute(select(User).where(User.id == user_id))
+        user = result.scalar_one_or_none()
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        if not verify_password(old_pass, user.password_hash):
+        is_valid, _ = await verify_and_update_password(old_pass, user.password_hash)
+        if not is_valid:
             raise HTTPException(status_code=400, detail="Mật khẩu cũ không đúng")
             
-        user.password_hash = get_password_hash(new_pass)
-        db.commit()
+        user.password_hash = await get_password_hash_async(new_pass)
+        await db.commit()
+        invalidate_principal(user_id)
         return {"message": "Đổi mật khẩu thành công"}
 
+    @staticmethod
+    def set_user_active(db: Session, user_id: str, is_active: bool):
+        """Admin khóa / mở khóa tài khoản"""
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        user.is_active = is_active
+        db.commit()
+        invalidate_principal(user_id)
+        return {"user_id": user_id, "is_active": is_active}
+
     @staticmethod
     def refresh_access_token(db: Session, user_id: str, user_role: str):
         """Tạo access token mới từ refresh token"""
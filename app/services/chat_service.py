@@ -1,67 +1,261 @@
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_, desc, func
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_, desc, func, select, tuple_, update
 from fastapi import HTTPException, status
-from typing import Optional, List
+from typing import Optional, List, Tuple
 import logging
+import uuid
 from datetime import datetime
 
 from app.models.chat import Conversation, Message
 from app.models.user import User
+from app.core.config import settings
 from app.schemas.chat_schema import MessageCreate, MessageResponse, ConversationResponse
 from app.shared.enums import ChatStatus, MessageType, UserRole
+from app.services.message_writer import message_writer, PREVIEW_LENGTH
+from app.rag.llm_agent import bot_agent
+from app.services.dashboard_metrics import dashboard_metrics, sender_kind
+from app.services.student_activity import student_activity
 from app.sockets.manager import socket_manager
+from app.utils.helpers import TTLCache, encode_cursor, decode_time_cursor
 
 logger = logging.getLogger(__name__)
 
+# Cache tổng số tin nhắn theo conversation_id (dùng cho chế độ cursor, chấp nhận xấp xỉ)
+message_count_cache = TTLCache(
+    maxsize=settings.MESSAGE_COUNT_CACHE_MAX_SIZE,
+    ttl=settings.MESSAGE_COUNT_CACHE_TTL_SECONDS
+)
+
 class ChatService:
     def __init__(self, db: Session):
         self.db = db
 
-    async def send_message(self, sender_id: str, data: MessageCreate) -> Message:
+    def get_conversations(
+        self,
+        status_filter: Optional[ChatStatus],
+        limit: int = 20,
+        before: Optional[str] = None
+    ) -> Tuple[List[ConversationResponse], Optional[str]]:
+        """
+        Lấy danh sách hội thoại cho Admin (Sort by last_message_at).
+        Preview tin nhắn cuối + unread_count là cột denormalize nên chỉ cần 1 query.
+        Phân trang keyset theo (last_message_at, id), trả về kèm cursor trang sau.
+        """
+        query = self.db.query(Conversation)
+        
+        if status_filter:
+            query = query.filter(Conversation.status == status_filter)
+
+        if before:
+            try:
+                cursor = decode_time_cursor(before)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            query = query.filter(tuple_(Conversation.last_message_at, Conversation.id) < cursor)
+        
+        conversations = query.order_by(desc(Conversation.last_message_at), desc(Conversation.id))\
+            .limit(limit + 1).all()
+
+        next_cursor = None
+        if len(conversations) > limit:
+            conversations = conversations[:limit]
+            last = conversations[-1]
+            next_cursor = encode_cursor(last.last_message_at, last.id)
+        
+        return [ConversationResponse.model_validate(c) for c in conversations], next_cursor
+
+    def get_messages(self, conversation_id: str, page: int, size: int) -> dict:
+        """Lấy lịch sử tin nhắn (Phân trang)"""
+        offset = (page - 1) * size
+        total = self.db.query(Message).filter(Message.conversation_id == conversation_id).count()
+        
+        messages = self.db.query(Message)\
+            .filter(Message.conversation_id == conversation_id)\
+            .order_by(desc(Message.created_at))\
+            .offset(offset).limit(size)\
+            .all()
+        
+        # Đảo ngược lại để hiển thị đúng thứ tự thời gian (Cũ trên, Mới dưới) ở Client
+        messages.reverse()
+        
+        return {
+            "total": total,
+            "items": [MessageResponse.model_validate(m) for m in messages]
+        }
+
+    def get_messages_cursor(
+        self,
+        conversation_id: str,
+        size: int,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        include_total: bool = False
+    ) -> dict:
+        """
+        Lấy lịch sử tin nhắn theo cursor (keyset) trên (created_at, id).
+        - before: lấy các tin cũ hơn cursor (cuộn lên). Mặc định lấy trang mới nhất.
+        - after: lấy các tin mới hơn cursor (đồng bộ tin nhắn mới).
+        Chi phí mỗi trang không phụ thuộc độ sâu, không cần count().
+        """
+        if before and after:
+            raise HTTPException(status_code=400, detail="Only one of 'before' or 'after' is allowed")
+
+        try:
+            cursor = decode_time_cursor(before or after) if (before or after) else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+        sort_key = tuple_(Message.created_at, Message.id)
+        query = self.db.query(Message).filter(Message.conversation_id == conversation_id)
+
+        if after:
+            # Tin mới hơn cursor: sort tăng dần
+            query = query.filter(sort_key > cursor)\
+                .order_by(Message.created_at, Message.id)
+        else:
+            if cursor:
+                query = query.filter(sort_key < cursor)
+            query = query.order_by(desc(Message.created_at), desc(Message.id))
+
+        # Lấy dư 1 bản ghi để biết còn trang tiếp hay không
+        messages = query.limit(size + 1).all()
+        has_more = len(messages) > size
+        messages = messages[:size]
+
+        if not after:
+            # Đảo ngược để hiển thị đúng thứ tự thời gian (Cũ trên, Mới dưới)
+            messages.reverse()
+
+        oldest, newest = (messages[0], messages[-1]) if messages else (None, None)
+        if after:
+            has_older, has_newer = True, has_more
+        else:
+            has_older, has_newer = has_more, bool(before)
+
+        return {
+            "items": [MessageResponse.model_validate(m) for m in messages],
+            "before_cursor": encode_cursor(oldest.created_at, oldest.id) if oldest and has_older else None,
+            "after_cursor": encode_cursor(newest.created_at, newest.id) if newest else after,
+            "has_more": has_more,
+            "has_newer": has_newer,
+            "total": self._get_cached_message_total(conversation_id) if include_total else None
+        }
+
+    def _get_cached_message_total(self, conversation_id: str) -> int:
+        """Tổng số tin nhắn (xấp xỉ): count() một lần rồi cache, cộng dồn khi có tin mới"""
+        total = message_count_cache.get(conversation_id)
+        if total is None:
+            total = self.db.query(func.count(Message.id))\
+                .filter(Message.conversation_id == conversation_id)\
+                .scalar()
+            message_count_cache.set(conversation_id, total)
+        return total
+
+
+class AsyncChatService:
+    """
+    Các luồng ghi của chat (gửi tin, gán agent, đổi trạng thái) trên AsyncSession.
+    Dùng cho Socket.IO handlers và route async: query/commit không chặn event loop,
+    nên một câu INSERT chậm không làm trễ các socket khác trên cùng worker.
+    """
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _get_conversation(self, conversation_id: str) -> Conversation:
+        result = await self.db.execute(select(Conversation).where(Conversation.id == conversation_id))
+        conversation = result.scalar_one_or_none()
+        if not conversation:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        return conversation
+
+    async def send_message(
+        self,
+        sender_id: str,
+        data: MessageCreate,
+        sid: Optional[str] = None,
+        message_id: Optional[str] = None
+    ) -> Message:
         """
         Gửi tin nhắn:
         1. Nếu chưa có conversation_id -> Tạo mới (Chỉ sinh viên được tạo)
         2. Lưu tin nhắn
         3. Cập nhật last_message_at của Conversation
         4. Emit sự kiện socket
+        sid: socket người gửi, dùng để báo lỗi khi bật chế độ write-behind
+        message_id: id cấp trước (vd. tin nhắn bot đã stream với id này)
         """
         try:
             conversation = None
+            created = False
             
             # 1. Xử lý Conversation
             if data.conversation_id:
-                conversation = self.db.query(Conversation).filter(Conversation.id == data.conversation_id).first()
-                if not conversation:
-                    raise HTTPException(status_code=404, detail="Conversation not found")
+                conversation = await self._get_conversation(data.conversation_id)
+
+                # Write-behind: không commit từng tin, lưu theo lô ở message_writer
+                if message_writer.running and conversation.status != ChatStatus.CLOSED:
+                    return await self._send_write_behind(conversation, sender_id, data, sid, message_id)
             else:
                 # Nếu không có ID, tạo mới (Logic cho Sinh viên bắt đầu chat)
-                # Kiểm tra xem có hội thoại nào đang OPEN/PENDING không để reuse? (Tuỳ nghiệp vụ, ở đây tạo mới để đơn giản)
                 conversation = Conversation(
                     student_id=sender_id,
                     status=ChatStatus.PENDING_AGENT, # Chờ Agent accept
                     title="Hỗ trợ sinh viên"
                 )
                 self.db.add(conversation)
-                self.db.flush() # Để lấy ID
+                await self.db.flush() # Để lấy ID
+                created = True
 
-            # 2. Tạo Message
+            # 2. Tạo Message (gán sẵn created_at để không cần refresh sau commit)
+            now = datetime.utcnow()
             new_msg = Message(
+                id=message_id or str(uuid.uuid4()),
                 conversation_id=conversation.id,
                 sender_id=sender_id,
                 content=data.content,
-                msg_type=data.msg_type.value if data.msg_type else "TEXT"
+                msg_type=data.msg_type.value if data.msg_type else "TEXT",
+                created_at=now
             )
             self.db.add(new_msg)
 
-            # 3. Update Conversation Metadata
-            conversation.last_message_at = datetime.utcnow()
+            # 3. Update Conversation Metadata (kèm preview cho inbox Admin)
+            conversation.last_message_at = now
+            conversation.last_message_preview = new_msg.content[:PREVIEW_LENGTH]
+            conversation.last_message_sender_id = sender_id
+            conversation.last_message_type = new_msg.msg_type
+            if conversation.student_id == sender_id:
+                # Cộng dồn trong SQL để tránh lost update khi nhiều tin tới cùng lúc
+                conversation.unread_count = func.coalesce(Conversation.unread_count, 0) + 1
             
-            # Nếu Chat đang CLOSED, user nhắn tin -> Reopen?
+            # Nếu Chat đang CLOSED, user nhắn tin -> Reopen (UPDATE có điều kiện: nhiều tin tới cùng lúc chỉ mở lại một lần)
+            reopened = False
             if conversation.status == ChatStatus.CLOSED:
-                conversation.status = ChatStatus.PENDING_AGENT
+                result = await self.db.execute(
+                    update(Conversation)
+                    .where(Conversation.id == conversation.id, Conversation.status == ChatStatus.CLOSED)
+                    .values(status=ChatStatus.PENDING_AGENT)
+                    .execution_options(synchronize_session=False)
+                )
+                reopened = result.rowcount == 1
+                if reopened:
+                    set_committed_value(conversation, "status", ChatStatus.PENDING_AGENT)
 
-            self.db.commit()
-            self.db.refresh(new_msg)
+            first_response = await self._mark_first_response(conversation, sender_id, now)
+            await self.db.commit()
+            message_count_cache.incr(conversation.id)
+
+            # Cập nhật bộ đếm Dashboard (chỉ cộng trong bộ nhớ, flush nền)
+            if created:
+                dashboard_metrics.record_conversation_created(conversation.status, now)
+            elif reopened:
+                dashboard_metrics.record_transition(ChatStatus.CLOSED, conversation.status, conversation.agent_id, conversation.agent_id)
+            dashboard_metrics.record_message(sender_kind(sender_id, conversation.student_id), now)
+            if conversation.student_id == sender_id:
+                student_activity.record(sender_id, now, new_chat=created)
+            if first_response:
+                dashboard_metrics.record_first_response((now - conversation.created_at).total_seconds(), now)
 
             # 4. Real-time Notification
             msg_data = MessageResponse.model_validate(new_msg).model_dump(mode='json')
@@ -74,53 +268,120 @@ class ChatService:
                 # Logic thông báo cho Admin hoặc Agent đang phụ trách
                 pass 
 
+            # 5. Bot tự trả lời (chạy nền) khi chưa có cán bộ phụ trách
+            if bot_agent.should_reply(conversation, new_msg):
+                bot_agent.schedule_reply(conversation.id, new_msg.content)
+
             return new_msg
 
+        except HTTPException:
+            await self.db.rollback()
+            raise
         except Exception as e:
-            self.db.rollback()
+            await self.db.rollback()
             logger.error(f"Send message error: {e}")
             raise HTTPException(status_code=500, detail="Failed to send message")
 
-    def get_conversations(self, status_filter: Optional[ChatStatus], limit: int = 20) -> List[ConversationResponse]:
-        """Lấy danh sách hội thoại cho Admin (Sort by last_message_at)"""
-        query = self.db.query(Conversation)
-        
-        if status_filter:
-            query = query.filter(Conversation.status == status_filter)
-        
-        conversations = query.order_by(desc(Conversation.last_message_at)).limit(limit).all()
-        
-        # Map sang schema (Có thể tối ưu bằng eager load tin nhắn cuối nếu cần)
-        return [ConversationResponse.model_validate(c) for c in conversations]
+    async def _send_write_behind(
+        self,
+        conversation: Conversation,
+        sender_id: str,
+        data: MessageCreate,
+        sid: Optional[str],
+        message_id: Optional[str] = None
+    ) -> Message:
+        """Cấp id + created_at trong bộ nhớ, broadcast ngay, đưa vào hàng đợi ghi theo lô"""
+        new_msg = Message(
+            id=message_id or str(uuid.uuid4()),
+            conversation_id=conversation.id,
+            sender_id=sender_id,
+            content=data.content,
+            msg_type=data.msg_type.value if data.msg_type else "TEXT",
+            created_at=datetime.utcnow()
+        )
+        message_writer.enqueue({
+            "id": new_msg.id,
+            "conversation_id": new_msg.conversation_id,
+            "sender_id": new_msg.sender_id,
+            "content": new_msg.content,
+            "msg_type": new_msg.msg_type,
+            "created_at": new_msg.created_at
+        }, sid, from_student=conversation.student_id == sender_id)
+        message_count_cache.incr(conversation.id)
 
-    def get_messages(self, conversation_id: str, page: int, size: int) -> dict:
-        """Lấy lịch sử tin nhắn (Phân trang)"""
-        offset = (page - 1) * size
-        total = self.db.query(Message).filter(Message.conversation_id == conversation_id).count()
-        
-        messages = self.db.query(Message)\
-            .filter(Message.conversation_id == conversation_id)\
-            .order_by(desc(Message.created_at))\
-            .offset(offset).limit(size)\
-            .all()
-        
-        # Đảo ngược lại để hiển thị đúng thứ tự thời gian (Cũ trên, Mới dưới) ở Client
-        messages.reverse()
-        
-        return {
-            "total": total,
-            "items": [MessageResponse.model_validate(m) for m in messages]
-        }
+        dashboard_metrics.record_message(sender_kind(sender_id, conversation.student_id), new_msg.created_at)
+        if conversation.student_id == sender_id:
+            student_activity.record(sender_id, new_msg.created_at)
+        if await self._mark_first_response(conversation, sender_id, new_msg.created_at):
+            await self.db.commit()
+            dashboard_metrics.record_first_response((new_msg.created_at - conversation.created_at).total_seconds(), new_msg.created_at)
+
+        msg_data = MessageResponse.model_validate(new_msg).model_dump(mode='json')
+        await socket_manager.emit_to_room(conversation.id, "new_message", msg_data)
+
+        if bot_agent.should_reply(conversation, new_msg):
+            bot_agent.schedule_reply(conversation.id, new_msg.content)
+        return new_msg
+
+    async def _mark_first_response(self, conversation: Conversation, sender_id: str, now: datetime) -> bool:
+        """Ghi first_response_at cho tin đầu tiên không phải của sinh viên (UPDATE có điều kiện, chỉ một tin thắng)"""
+        if sender_id == conversation.student_id or conversation.first_response_at is not None:
+            return False
+        result = await self.db.execute(
+            update(Conversation)
+            .where(Conversation.id == conversation.id, Conversation.first_response_at.is_(None))
+            .values(first_response_at=now)
+        )
+        return result.rowcount == 1
+
+    async def _transition(
+        self,
+        conversation_id: str,
+        status: ChatStatus,
+        agent_id: Optional[str] = None
+    ) -> Tuple[Conversation, ChatStatus, Optional[str]]:
+        """
+        Đổi trạng thái (và người phụ trách nếu truyền agent_id) bằng UPDATE có điều kiện trên giá trị vừa đọc.
+        Request khác đổi trước -> rowcount 0 -> đọc lại rồi thử lại, nên mỗi chuyển đổi chỉ được
+        cộng vào gauge Dashboard đúng một lần. Trả về (hội thoại, trạng thái cũ, agent cũ).
+        """
+        while True:
+            row = (await self.db.execute(
+                select(Conversation.status, Conversation.agent_id).where(Conversation.id == conversation_id)
+            )).first()
+            if not row:
+                raise HTTPException(status_code=404, detail="Conversation not found")
+            old_status, old_agent = row
+            new_agent = agent_id or old_agent
+            result = await self.db.execute(
+                update(Conversation)
+                .where(
+                    Conversation.id == conversation_id,
+                    Conversation.status == old_status,
+                    Conversation.agent_id.is_not_distinct_from(old_agent)
+                )
+                .values(status=status, agent_id=new_agent)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 1:
+                break
+        await self.db.commit()
+        dashboard_metrics.record_transition(old_status, status, old_agent, new_agent)
+        conversation = await self.db.get(Conversation, conversation_id, populate_existing=True)
+        return conversation, old_status, old_agent
 
     async def assign_agent(self, conversation_id: str, agent_id: str) -> Conversation:
         """Gán Admin vào hỗ trợ"""
-        conversation = self.db.query(Conversation).filter(Conversation.id == conversation_id).first()
-        if not conversation:
-            raise HTTPException(status_code=404, detail="Conversation not found")
-        
-        conversation.agent_id = agent_id
-        conversation.status = ChatStatus.AGENT_PROCESSING
-        self.db.commit()
+        conversation, _, old_agent = await self._transition(conversation_id, ChatStatus.AGENT_PROCESSING, agent_id)
+        # Quyền vào room hội thoại đổi theo người phụ trách (áp dụng trên mọi worker):
+        # cán bộ cũ bị rút khỏi room, không còn nhận new_message / typing (Admin vẫn xem được mọi hội thoại)
+        if old_agent and old_agent != agent_id:
+            old_role = (await self.db.execute(select(User.role).where(User.id == old_agent))).scalar()
+            if old_role == UserRole.ADMIN:
+                await socket_manager.grant_room(old_agent, conversation.id)
+            else:
+                await socket_manager.revoke_room(old_agent, conversation.id)
+        await socket_manager.grant_room(agent_id, conversation.id)
         
         # Thông báo Socket
         await socket_manager.emit_to_room(conversation.id, "system_notification", {
@@ -130,15 +391,22 @@ class ChatService:
         
         return conversation
 
-    async def update_status(self, conversation_id: str, status: ChatStatus) -> Conversation:
-        conversation = self.db.query(Conversation).filter(Conversation.id == conversation_id).first()
-        if not conversation:
+    async def mark_read(self, conversation_id: str) -> dict:
+        """Admin/Agent đã đọc hội thoại -> reset unread_count"""
+        result = await self.db.execute(
+            update(Conversation)
+            .where(Conversation.id == conversation_id)
+            .values(unread_count=0)
+        )
+        if result.rowcount == 0:
             raise HTTPException(status_code=404, detail="Conversation not found")
-        
-        conversation.status = status
-        self.db.commit()
-        
+        await self.db.commit()
+        return {"conversation_id": conversation_id, "unread_count": 0}
+
+    async def update_status(self, conversation_id: str, status: ChatStatus) -> Conversation:
+        conversation, _, _ = await self._transition(conversation_id, status)
+
         # Thông báo
         await socket_manager.emit_to_room(conversation.id, "status_change", {"status": status.value})
         
-        return conversation
\ No newline at end of file
+        return conversation
@@ -0,0 +1,313 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.database.session import AsyncSessionLocal
+from app.models.chat import Conversation, Message
+from app.models.dashboard import DashboardCounter, GAUGE_BUCKET
+from app.rag.llm_agent import BOT_SENDER_ID
+from app.shared.enums import ChatStatus
+from app.sockets.manager import socket_manager
+from app.utils.helpers import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Room Socket.IO nhận cập nhật Dashboard theo thời gian thực
+DASHBOARD_ROOM = "admin_dashboard"
+
+# --- TÊN METRIC ---
+CONVERSATIONS_BY_STATUS = "conversations_by_status"  # gauge, dimension = status
+AGENT_OPEN_CONVERSATIONS = "agent_open_conversations"  # gauge, dimension = agent_id
+CONVERSATIONS_CREATED = "conversations_created"  # theo giờ
+MESSAGES = "messages"  # theo giờ, dimension = student / staff / bot
+FIRST_RESPONSE_SECONDS = "first_response_seconds"  # theo giờ, tổng số giây
+FIRST_RESPONSE_COUNT = "first_response_count"  # theo giờ
+
+_counters = DashboardCounter.__table__
+
+CounterKey = Tuple[str, datetime, str]
+
+
+def hour_bucket(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+class DashboardMetrics:
+    """
+    Bộ đếm Dashboard cập nhật tăng dần (thay cho COUNT(*) GROUP BY trên conversations/messages):
+    các luồng chat gọi record_* (chỉ cộng vào dict trong bộ nhớ), vòng lặp nền cộng dồn
+    xuống bảng dashboard_counters mỗi `interval_ms` và đẩy phần thay đổi tới room admin_dashboard.
+    Đọc Dashboard chỉ là vài chục dòng counter, không phụ thuộc số lượng tin nhắn.
+    """
+
+    def __init__(self, interval_ms: int):
+        self.interval = interval_ms / 1000
+        self._pending: Dict[CounterKey, int] = {}
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._overview_cache = TTLCache(maxsize=1, ttl=2)
+
+    # --- GHI NHẬN (gọi từ AsyncChatService) ---
+    def _add(self, metric: str, delta: int, dimension: str = "", bucket: datetime = GAUGE_BUCKET) -> None:
+        if delta:
+            key = (metric, bucket, dimension or "")
+            self._pending[key] = self._pending.get(key, 0) + delta
+
+    def record_conversation_created(self, status: ChatStatus, now: datetime) -> None:
+        self._add(CONVERSATIONS_BY_STATUS, 1, status.value)
+        self._add(CONVERSATIONS_CREATED, 1, bucket=hour_bucket(now))
+
+    def record_transition(
+        self,
+        old_status: ChatStatus,
+        new_status: ChatStatus,
+        old_agent: Optional[str],
+        new_agent: Optional[str]
+    ) -> None:
+        """Đổi trạng thái / người phụ trách: tải của agent = số hội thoại chưa CLOSED đang gán cho agent"""
+        if old_status != new_status:
+            self._add(CONVERSATIONS_BY_STATUS, -1, old_status.value)
+            self._add(CONVERSATIONS_BY_STATUS, 1, new_status.value)
+        if old_agent and old_status != ChatStatus.CLOSED:
+            self._add(AGENT_OPEN_CONVERSATIONS, -1, old_agent)
+        if new_agent and new_status != ChatStatus.CLOSED:
+            self._add(AGENT_OPEN_CONVERSATIONS, 1, new_agent)
+
+    def record_message(self, sender_kind: str, now: datetime) -> None:
+        self._add(MESSAGES, 1, sender_kind, hour_bucket(now))
+
+    def record_first_response(self, seconds: float, now: datetime) -> None:
+        bucket = hour_bucket(now)
+        self._add(FIRST_RESPONSE_SECONDS, max(int(round(seconds)), 0), bucket=bucket)
+        self._add(FIRST_RESPONSE_COUNT, 1, bucket=bucket)
+
+    # --- VÒNG LẶP FLUSH ---
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            try:
+                await self._apply(batch)
+            except Exception as e:
+                logger.error(f"Dashboard counters flush failed: {e}")
+                # Trả lại delta để lần sau cộng tiếp, không mất số liệu
+                for key, delta in batch.items():
+                    self._pending[key] = self._pending.get(key, 0) + delta
+                return
+
+            self._overview_cache.clear()
+            await socket_manager.emit_to_room(DASHBOARD_ROOM, "dashboard_update", {
+                "deltas": [
+                    {
+                        "metric": metric,
+                        "bucket": None if bucket == GAUGE_BUCKET else bucket.isoformat(),
+                        "dimension": dimension,
+                        "delta": delta
+                    }
+                    for (metric, bucket, dimension), delta in batch.items()
+                ]
+            })
+
+    async def _apply(self, batch: Dict[CounterKey, int]) -> None:
+        """UPDATE value = value + delta; dòng chưa có thì INSERT (worker khác chèn trước -> UPDATE lại)"""
+        c = _counters.c
+        async with AsyncSessionLocal() as db:
+            for (metric, bucket, dimension), delta in batch.items():
+                where = and_(c.metric == metric, c.bucket == bucket, c.dimension == dimension)
+                result = await db.execute(update(_counters).where(where).values(value=c.value + delta))
+                if result.rowcount:
+                    continue
+                try:
+                    async with db.begin_nested():
+                        await db.execute(insert(_counters).values(metric=metric, bucket=bucket, dimension=dimension, value=delta))
+                except IntegrityError:
+                    await db.execute(update(_counters).where(where).values(value=c.value + delta))
+            await db.commit()
+
+    # --- ĐỌC ---
+    async def overview(self, hours: int = 24) -> dict:
+        cached = self._overview_cache.get(hours)
+        if cached is not None:
+            return cached
+
+        now = datetime.utcnow()
+        since = hour_bucket(now) - timedelta(hours=hours - 1)
+        c = _counters.c
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(c.metric, c.bucket, c.dimension, c.value).where(
+                    (c.bucket == GAUGE_BUCKET) | (c.bucket >= since)
+                )
+            )).all()
+
+        by_status = {s.value: 0 for s in ChatStatus}
+        agent_load: Dict[str, int] = {}
+        hourly: Dict[datetime, Dict[str, int]] = {since + timedelta(hours=i): {} for i in range(hours)}
+        response_seconds = response_count = created = 0
+        for metric, bucket, dimension, value in rows:
+            if metric == CONVERSATIONS_BY_STATUS:
+                by_status[dimension] = value
+            elif metric == AGENT_OPEN_CONVERSATIONS:
+                if value > 0:
+                    agent_load[dimension] = value
+            elif metric == MESSAGES and bucket in hourly:
+                hourly[bucket][dimension] = value
+            elif metric == FIRST_RESPONSE_SECONDS:
+                response_seconds += value
+            elif metric == FIRST_RESPONSE_COUNT:
+                response_count += value
+            elif metric == CONVERSATIONS_CREATED:
+                created += value
+
+        result = {
+            "generated_at": now.isoformat(),
+            "conversations_by_status": by_status,
+            "conversations_created": created,
+            "messages_per_hour": [
+                {
+                    "hour": bucket.isoformat(),
+                    "student": counts.get("student", 0),
+                    "staff": counts.get("staff", 0),
+                    "bot": counts.get("bot", 0),
+                }
+                for bucket, counts in hourly.items()
+            ],
+            "first_response": {
+                "count": response_count,
+                "avg_seconds": round(response_seconds / response_count, 1) if response_count else None,
+            },
+            "agent_load": [
+                {"agent_id": agent_id, "open_conversations": value}
+                for agent_id, value in sorted(agent_load.items(), key=lambda item: item[1], reverse=True)
+            ],
+        }
+        self._overview_cache.set(hours, result)
+        return result
+
+    # --- DỰNG LẠI TỪ DỮ LIỆU GỐC ---
+    async def seed(self, days: int = 7) -> bool:
+        """
+        Gọi lúc khởi động: bảng counter chưa có gauge nào (vừa bật tính năng trên DB đã có hội thoại)
+        -> dựng lại từ dữ liệu gốc, tránh gauge bị âm ở lần record_transition đầu tiên.
+        Trả về True nếu đã dựng lại.
+        """
+        c = _counters.c
+        async with AsyncSessionLocal() as db:
+            if (await db.execute(select(c.metric).where(c.bucket == GAUGE_BUCKET).limit(1))).first():
+                return False
+            if not (await db.execute(select(Conversation.id).limit(1))).first():
+                return False
+        try:
+            async with self._flush_lock:
+                await self._recompute(days)
+        except IntegrityError:
+            # Worker khác khởi động cùng lúc đã dựng xong trước (cùng dữ liệu gốc)
+            logger.info("Dashboard counters were seeded by another worker")
+            return False
+        self._overview_cache.clear()
+        return True
+
+    async def rebuild(self, days: int = 7) -> dict:
+        """
+        Tính lại counter từ conversations/messages (chạy tay khi số liệu lệch).
+        Các gauge được tính lại toàn bộ; số liệu theo giờ tính lại cho `days` ngày gần nhất.
+
+        Chỉ bỏ được delta đang chờ của worker hiện tại: với nhiều worker, delta còn trong bộ nhớ
+        của worker khác (tối đa DASHBOARD_FLUSH_INTERVAL_MS) sẽ được cộng lên số vừa tính lại.
+        Chạy khi server chỉ có một worker, hoặc lúc không có traffic chat.
+        """
+        async with self._flush_lock:
+            result = await self._recompute(days)
+            self._overview_cache.clear()
+            await socket_manager.emit_to_room(DASHBOARD_ROOM, "dashboard_rebuilt", {"since": result["since"]})
+            return result
+
+    async def _recompute(self, days: int) -> dict:
+        """Ghi đè counter bằng số tính từ dữ liệu gốc (gọi khi đang giữ _flush_lock)"""
+        self._pending.clear()
+        since = hour_bucket(datetime.utcnow() - timedelta(days=days))
+        rows: List[dict] = []
+
+        async with AsyncSessionLocal() as db:
+            for status, count in (await db.execute(
+                select(Conversation.status, func.count()).group_by(Conversation.status)
+            )).all():
+                rows.append(self._row(CONVERSATIONS_BY_STATUS, GAUGE_BUCKET, status.value, count))
+
+            for agent_id, count in (await db.execute(
+                select(Conversation.agent_id, func.count())
+                .where(Conversation.agent_id.is_not(None), Conversation.status != ChatStatus.CLOSED)
+                .group_by(Conversation.agent_id)
+            )).all():
+                rows.append(self._row(AGENT_OPEN_CONVERSATIONS, GAUGE_BUCKET, agent_id, count))
+
+            # Gom theo giờ trong Python để không phụ thuộc hàm cắt thời gian riêng của từng DB
+            hourly: Dict[CounterKey, int] = {}
+            conversations = await db.stream(
+                select(Conversation.created_at, Conversation.first_response_at)
+                .where(Conversation.created_at >= since)
+            )
+            async for created_at, first_response_at in conversations:
+                key = (CONVERSATIONS_CREATED, hour_bucket(created_at), "")
+                hourly[key] = hourly.get(key, 0) + 1
+                if first_response_at is not None:
+                    bucket = hour_bucket(first_response_at)
+                    seconds = int((first_response_at - created_at).total_seconds())
+                    hourly[(FIRST_RESPONSE_SECONDS, bucket, "")] = hourly.get((FIRST_RESPONSE_SECONDS, bucket, ""), 0) + seconds
+                    hourly[(FIRST_RESPONSE_COUNT, bucket, "")] = hourly.get((FIRST_RESPONSE_COUNT, bucket, ""), 0) + 1
+
+            messages = await db.stream(
+                select(Message.created_at, Message.sender_id, Conversation.student_id)
+                .join(Conversation, Conversation.id == Message.conversation_id)
+                .where(Message.created_at >= since)
+            )
+            async for created_at, sender_id, student_id in messages:
+                key = (MESSAGES, hour_bucket(created_at), sender_kind(sender_id, student_id))
+                hourly[key] = hourly.get(key, 0) + 1
+            rows += [self._row(*key, value) for key, value in hourly.items()]
+
+            c = _counters.c
+            await db.execute(delete(_counters).where((c.bucket == GAUGE_BUCKET) | (c.bucket >= since)))
+            if rows:
+                await db.execute(insert(_counters), rows)
+            await db.commit()
+
+        return {"rows": len(rows), "since": since.isoformat()}
+
+    @staticmethod
+    def _row(metric: str, bucket: datetime, dimension: str, value: int) -> dict:
+        return {"metric": metric, "bucket": bucket, "dimension": dimension or "", "value": value}
+
+
+def sender_kind(sender_id: str, student_id: str) -> str:
+    if sender_id == BOT_SENDER_ID:
+        return "bot"
+    return "student" if sender_id == student_id else "staff"
+
+
+dashboard_metrics = DashboardMetrics(settings.DASHBOARD_FLUSH_INTERVAL_MS)
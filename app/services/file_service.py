@@ -1,29 +1,125 @@
 import os
-import shutil
+import asyncio
+import hashlib
+import multiprocessing
+import threading
 import uuid
 import logging
-from typing import List, Optional
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import BinaryIO, List, Optional, Tuple
 from fastapi import UploadFile, HTTPException
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.database.session import SessionLocal
+from app.models.upload import UploadBlob
+from app.utils.image_derivatives import (
+    derivative_url, derivative_urls, generate_all_derivatives, generate_derivative, is_image_url, parse_derivative_url
+)
 
 logger = logging.getLogger(__name__)
 
 # Thư mục gốc để lưu trữ
 BASE_UPLOAD_DIR = "static/uploads"
 
+# Thư mục chứa blob content-addressed: blobs/<2 ký tự đầu sha>/<sha256><ext>
+BLOB_DIR = os.path.join(BASE_UPLOAD_DIR, "blobs")
+
+# Kích thước mỗi lần đọc/ghi khi stream file xuống đĩa
+CHUNK_SIZE = 1024 * 1024
+
+@dataclass
+class StoredFile:
+    url: str       # Đường dẫn tương đối chuẩn URL (static/uploads/...)
+    size: int      # Số byte
+    sha256: str    # Checksum tính trong lúc stream
+
+def _write_chunk(buffer: BinaryIO, digest, chunk: bytes) -> None:
+    """Chạy trong threadpool: cập nhật checksum + ghi chunk"""
+    digest.update(chunk)
+    buffer.write(chunk)
+
+# --- PROCESS POOL TẠO ẢNH PHÁI SINH (resize ảnh tốn CPU, không chạy trên event loop) ---
+_image_pool: Optional[ProcessPoolExecutor] = None
+_image_pool_lock = threading.Lock()
+
+def _get_image_pool() -> ProcessPoolExecutor:
+    global _image_pool
+    with _image_pool_lock:
+        if _image_pool is None:
+            _image_pool = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _image_pool
+
+def shutdown_image_pool() -> None:
+    """Gọi khi tắt server"""
+    global _image_pool
+    with _image_pool_lock:
+        if _image_pool is not None:
+            _image_pool.shutdown(wait=False, cancel_futures=True)
+            _image_pool = None
+
+def _log_derivative_result(future: Future) -> None:
+    if future.cancelled():
+        return
+    if future.exception():
+        logger.warning(f"Failed to generate image derivatives: {future.exception()}")
+
+def _to_url(sys_path: str) -> str:
+    """Đường dẫn hệ thống -> đường dẫn URL (dấu /)"""
+    return sys_path.replace("\\", "/")
+
+def _remove_with_derivatives(url: str) -> None:
+    """Xóa file upload cùng các ảnh thumb/medium đã tạo từ nó"""
+    urls = [url.lstrip("/")] + list((derivative_urls(url) or {}).values())
+    for item in urls:
+        sys_path = item.replace("/", os.sep)
+        if os.path.exists(sys_path):
+            os.remove(sys_path)
+
 class FileService:
     def __init__(self):
         # Tạo thư mục gốc nếu chưa tồn tại
         if not os.path.exists(BASE_UPLOAD_DIR):
             os.makedirs(BASE_UPLOAD_DIR)
 
-    async def save_file(self, file: UploadFile, sub_folder: str, allowed_types: Optional[List[str]] = None) -> str:
+    async def save_file(
+        self,
+        file: UploadFile,
+        sub_folder: str,
+        allowed_types: Optional[List[str]] = None,
+        max_bytes: Optional[int] = None
+    ) -> str:
         """
         Hàm dùng chung để lưu file.
         Trả về đường dẫn tương đối (relative path) chuẩn URL (dùng dấu /).
         """
+        stored = await self.store_file(file, sub_folder, allowed_types, max_bytes)
+        return stored.url
+
+    async def store_file(
+        self,
+        file: UploadFile,
+        sub_folder: str,
+        allowed_types: Optional[List[str]] = None,
+        max_bytes: Optional[int] = None
+    ) -> StoredFile:
+        """
+        Lưu file theo kiểu stream từng chunk (không chặn event loop):
+        - Giới hạn kích thước kiểm tra ngay trong lúc stream (413 nếu vượt)
+        - Tính SHA-256 tăng dần
+        - Ghi ra file tạm rồi rename (atomic), không để lại file dở dang
+        - UPLOAD_CONTENT_ADDRESSED: lưu theo SHA-256, upload trùng nội dung dùng chung blob
+        """
         if not file:
             raise HTTPException(status_code=400, detail="No file uploaded")
 
+        max_bytes = max_bytes or settings.UPLOAD_MAX_BYTES
+
         # 1. Validate loại file (nếu có yêu cầu)
         if allowed_types:
             if file.content_type not in allowed_types:
@@ -32,44 +128,195 @@ class FileService:
                     detail=f"Invalid file type. Allowed: {', '.join(allowed_types)}"
                 )
 
-        # 2. Tạo đường dẫn thư mục đích
-        target_folder = os.path.join(BASE_UPLOAD_DIR, sub_folder)
-        if not os.path.exists(target_folder):
-            os.makedirs(target_folder)
+        # Từ chối sớm nếu đã biết kích thước
+        if getattr(file, "size", None) is not None and file.size > max_bytes:
+            raise HTTPException(status_code=413, detail=f"File too large. Max {max_bytes} bytes")
 
-        # 3. Tạo tên file unique (UUID)
-        file_ext = os.path.splitext(file.filename)[1]
-        if not file_ext:
-             file_ext = "" # Fallback nếu không có đuôi file
-        
+        file_ext = os.path.splitext(file.filename or "")[1]
+
+        # Chế độ content-addressed: upload giống nhau (cùng SHA-256) dùng chung 1 blob
+        if settings.UPLOAD_CONTENT_ADDRESSED:
+            tmp_path, size, sha256 = await self._stream_to_temp(file, BLOB_DIR, max_bytes)
+            try:
+                url = await run_in_threadpool(self._acquire_blob, tmp_path, sha256, size, file_ext, file.content_type)
+            except Exception as e:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                logger.error(f"Error storing blob: {e}")
+                raise HTTPException(status_code=500, detail="Could not save file")
+            return StoredFile(url=url, size=size, sha256=sha256)
+
+        # 2. Tạo tên file unique (UUID) trong thư mục đích
+        target_folder = os.path.join(BASE_UPLOAD_DIR, sub_folder)
         new_filename = f"{uuid.uuid4()}{file_ext}"
         
         # Đường dẫn hệ thống để lưu file (OS specific path separator)
         file_sys_path = os.path.join(target_folder, new_filename)
 
-        # 4. Lưu file vào ổ cứng
+        # 3. Stream vào file tạm rồi rename atomic sang tên chính thức
+        tmp_path, size, sha256 = await self._stream_to_temp(file, target_folder, max_bytes)
         try:
-            with open(file_sys_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            
-            logger.info(f"File uploaded successfully to: {file_sys_path}")
-            
-            # 5. Trả về đường dẫn chuẩn URL (Forward slash) để lưu DB
-            # Ví dụ: static/uploads/avatars/abc.jpg
-            relative_path = os.path.join(BASE_UPLOAD_DIR, sub_folder, new_filename)
-            return relative_path.replace("\\", "/")
+            await run_in_threadpool(os.replace, tmp_path, file_sys_path)
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            logger.error(f"Error saving file: {e}")
+            raise HTTPException(status_code=500, detail="Could not save file")
+        logger.info(f"File uploaded successfully to: {file_sys_path} ({size} bytes)")
+
+        # 4. Trả về đường dẫn chuẩn URL (Forward slash) để lưu DB
+        # Ví dụ: static/uploads/avatars/abc.jpg
+        return StoredFile(url=_to_url(file_sys_path), size=size, sha256=sha256)
+
+    async def _stream_to_temp(self, file: UploadFile, target_folder: str, max_bytes: int) -> Tuple[str, int, str]:
+        """Stream upload vào file tạm trong target_folder. Trả về (đường dẫn tạm, số byte, sha256)"""
+        if not os.path.exists(target_folder):
+            os.makedirs(target_folder, exist_ok=True)
 
+        tmp_path = os.path.join(target_folder, f".{uuid.uuid4()}.part")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            buffer = await run_in_threadpool(open, tmp_path, "wb")
+            try:
+                while True:
+                    chunk = await file.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise HTTPException(status_code=413, detail=f"File too large. Max {max_bytes} bytes")
+                    await run_in_threadpool(_write_chunk, buffer, digest, chunk)
+            finally:
+                await run_in_threadpool(buffer.close)
         except Exception as e:
-            # Rollback: Xóa file nếu lỗi trong quá trình ghi
-            if os.path.exists(file_sys_path):
-                os.remove(file_sys_path)
+            # Rollback: Xóa file tạm nếu lỗi trong quá trình ghi
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            if isinstance(e, HTTPException):
+                raise
             logger.error(f"Error saving file: {e}")
             raise HTTPException(status_code=500, detail="Could not save file")
 
+        return tmp_path, size, digest.hexdigest()
+
+    # --- ẢNH PHÁI SINH ---
+    def schedule_derivatives(self, url: str) -> Optional[dict]:
+        """
+        Đưa việc tạo thumb/medium vào process pool (chạy nền, không chờ).
+        Trả về URL các ảnh phái sinh ngay; nếu chưa kịp tạo, lần request đầu sẽ tạo lazy.
+        """
+        urls = derivative_urls(url)
+        if urls:
+            future = _get_image_pool().submit(generate_all_derivatives, url.replace("/", os.sep))
+            future.add_done_callback(_log_derivative_result)
+        return urls
+
+    async def ensure_derivative(self, url: str, root: Optional[str] = None) -> bool:
+        """
+        Tạo (lazy) ảnh phái sinh còn thiếu khi được request lần đầu, cache luôn trên đĩa.
+        Ảnh gốc và file tạo ra đều phải nằm trong `root` (mặc định thư mục upload), nếu không trả về False.
+        """
+        parsed = parse_derivative_url(url)
+        if not parsed:
+            return False
+        source_url, name = parsed
+        source_path = source_url.replace("/", os.sep)
+        if not is_image_url(source_url) or not os.path.isfile(source_path):
+            return False
+        root = os.path.realpath(root or BASE_UPLOAD_DIR)
+        output_path = derivative_url(source_url, name).replace("/", os.sep)
+        for path in (source_path, output_path):
+            if not os.path.realpath(path).startswith(root + os.sep):
+                logger.warning(f"Rejected derivative outside upload dir: {url}")
+                return False
+        try:
+            await asyncio.wrap_future(_get_image_pool().submit(generate_derivative, source_path, name))
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to generate derivative {url}: {e}")
+            return False
+
+    # --- CONTENT-ADDRESSED STORAGE (chạy trong threadpool, session DB riêng) ---
+    def _acquire_blob(self, tmp_path: str, sha256: str, size: int, ext: str, content_type: Optional[str]) -> str:
+        """
+        Tăng ref_count nếu blob đã tồn tại, ngược lại tạo blob mới từ file tạm.
+        File blob được đặt bằng hard link (tạo mới, không ghi đè): upload song song cùng nội dung
+        không bao giờ thay / xóa file mà transaction khác đã commit. File tạm luôn là của riêng
+        request này và bị xóa ở cuối.
+        """
+        try:
+            with SessionLocal() as db:
+                for _ in range(3):
+                    blob = db.query(UploadBlob).filter(UploadBlob.sha256 == sha256).with_for_update().first()
+                    if blob:
+                        blob.ref_count += 1
+                        db.commit()
+                        return blob.path
+
+                    blob_sys_path = os.path.join(BLOB_DIR, sha256[:2], f"{sha256}{ext.lower()}")
+                    os.makedirs(os.path.dirname(blob_sys_path), exist_ok=True)
+                    try:
+                        os.link(tmp_path, blob_sys_path)
+                    except FileExistsError:
+                        # Upload song song vừa đặt file (hoặc file mồ côi sau crash): tên = sha256
+                        # nên nội dung giống hệt, dùng luôn file đó
+                        pass
+                    db.add(UploadBlob(
+                        sha256=sha256,
+                        path=_to_url(blob_sys_path),
+                        size=size,
+                        content_type=content_type,
+                        ref_count=1
+                    ))
+                    try:
+                        db.commit()
+                        logger.info(f"Blob stored: {blob_sys_path} ({size} bytes)")
+                        return _to_url(blob_sys_path)
+                    except IntegrityError:
+                        # Upload cùng nội dung vừa commit trước -> lần lặp sau tăng ref_count của blob đó
+                        db.rollback()
+                raise RuntimeError(f"Could not acquire blob {sha256}")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def release(self, url: Optional[str]) -> bool:
+        """
+        Bỏ một tham chiếu tới blob. File chỉ bị xóa bởi cleanup_unreferenced_blobs.
+        Trả về False nếu url không phải blob (file UUID kiểu cũ).
+        """
+        if not url:
+            return False
+        with SessionLocal() as db:
+            blob = db.query(UploadBlob).filter(UploadBlob.path == url.lstrip("/")).with_for_update().first()
+            if not blob:
+                return False
+            blob.ref_count = max(blob.ref_count - 1, 0)
+            db.commit()
+            return True
+
+    def cleanup_unreferenced_blobs(self, batch_size: int = 500) -> int:
+        """Job dọn dẹp: chỉ xóa các blob không còn được tham chiếu (ref_count = 0)"""
+        removed = 0
+        with SessionLocal() as db:
+            while True:
+                blobs = db.query(UploadBlob).filter(UploadBlob.ref_count <= 0)\
+                    .with_for_update(skip_locked=True).limit(batch_size).all()
+                if not blobs:
+                    return removed
+                for blob in blobs:
+                    # Xóa file khi còn giữ row lock: upload cùng nội dung đang chờ lock
+                    # sẽ tạo lại blob sau khi transaction này commit
+                    _remove_with_derivatives(blob.path)
+                    db.delete(blob)
+                db.commit()
+                removed += len(blobs)
+
     async def save_avatar(self, file: UploadFile, old_avatar_path: str = None) -> str:
         """
         Wrapper cho save_file chuyên dùng cho Avatar.
-        Có xử lý xóa avatar cũ.
+        Có xử lý xóa avatar cũ (blob dùng chung thì chỉ giảm ref_count).
         """
         AVATAR_ALLOWED_TYPES = ["image/jpeg", "image/png", "image/jpg"]
         
@@ -77,19 +324,25 @@ class FileService:
         new_file_path = await self.save_file(
             file=file, 
             sub_folder="avatars", 
-            allowed_types=AVATAR_ALLOWED_TYPES
+            allowed_types=AVATAR_ALLOWED_TYPES,
+            max_bytes=settings.AVATAR_MAX_BYTES
         )
+        self.schedule_derivatives(new_file_path)
 
         # Xóa file cũ nếu tồn tại (Clean up)
         if old_avatar_path:
             try:
+                # Avatar cũ là blob dùng chung -> chỉ bỏ tham chiếu
+                if await run_in_threadpool(self.release, old_avatar_path):
+                    return new_file_path
+
                 # Xử lý đường dẫn cũ: Bỏ dấu '/' ở đầu nếu có để os.path.exists hiểu đúng
                 # Ví dụ DB lưu: /static/uploads/... -> cần convert thành static/uploads/...
                 clean_old_path = old_avatar_path.lstrip("/")
                 clean_old_path = clean_old_path.replace("/", os.sep) # Convert về separator của OS
 
                 if os.path.exists(clean_old_path):
-                    os.remove(clean_old_path)
+                    await run_in_threadpool(_remove_with_derivatives, old_avatar_path)
                     logger.info(f"Old avatar removed: {clean_old_path}")
             except Exception as e:
                 # Chỉ log warning, không raise lỗi để tránh failed request update
@@ -0,0 +1,227 @@
+import logging
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.knowledge import KnowledgeArticle, KnowledgeRevision
+from app.schemas.rag_schema import (
+    KnowledgeArticleCreate, KnowledgeArticleListResponse, KnowledgeArticleResponse,
+    KnowledgeArticleUpdate, KnowledgeChange, KnowledgeChangesResponse
+)
+from app.shared.enums import ArticleStatus
+from app.utils.helpers import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Bài viết / trang danh sách đã đọc, gắn với phiên bản toàn cục lúc đọc: (version, value)
+article_cache = TTLCache(maxsize=settings.KNOWLEDGE_CACHE_SIZE, ttl=settings.KNOWLEDGE_CACHE_TTL_SECONDS)
+# Phiên bản toàn cục mới nhất worker này biết (đọc lại từ DB sau mỗi KNOWLEDGE_VERSION_TTL_MS)
+_version_cache = TTLCache(maxsize=1, ttl=settings.KNOWLEDGE_VERSION_TTL_MS / 1000)
+
+_REVISION_ROW = 1
+
+
+def article_etag(revision: int) -> str:
+    return f'"a{revision}"'
+
+
+def list_etag(version: int, scope: str) -> str:
+    return f'"l{version}-{scope}"'
+
+
+class KnowledgeService:
+    """
+    CRUD kho tri thức + cache đọc theo phiên bản.
+    Mỗi lần ghi cấp một revision mới từ bộ đếm toàn cục (bảng knowledge_revision), nên:
+    - cache chỉ cần so phiên bản hiện tại, không phải xóa từng key khi ghi
+    - ETag của bài viết = revision, client gửi If-None-Match để nhận 304
+    - client / ingestion đồng bộ bằng /changes?since=<version> thay vì tải lại toàn bộ
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    # --- PHIÊN BẢN ---
+    def current_version(self) -> int:
+        version = _version_cache.get("version")
+        if version is None:
+            version = self.db.execute(
+                select(KnowledgeRevision.value).where(KnowledgeRevision.id == _REVISION_ROW)
+            ).scalar() or 0
+            _version_cache.set("version", version)
+        return version
+
+    def _next_revision(self) -> int:
+        """
+        Cấp revision mới trong transaction hiện tại. UPDATE giữ khóa dòng bộ đếm tới khi commit,
+        nên các lần ghi được xếp hàng và revision đã thấy qua /changes không bị "chèn" số nhỏ hơn về sau.
+        """
+        stmt = (
+            update(KnowledgeRevision)
+            .where(KnowledgeRevision.id == _REVISION_ROW)
+            .values(value=KnowledgeRevision.value + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if not self.db.execute(stmt).rowcount:
+            try:
+                with self.db.begin_nested():
+                    self.db.add(KnowledgeRevision(id=_REVISION_ROW, value=1))
+                return 1
+            except IntegrityError:
+                self.db.execute(stmt)
+        return self.db.execute(
+            select(KnowledgeRevision.value).where(KnowledgeRevision.id == _REVISION_ROW)
+        ).scalar_one()
+
+    @staticmethod
+    def _visible(article: KnowledgeArticleResponse, include_unpublished: bool) -> bool:
+        return include_unpublished or article.status == ArticleStatus.PUBLISHED
+
+    # --- ĐỌC ---
+    def get_article(self, article_id: str, include_unpublished: bool = False) -> KnowledgeArticleResponse:
+        version = self.current_version()
+        key = ("article", article_id)
+        cached = article_cache.get(key)
+        if cached is None or cached[0] != version:
+            article = self.db.get(KnowledgeArticle, article_id)
+            data = (
+                KnowledgeArticleResponse.model_validate(article)
+                if article is not None and article.deleted_at is None else None
+            )
+            cached = (version, data)
+            article_cache.set(key, cached)
+
+        data = cached[1]
+        if data is None or not self._visible(data, include_unpublished):
+            raise HTTPException(status_code=404, detail="Article not found")
+        return data
+
+    def list_articles(
+        self,
+        category: Optional[str],
+        faculty: Optional[str],
+        status: Optional[ArticleStatus],
+        limit: int,
+        offset: int,
+        include_unpublished: bool = False
+    ) -> KnowledgeArticleListResponse:
+        if not include_unpublished:
+            status = ArticleStatus.PUBLISHED
+        version = self.current_version()
+        key = ("list", category, faculty, status, limit, offset)
+        cached = article_cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        query = self.db.query(KnowledgeArticle).filter(KnowledgeArticle.deleted_at.is_(None))
+        if category:
+            query = query.filter(KnowledgeArticle.category == category)
+        if faculty:
+            query = query.filter(KnowledgeArticle.faculty == faculty)
+        if status:
+            query = query.filter(KnowledgeArticle.status == status)
+        total = query.count()
+        items = (
+            query.order_by(KnowledgeArticle.updated_at.desc(), KnowledgeArticle.id.desc())
+            .offset(offset).limit(limit).all()
+        )
+        result = KnowledgeArticleListResponse(
+            version=version,
+            total=total,
+            items=[KnowledgeArticleResponse.model_validate(a) for a in items]
+        )
+        article_cache.set(key, (version, result))
+        return result
+
+    def get_changes(self, since: int, limit: int, include_unpublished: bool = False) -> KnowledgeChangesResponse:
+        """
+        Bài viết có revision > since (kể cả bài đã xóa / ẩn dưới dạng tombstone), theo thứ tự revision.
+        Người dùng thường không nhận tombstone của bài chưa từng xuất bản (nháp), tránh lộ id / revision.
+        """
+        rows = (
+            self.db.query(KnowledgeArticle)
+            .filter(KnowledgeArticle.revision > since)
+            .order_by(KnowledgeArticle.revision, KnowledgeArticle.id)
+            .limit(limit + 1)
+            .all()
+        )
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        items = []
+        for article in rows:
+            data = KnowledgeArticleResponse.model_validate(article)
+            if article.deleted_at is None and self._visible(data, include_unpublished):
+                items.append(KnowledgeChange(id=article.id, revision=article.revision, article=data))
+            elif include_unpublished or article.published_at is not None:
+                items.append(KnowledgeChange(id=article.id, revision=article.revision, deleted=True))
+        return KnowledgeChangesResponse(
+            since=since,
+            # Theo dòng cuối đã xét (kể cả dòng bị bỏ qua), để lần gọi sau không đọc lại
+            version=rows[-1].revision if rows else since,
+            has_more=has_more,
+            items=items
+        )
+
+    # --- GHI ---
+    def _get_for_update(self, article_id: str, if_match: Optional[str]) -> KnowledgeArticle:
+        article = self.db.get(KnowledgeArticle, article_id)
+        if not article or article.deleted_at is not None:
+            raise HTTPException(status_code=404, detail="Article not found")
+        # Khóa lạc quan: Admin gửi If-Match = ETag lúc mở bài, bài đã bị người khác sửa -> 412
+        if if_match and if_match != "*" and if_match != article_etag(article.revision):
+            raise HTTPException(status_code=412, detail="Article has been modified")
+        return article
+
+    def _commit(self, article: KnowledgeArticle) -> KnowledgeArticle:
+        try:
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Knowledge article write failed: {e}")
+            raise HTTPException(status_code=500, detail="Could not save article")
+        self.db.refresh(article)
+        # Worker hiện tại thấy phiên bản mới ngay, worker khác sau tối đa KNOWLEDGE_VERSION_TTL_MS
+        if article.revision > (_version_cache.get("version") or 0):
+            _version_cache.set("version", article.revision)
+        return article
+
+    @staticmethod
+    def _mark_published(article: KnowledgeArticle) -> None:
+        if article.status == ArticleStatus.PUBLISHED and article.published_at is None:
+            article.published_at = datetime.utcnow()
+
+    def create_article(self, data: KnowledgeArticleCreate, commit: bool = True) -> KnowledgeArticle:
+        article = KnowledgeArticle(**data.model_dump())
+        self._mark_published(article)
+        article.revision = self._next_revision()
+        self.db.add(article)
+        if not commit:
+            self.db.flush()
+            return article
+        return self._commit(article)
+
+    def update_article(self, article_id: str, data: KnowledgeArticleUpdate, if_match: Optional[str] = None) -> KnowledgeArticle:
+        article = self._get_for_update(article_id, if_match)
+        # Gọi trước và sau khi sửa: bài đang PUBLISHED từ trước khi có cột published_at cũng được đánh dấu
+        self._mark_published(article)
+        for field_name, value in data.model_dump(exclude_unset=True).items():
+            if field_name in ("title", "content", "status") and value is None:
+                continue
+            setattr(article, field_name, value)
+        self._mark_published(article)
+        article.version = (article.version or 0) + 1
+        article.revision = self._next_revision()
+        return self._commit(article)
+
+    def delete_article(self, article_id: str, if_match: Optional[str] = None) -> KnowledgeArticle:
+        """Xóa mềm: bài biến mất khỏi API đọc và được báo là deleted qua /changes"""
+        article = self._get_for_update(article_id, if_match)
+        self._mark_published(article)
+        article.deleted_at = datetime.utcnow()
+        article.revision = self._next_revision()
+        return self._commit(article)
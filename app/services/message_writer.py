@@ -0,0 +1,162 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, func, insert, or_, update
+
+from app.core.config import settings
+from app.database.session import AsyncSessionLocal
+from app.models.chat import Conversation, Message
+from app.sockets.manager import socket_manager
+
+logger = logging.getLogger(__name__)
+
+# Độ dài tối đa preview tin nhắn cuối lưu trên Conversation
+PREVIEW_LENGTH = 255
+
+_messages = Message.__table__
+_conversations = Conversation.__table__
+
+
+@dataclass
+class PendingMessage:
+    row: dict
+    sid: Optional[str] = None  # socket của người gửi, để báo lỗi nếu lưu thất bại
+    from_student: bool = False  # tin của sinh viên -> tăng unread_count
+
+
+class MessageWriteBehind:
+    """
+    Ghi tin nhắn theo lô (group commit):
+    tin nhắn đã có id/created_at và được broadcast ngay, còn việc lưu DB gom lại
+    thành một INSERT nhiều dòng mỗi `interval_ms` hoặc khi đủ `max_batch` tin.
+    """
+
+    def __init__(self, interval_ms: int, max_batch: int):
+        self.interval = interval_ms / 1000
+        self.max_batch = max_batch
+        self._queue: List[PendingMessage] = []
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._stopping
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Dừng vòng lặp và flush toàn bộ tin còn trong buffer (gọi khi tắt server).
+        Không cancel task: lô đang ghi dở phải ghi xong (tin đã broadcast cho client).
+        """
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def enqueue(self, row: dict, sid: Optional[str] = None, from_student: bool = False) -> None:
+        self._queue.append(PendingMessage(row=row, sid=sid, from_student=from_student))
+        if len(self._queue) >= self.max_batch:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            while self._queue:
+                batch = self._queue[:self.max_batch]
+                del self._queue[:self.max_batch]
+                # shield: lô đã lấy khỏi hàng đợi vẫn được ghi xong nếu flush bị hủy giữa chừng
+                await asyncio.shield(self._write_batch(batch))
+
+    async def _write_batch(self, batch: List[PendingMessage]) -> None:
+        try:
+            await self._write(batch)
+        except Exception as e:
+            logger.error(f"Write-behind batch of {len(batch)} messages failed: {e}")
+            await self._retry_individually(batch)
+
+    async def _write(self, batch: List[PendingMessage]) -> None:
+        # Tin nhắn mới nhất + số tin chưa đọc của từng hội thoại trong lô
+        latest: Dict[str, dict] = {}
+        unread: Dict[str, int] = {}
+        for pending in batch:
+            row = pending.row
+            conv_id = row["conversation_id"]
+            if conv_id not in latest or row["created_at"] > latest[conv_id]["created_at"]:
+                latest[conv_id] = row
+            unread[conv_id] = unread.get(conv_id, 0) + int(pending.from_student)
+
+        c = _conversations.c
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(_messages), [p.row for p in batch])
+            # Điều kiện "mới hơn" đặt ở WHERE (không dùng CASE trong SET): MySQL gán SET lần lượt
+            # từ trái sang phải nên CASE ở các cột sau sẽ so với last_message_at đã bị ghi đè
+            await db.execute(
+                update(_conversations)
+                .where(
+                    c.id == bindparam("conv_id"),
+                    or_(c.last_message_at.is_(None), c.last_message_at < bindparam("ts"))
+                )
+                .values(
+                    last_message_at=bindparam("ts"),
+                    last_message_preview=bindparam("preview"),
+                    last_message_sender_id=bindparam("sender"),
+                    last_message_type=bindparam("type")
+                ),
+                [
+                    {
+                        "conv_id": conv_id,
+                        "ts": row["created_at"],
+                        "preview": row["content"][:PREVIEW_LENGTH],
+                        "sender": row["sender_id"],
+                        "type": row["msg_type"]
+                    }
+                    for conv_id, row in latest.items()
+                ]
+            )
+            unread_rows = [{"conv_id": conv_id, "unread": n} for conv_id, n in unread.items() if n]
+            if unread_rows:
+                await db.execute(
+                    update(_conversations)
+                    .where(c.id == bindparam("conv_id"))
+                    .values(unread_count=func.coalesce(c.unread_count, 0) + bindparam("unread")),
+                    unread_rows
+                )
+            await db.commit()
+
+    async def _retry_individually(self, batch: List[PendingMessage]) -> None:
+        """Lô lỗi -> ghi lại từng tin để cô lập tin lỗi, báo về socket người gửi"""
+        for pending in batch:
+            try:
+                await self._write([pending])
+            except Exception as e:
+                logger.error(f"Write-behind message {pending.row['id']} failed: {e}")
+                if pending.sid:
+                    await socket_manager.emit_to_sid(pending.sid, "message_failed", {
+                        "message_id": pending.row["id"],
+                        "conversation_id": pending.row["conversation_id"],
+                        "detail": "Failed to save message"
+                    })
+
+
+message_writer = MessageWriteBehind(
+    interval_ms=settings.CHAT_WRITE_BEHIND_INTERVAL_MS,
+    max_batch=settings.CHAT_WRITE_BEHIND_MAX_BATCH
+)
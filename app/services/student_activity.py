@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, or_, update
+
+from app.core.config import settings
+from app.database.session import AsyncSessionLocal
+from app.models.user import Student
+
+logger = logging.getLogger(__name__)
+
+# Số sinh viên tối đa trong một câu UPDATE (giới hạn độ dài CASE)
+_UPDATE_CHUNK = 500
+
+
+@dataclass
+class PendingActivity:
+    chats: int = 0
+    last_contact: Optional[datetime] = None
+
+
+class StudentActivityBuffer:
+    """
+    Gom hoạt động chat theo sinh viên (total_chats, last_contact) trong bộ nhớ và ghi xuống
+    bằng một câu UPDATE ... CASE cho cả lô mỗi `interval_ms`, thay vì khóa dòng students mỗi tin nhắn.
+    Màn hình Admin đọc qua overlay() để thấy luôn cả phần chưa flush.
+    """
+
+    def __init__(self, interval_ms: int):
+        self.interval = interval_ms / 1000
+        self._pending: Dict[str, PendingActivity] = {}
+        # Lô đang ghi xuống DB (vẫn cần overlay cho tới khi commit xong)
+        self._inflight: Dict[str, PendingActivity] = {}
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, user_id: str, at: datetime, new_chat: bool = False) -> None:
+        """user_id: id User của sinh viên (sender_id của tin nhắn)"""
+        activity = self._pending.get(user_id)
+        if activity is None:
+            activity = self._pending[user_id] = PendingActivity()
+        activity.chats += int(new_chat)
+        if activity.last_contact is None or at > activity.last_contact:
+            activity.last_contact = at
+
+    def overlay(self, user_id: str, total_chats: Optional[int], last_contact: Optional[datetime]) -> Tuple[int, Optional[datetime]]:
+        """Giá trị trong DB + phần còn trong buffer"""
+        total = total_chats or 0
+        for activity in (self._inflight.get(user_id), self._pending.get(user_id)):
+            if activity is not None:
+                total += activity.chats
+                if activity.last_contact and (last_contact is None or activity.last_contact > last_contact):
+                    last_contact = activity.last_contact
+        return total, last_contact
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            self._inflight, self._pending = self._pending, {}
+            try:
+                items = list(self._inflight.items())
+                async with AsyncSessionLocal() as db:
+                    for start in range(0, len(items), _UPDATE_CHUNK):
+                        await db.execute(self._build_update(items[start:start + _UPDATE_CHUNK]))
+                    await db.commit()
+            except Exception as e:
+                logger.error(f"Student activity flush failed ({len(self._inflight)} students): {e}")
+                # Gộp lại vào buffer để lần sau ghi tiếp
+                for user_id, activity in self._inflight.items():
+                    pending = self._pending.setdefault(user_id, PendingActivity())
+                    pending.chats += activity.chats
+                    if activity.last_contact and (pending.last_contact is None or activity.last_contact > pending.last_contact):
+                        pending.last_contact = activity.last_contact
+            finally:
+                self._inflight = {}
+
+    @staticmethod
+    def _build_update(items: List[Tuple[str, PendingActivity]]):
+        chats = case(
+            *[(Student.user_id == user_id, activity.chats) for user_id, activity in items],
+            else_=0
+        )
+        # Không lùi last_contact nếu worker khác đã ghi thời điểm mới hơn
+        last_contact = case(
+            *[
+                (
+                    Student.user_id == user_id,
+                    case(
+                        (or_(Student.last_contact.is_(None), Student.last_contact < activity.last_contact), activity.last_contact),
+                        else_=Student.last_contact
+                    )
+                )
+                for user_id, activity in items
+            ],
+            else_=Student.last_contact
+        )
+        return (
+            update(Student)
+            .where(Student.user_id.in_([user_id for user_id, _ in items]))
+            .values(total_chats=func.coalesce(Student.total_chats, 0) + chats, last_contact=last_contact)
+            .execution_options(synchronize_session=False)
+        )
+
+
+student_activity = StudentActivityBuffer(settings.STUDENT_ACTIVITY_FLUSH_INTERVAL_MS)
@@ -1,13 +1,16 @@
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_
+from sqlalchemy.orm import Session, joinedload, contains_eager
+from sqlalchemy import and_, case, func
 from fastapi import HTTPException, UploadFile
 from typing import Optional
 import logging
 
+from app.core.principal_cache import invalidate_principal
 from app.models.user import User, Student
 from app.schemas.user_schema import StudentProfileResponse, UpdateProfileRequest, PaginatedStudentResponse
 from app.shared.enums import AcademicStatus, UserRole
 from app.services.file_service import FileService
+from app.services.student_activity import student_activity
+from app.utils.helpers import build_search_text, fold_vietnamese
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +34,10 @@ class StudentService:
             
             # Lấy thông tin student (có thể None nếu user chưa có profile student)
             student_info = user.student_profile
+            total_chats, last_contact = (
+                student_activity.overlay(user.id, student_info.total_chats, student_info.last_contact)
+                if student_info else (None, None)
+            )
             
             return StudentProfileResponse(
                 user_id=user.id,
@@ -45,7 +52,8 @@ class StudentService:
                 faculty=student_info.faculty if student_info else None,
                 gpa=student_info.gpa if student_info else None,
                 academic_status=student_info.academic_status if student_info else None,
-                last_contact=student_info.last_contact if student_info else None
+                last_contact=last_contact,
+                total_chats=total_chats
             )
         except HTTPException as e:
             raise e
@@ -89,6 +97,7 @@ class StudentService:
             
             # 5. Refresh để lấy data mới nhất từ DB (quan trọng)
             self.db.refresh(user)
+            invalidate_principal(user_id)
 
             # 6. Trả về data profile mới nhất
             return self.get_student_profile(user_id)
@@ -115,29 +124,50 @@ class StudentService:
             # Query cơ bản
             query = self.db.query(User).join(Student, User.id == Student.user_id).filter(User.role == UserRole.STUDENT)
 
-            # Search keyword
-            if keyword:
-                search = f"%{keyword}%"
-                query = query.filter(
-                    or_(
-                        User.full_name.ilike(search),
-                        Student.student_code.ilike(search),
-                        User.email.ilike(search)
-                    )
+            # Search keyword (không dấu) trên cột search_text đã được đánh trigram index
+            order_by = [User.full_name, User.id]
+            if keyword and keyword.strip():
+                folded = fold_vietnamese(keyword.strip())
+                terms = [_escape_like(t) for t in folded.split()]
+                query = query.filter(and_(
+                    *[Student.search_text.like(f"%{t}%", escape="\\") for t in terms]
+                ))
+
+                # Xếp hạng: trùng mã SV / email > khớp đầu họ tên > khớp đầu một từ > chứa
+                phrase = _escape_like(folded)
+                rank = case(
+                    (func.lower(Student.student_code) == folded, 0),
+                    (func.lower(User.email) == folded, 0),
+                    (Student.search_text.like(f"{phrase}%", escape="\\"), 1),
+                    (Student.search_text.like(f"% {phrase}%", escape="\\"), 2),
+                    else_=3
                 )
+                order_by.insert(0, rank)
 
             # Filter Status
             if status:
                 query = query.filter(Student.academic_status == status)
 
-            # Đếm tổng số & Phân trang
-            total = query.count()
-            users = query.offset((page - 1) * size).limit(size).all()
+            # Phân trang: contains_eager dùng luôn JOIN để nạp student_profile (tránh N+1),
+            # count(*) OVER() lấy tổng số bản ghi trong cùng một query
+            rows = query.add_columns(func.count().over().label("total"))\
+                .options(contains_eager(User.student_profile))\
+                .order_by(*order_by)\
+                .offset((page - 1) * size).limit(size)\
+                .all()
+            users = [u for u, _ in rows]
+            if rows:
+                total = rows[0].total
+            else:
+                # Trang vượt quá số bản ghi -> vẫn cần tổng số cho client
+                total = query.count() if page > 1 else 0
 
             # Mapping response
             items = []
             for u in users:
                 s = u.student_profile
+                # Cộng phần hoạt động chưa flush xuống DB
+                total_chats, last_contact = student_activity.overlay(u.id, s.total_chats, s.last_contact)
                 items.append(StudentProfileResponse(
                     user_id=u.id,
                     full_name=u.full_name,
@@ -150,7 +180,8 @@ class StudentService:
                     faculty=s.faculty,
                     gpa=s.gpa,
                     academic_status=s.academic_status,
-                    last_contact=s.last_contact
+                    last_contact=last_contact,
+                    total_chats=total_chats
                 ))
 
             return PaginatedStudentResponse(
@@ -162,4 +193,24 @@ class StudentService:
 
         except Exception as e:
             logger.error(f"Error fetching student list: {e}")
-            raise HTTPException(status_code=500, detail="Internal Server Error")
\ No newline at end of file
+            raise HTTPException(status_code=500, detail="Internal Server Error")
+
+    def backfill_search_text(self, batch_size: int = 1000) -> int:
+        """Điền search_text cho các sinh viên cũ chưa có (chạy khi khởi động)"""
+        updated = 0
+        while True:
+            rows = self.db.query(Student, User.full_name, User.email)\
+                .join(User, User.id == Student.user_id)\
+                .filter(Student.search_text.is_(None))\
+                .limit(batch_size).all()
+            if not rows:
+                return updated
+            for student, full_name, email in rows:
+                student.search_text = build_search_text(full_name, student.student_code, email)
+            self.db.commit()
+            updated += len(rows)
+
+
+def _escape_like(value: str) -> str:
+    """Escape ký tự đặc biệt của LIKE trong từ khóa người dùng nhập"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
\ No newline at end of file
@@ -0,0 +1,310 @@
+import json
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database.session import SessionLocal
+from app.models.chat import Conversation, Message
+from app.models.training import AITrainingCandidate
+from app.rag.embeddings import get_embedding_service, normalize_text
+from app.rag.vector_store import get_vector_store
+from app.shared.enums import MessageType, TrainingStatus
+
+logger = logging.getLogger(__name__)
+
+_STREAM_BATCH = 5000
+_EMBED_BLOCK = 1024
+_MAX_SAMPLES = 5
+_MIN_QUESTION_LENGTH = 10
+
+# Chỉ một job khai thác chạy tại một thời điểm trong mỗi worker
+mining_lock = threading.Lock()
+
+
+@dataclass
+class _UniqueQuestion:
+    text: str
+    count: int
+    first_seen: datetime
+    last_seen: datetime
+
+
+@dataclass
+class MiningStats:
+    messages: int = 0
+    unique_questions: int = 0
+    clusters: int = 0
+    created: int = 0
+    updated: int = 0
+    skipped_reviewed: int = 0
+    collect_seconds: float = 0.0
+    cluster_seconds: float = 0.0
+    seconds: float = 0.0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class LeaderClusterer:
+    """
+    Gom cụm theo ngưỡng (leader clustering) xử lý theo block, vector hóa bằng NumPy:
+    - so cả block với toàn bộ tâm cụm bằng một phép nhân ma trận
+    - các câu chưa vào cụm nào tự bầu leader trong block (ma trận tương đồng block x block)
+    Tâm cụm = trung bình có trọng số (số lần câu hỏi xuất hiện), cập nhật sau mỗi block.
+    """
+
+    def __init__(self, dim: int, threshold: float, capacity: int = 4096):
+        self.threshold = threshold
+        self.k = 0
+        self.sums = np.zeros((capacity, dim), dtype=np.float32)
+        self.centroids = np.zeros((capacity, dim), dtype=np.float32)
+        self.weights = np.zeros(capacity, dtype=np.int64)
+        # Câu đại diện: câu gần tâm cụm nhất tại thời điểm được gán
+        self.best_sim = np.full(capacity, -np.inf, dtype=np.float32)
+        self.best_idx = np.full(capacity, -1, dtype=np.int64)
+        self.first_seen = np.full(capacity, np.inf)
+        self.last_seen = np.full(capacity, -np.inf)
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self.weights)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+
+        def grow(array: np.ndarray, fill) -> np.ndarray:
+            grown = np.full((new_capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            grown[:capacity] = array
+            return grown
+
+        self.sums = grow(self.sums, 0)
+        self.centroids = grow(self.centroids, 0)
+        self.weights = grow(self.weights, 0)
+        self.best_sim = grow(self.best_sim, -np.inf)
+        self.best_idx = grow(self.best_idx, -1)
+        self.first_seen = grow(self.first_seen, np.inf)
+        self.last_seen = grow(self.last_seen, -np.inf)
+
+    def add_block(
+        self,
+        vectors: np.ndarray,
+        weights: np.ndarray,
+        indices: np.ndarray,
+        first_seen: np.ndarray,
+        last_seen: np.ndarray
+    ) -> np.ndarray:
+        n = len(vectors)
+        assign = np.full(n, -1, dtype=np.int64)
+        sims = np.zeros(n, dtype=np.float32)
+
+        # 1. Gán vào cụm đã có
+        if self.k:
+            scores = vectors @ self.centroids[:self.k].T
+            best = np.argmax(scores, axis=1)
+            best_scores = scores[np.arange(n), best]
+            ok = best_scores >= self.threshold
+            assign[ok] = best[ok]
+            sims[ok] = best_scores[ok]
+
+        # 2. Phần còn lại: bầu leader trong block
+        rest = np.flatnonzero(assign < 0)
+        if len(rest):
+            gram = vectors[rest] @ vectors[rest].T
+            remaining = np.ones(len(rest), dtype=bool)
+            self._grow(self.k + len(rest))
+            for i in range(len(rest)):
+                if not remaining[i]:
+                    continue
+                members = remaining & (gram[i] >= self.threshold)
+                assign[rest[members]] = self.k
+                sims[rest[members]] = gram[i, members]
+                remaining &= ~members
+                self.k += 1
+
+        # 3. Cập nhật tâm cụm, trọng số, thời gian, câu đại diện
+        np.add.at(self.sums, assign, vectors * weights[:, None].astype(np.float32))
+        np.add.at(self.weights, assign, weights)
+        np.minimum.at(self.first_seen, assign, first_seen)
+        np.maximum.at(self.last_seen, assign, last_seen)
+        touched = np.unique(assign)
+        self.centroids[touched] = _normalize_rows(self.sums[touched])
+
+        # Sắp tăng dần theo độ tương đồng: gán trùng chỉ số thì giá trị sau (lớn hơn) thắng
+        order = np.argsort(sims)
+        clusters, order_sims = assign[order], sims[order]
+        better = order_sims > self.best_sim[clusters]
+        self.best_sim[clusters[better]] = order_sims[better]
+        self.best_idx[clusters[better]] = indices[order][better]
+        return assign
+
+
+class TrainingMiner:
+    """
+    Khai thác câu hỏi hay gặp từ log chat -> AITrainingCandidate (NEW) để Admin duyệt.
+    1. Stream tin nhắn TEXT của sinh viên bằng server-side cursor, gộp câu trùng nguyên văn
+    2. Embed các câu khác nhau theo lô (có cache), gom cụm bằng LeaderClusterer
+    3. Chấm điểm = tần suất x (1 - mức độ kho tri thức đã bao phủ), ghi/cập nhật candidate
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.embedder = get_embedding_service()
+        self.threshold = settings.TRAINING_MINER_THRESHOLD
+        self.min_frequency = settings.TRAINING_MINER_MIN_FREQUENCY
+
+    def _collect_questions(self, since: datetime, stats: MiningStats) -> List[_UniqueQuestion]:
+        stmt = (
+            select(Message.content, Message.created_at)
+            .join(Conversation, Conversation.id == Message.conversation_id)
+            .where(
+                Message.created_at >= since,
+                Message.sender_id == Conversation.student_id,
+                Message.msg_type == MessageType.TEXT.value
+            )
+            .execution_options(stream_results=True, yield_per=_STREAM_BATCH)
+        )
+        unique: Dict[str, _UniqueQuestion] = {}
+        for partition in self.db.execute(stmt).partitions():
+            for content, created_at in partition:
+                stats.messages += 1
+                text = (content or "").strip()
+                if len(text) < _MIN_QUESTION_LENGTH or " " not in text:
+                    continue
+                key = normalize_text(text)
+                item = unique.get(key)
+                if item is None:
+                    unique[key] = _UniqueQuestion(text, 1, created_at, created_at)
+                else:
+                    item.count += 1
+                    item.first_seen = min(item.first_seen, created_at)
+                    item.last_seen = max(item.last_seen, created_at)
+        return list(unique.values())
+
+    def _coverage(self, centroids: np.ndarray) -> np.ndarray:
+        store = get_vector_store()
+        if not len(store):
+            return np.zeros(len(centroids), dtype=np.float32)
+        return np.array([
+            max((hit.score for hit in store.search(c, k=1)), default=0.0) for c in centroids
+        ], dtype=np.float32)
+
+    def mine(self, days: int) -> MiningStats:
+        started = time.perf_counter()
+        stats = MiningStats()
+        questions = self._collect_questions(datetime.utcnow() - timedelta(days=days), stats)
+        stats.unique_questions = len(questions)
+        stats.collect_seconds = round(time.perf_counter() - started, 2)
+        if not questions:
+            stats.seconds = round(time.perf_counter() - started, 2)
+            return stats
+
+        # Câu xuất hiện nhiều trước -> leader của cụm thường là cách hỏi phổ biến nhất
+        clustering_started = time.perf_counter()
+        questions.sort(key=lambda q: q.count, reverse=True)
+        clusterer = LeaderClusterer(self.embedder.dim, self.threshold)
+        samples: Dict[int, List[str]] = {}
+        for start in range(0, len(questions), _EMBED_BLOCK):
+            block = questions[start:start + _EMBED_BLOCK]
+            vectors = self.embedder.embed_batch([q.text for q in block])
+            assign = clusterer.add_block(
+                vectors,
+                np.array([q.count for q in block], dtype=np.int64),
+                np.arange(start, start + len(block)),
+                np.array([q.first_seen.timestamp() for q in block]),
+                np.array([q.last_seen.timestamp() for q in block])
+            )
+            for question, cluster in zip(block, assign.tolist()):
+                cluster_samples = samples.setdefault(cluster, [])
+                if len(cluster_samples) < _MAX_SAMPLES:
+                    cluster_samples.append(question.text)
+        stats.clusters = clusterer.k
+        stats.cluster_seconds = round(time.perf_counter() - clustering_started, 2)
+
+        selected = np.flatnonzero(clusterer.weights[:clusterer.k] >= self.min_frequency)
+        if len(selected):
+            self._save_candidates(clusterer, selected, questions, samples, stats)
+        stats.seconds = round(time.perf_counter() - started, 2)
+        logger.info(f"Training candidate mining done: {stats.as_dict()}")
+        return stats
+
+    def _save_candidates(
+        self,
+        clusterer: LeaderClusterer,
+        selected: np.ndarray,
+        questions: List[_UniqueQuestion],
+        samples: Dict[int, List[str]],
+        stats: MiningStats
+    ) -> None:
+        centroids = clusterer.centroids[selected]
+        coverage = self._coverage(centroids)
+
+        # Ghép với candidate đã có: NEW -> cập nhật số liệu, APPROVED/REJECTED -> không đề xuất lại
+        existing = self.db.query(AITrainingCandidate).all()
+        matches = np.full(len(selected), -1, dtype=np.int64)
+        if existing:
+            existing_vectors = self.embedder.embed_batch([c.question for c in existing])
+            scores = centroids @ existing_vectors.T
+            best = np.argmax(scores, axis=1)
+            ok = scores[np.arange(len(selected)), best] >= self.threshold
+            matches[ok] = best[ok]
+
+        # Hai cụm có thể cùng khớp một candidate NEW: cụm sau tạo dòng mới thay vì ghi đè cụm trước
+        used_ids: Set[str] = set()
+        for row, cluster in enumerate(selected.tolist()):
+            frequency = int(clusterer.weights[cluster])
+            values = {
+                "question": questions[int(clusterer.best_idx[cluster])].text,
+                "sample_questions": json.dumps(samples.get(cluster, []), ensure_ascii=False),
+                "frequency": frequency,
+                "coverage": float(coverage[row]),
+                "score": round(frequency * (1.0 - max(float(coverage[row]), 0.0)), 4),
+                "first_seen_at": datetime.fromtimestamp(clusterer.first_seen[cluster]),
+                "last_seen_at": datetime.fromtimestamp(clusterer.last_seen[cluster]),
+            }
+            candidate = existing[int(matches[row])] if matches[row] >= 0 else None
+            if candidate is not None and candidate.status != TrainingStatus.NEW:
+                stats.skipped_reviewed += 1
+                continue
+            if candidate is not None and candidate.id not in used_ids:
+                used_ids.add(candidate.id)
+                for key, value in values.items():
+                    setattr(candidate, key, value)
+                stats.updated += 1
+            else:
+                self.db.add(AITrainingCandidate(status=TrainingStatus.NEW, **values))
+                stats.created += 1
+        self.db.commit()
+
+
+def run_mining_job(days: Optional[int] = None) -> Optional[dict]:
+    """Chạy job với session riêng (dùng cho BackgroundTasks / dòng lệnh). None nếu đang có job khác chạy"""
+    if not mining_lock.acquire(blocking=False):
+        return None
+    try:
+        with SessionLocal() as db:
+            return TrainingMiner(db).mine(days or settings.TRAINING_MINER_DAYS).as_dict()
+    except Exception as e:
+        logger.error(f"Training candidate mining failed: {e}")
+        raise
+    finally:
+        mining_lock.release()
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    print(run_mining_job(int(sys.argv[1]) if len(sys.argv) > 1 else None))
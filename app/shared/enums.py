@@ -28,6 +28,11 @@ class TrainingStatus(str, Enum):
     APPROVED = "APPROVED"
     REJECTED = "REJECTED"
 
+class ArticleStatus(str, Enum):
+    DRAFT = "DRAFT"
+    PUBLISHED = "PUBLISHED"
+    ARCHIVED = "ARCHIVED"
+
 from enum import Enum
 
 class UserRole(str, Enum):
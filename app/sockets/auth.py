@@ -0,0 +1,121 @@
+# Xác thực Socket.IO một lần lúc connect + cache quyền truy cập hội thoại theo user
+import logging
+from dataclasses import dataclass, field
+from typing import Optional, Set
+from urllib.parse import parse_qs
+
+from sqlalchemy import or_, select
+
+from app.core.config import settings
+from app.core.principal_cache import Principal, principal_cache
+from app.core.security import verify_token
+from app.database.session import AsyncSessionLocal
+from app.models.chat import Conversation
+from app.models.user import User
+from app.shared.enums import UserRole
+from app.sockets.pubsub import on_access_changed
+from app.utils.helpers import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+def extract_token(environ: dict, auth: Optional[dict]) -> Optional[str]:
+    """Token từ packet handshake ({"token": ...}), query ?token=... hoặc header Authorization"""
+    if isinstance(auth, dict) and auth.get("token"):
+        return auth["token"]
+    query = parse_qs(environ.get("QUERY_STRING", ""))
+    if query.get("token"):
+        return query["token"][0]
+    header = environ.get("HTTP_AUTHORIZATION", "")
+    if header.lower().startswith("bearer "):
+        return header[7:].strip()
+    return None
+
+
+async def authenticate(token: Optional[str]) -> Optional[Principal]:
+    """Giải mã access token + principal (cache dùng chung với REST API). None nếu không hợp lệ"""
+    payload = verify_token(token) if token else None
+    if not payload:
+        return None
+    return await load_principal(payload["sub"])
+
+
+async def load_principal(user_id: str) -> Optional[Principal]:
+    """Principal hiện tại của user (cache, nạp lại từ DB khi miss). None nếu không tồn tại / đã bị khóa"""
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        async with AsyncSessionLocal() as db:
+            row = (await db.execute(
+                select(User.id, User.role, User.is_active).where(User.id == user_id)
+            )).first()
+        if not row:
+            return None
+        principal = Principal(id=row.id, role=row.role, is_active=row.is_active)
+        principal_cache.set(principal.id, principal)
+    return principal if principal.is_active else None
+
+
+@dataclass
+class ConversationACL:
+    allowed: Set[str] = field(default_factory=set)
+    denied: Set[str] = field(default_factory=set)
+
+
+class ConversationAccess:
+    """
+    Quyền vào room hội thoại theo user, cache trong worker (TTL):
+    - Admin: mọi hội thoại
+    - Sinh viên: hội thoại của mình; cán bộ khác: hội thoại đang được gán
+    Lần đầu nạp toàn bộ id hội thoại của user bằng một query, sau đó kiểm tra là tra set.
+    Hội thoại mới / vừa được gán chưa có trong set -> kiểm tra riêng id đó rồi ghi nhớ kết quả.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def _owner_filter(user_id: str):
+        return or_(Conversation.student_id == user_id, Conversation.agent_id == user_id)
+
+    async def _load(self, user_id: str) -> ConversationACL:
+        acl = self._cache.get(user_id)
+        if acl is None:
+            async with AsyncSessionLocal() as db:
+                ids = (await db.execute(select(Conversation.id).where(self._owner_filter(user_id)))).scalars()
+                acl = ConversationACL(allowed=set(ids))
+            self._cache.set(user_id, acl)
+        return acl
+
+    async def can_access(self, principal: Principal, conversation_id: str) -> bool:
+        if principal.role == UserRole.ADMIN:
+            return True
+        acl = await self._load(principal.id)
+        if conversation_id in acl.allowed:
+            return True
+        if conversation_id in acl.denied:
+            return False
+        async with AsyncSessionLocal() as db:
+            allowed = (await db.execute(
+                select(Conversation.id).where(Conversation.id == conversation_id, self._owner_filter(principal.id))
+            )).first() is not None
+        (acl.allowed if allowed else acl.denied).add(conversation_id)
+        return allowed
+
+    def grant(self, user_id: str, conversation_id: str) -> None:
+        """Gọi khi user vừa tạo hội thoại (tránh query lại ở lần kiểm tra kế tiếp)"""
+        acl = self._cache.get(user_id)
+        if acl is not None:
+            acl.allowed.add(conversation_id)
+            acl.denied.discard(conversation_id)
+
+    def invalidate(self, user_id: str) -> None:
+        """Quyền của user đổi (vd. hội thoại chuyển cho cán bộ khác): nạp lại ở lần kiểm tra sau"""
+        self._cache.pop(user_id)
+
+
+conversation_access = ConversationAccess(
+    maxsize=settings.SOCKET_ACL_CACHE_MAX_SIZE,
+    ttl=settings.SOCKET_ACL_CACHE_TTL_SECONDS
+)
+# Chạy trên mọi worker khi socket_manager.revoke_room / grant_room được gọi ở bất kỳ worker nào
+on_access_changed(lambda user_id, room: conversation_access.invalidate(user_id))
@@ -0,0 +1,186 @@
+"""
+Pub/sub cục bộ cho Socket.IO khi chạy nhiều worker trên cùng một máy.
+
+Các worker kết nối tới một broker qua Unix socket; mỗi emit (tới room / user) được
+publish lên broker và broker phát lại cho mọi worker, giống AsyncRedisManager
+nhưng không cần dịch vụ ngoài. Worker nào giữ được file lock sẽ chạy broker
+(tự bầu lại nếu worker đó chết); cũng có thể chạy broker riêng:
+
+    python -m app.sockets.broker /tmp/tlu_chatbot_socketio.sock
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import struct
+import sys
+from typing import Optional, Set
+
+from socketio.async_pubsub_manager import AsyncPubSubManager
+
+from app.sockets.pubsub import AccessChangeMixin
+
+logger = logging.getLogger(__name__)
+
+# Frame: 4 byte độ dài (big-endian) + payload JSON
+_HEADER = struct.Struct("!I")
+# Byte đầu tiên client gửi để khai báo vai trò
+ROLE_PUBLISHER = b"P"
+ROLE_SUBSCRIBER = b"S"
+
+
+def _frame(payload: bytes) -> bytes:
+    return _HEADER.pack(len(payload)) + payload
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> bytes:
+    header = await reader.readexactly(_HEADER.size)
+    (length,) = _HEADER.unpack(header)
+    return await reader.readexactly(length)
+
+
+class LocalBroker:
+    """Broker fan-out: nhận frame từ publisher, phát lại cho tất cả subscriber"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._subscribers: Set[asyncio.StreamWriter] = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._lock_fd: Optional[int] = None
+
+    @property
+    def running(self) -> bool:
+        return self._server is not None
+
+    def try_acquire(self) -> bool:
+        """Bầu broker bằng file lock: chỉ một tiến trình giữ được lock tại một thời điểm"""
+        fd = os.open(f"{self.path}.lock", os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    async def start(self) -> None:
+        # Đang giữ lock nên file socket còn sót lại (nếu có) chắc chắn là của broker đã chết
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle_client, path=self.path)
+        logger.info(f"Socket.IO local broker listening on {self.path}")
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+            for writer in list(self._subscribers):
+                writer.close()
+            self._subscribers.clear()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            role = await reader.readexactly(1)
+            if role == ROLE_SUBSCRIBER:
+                self._subscribers.add(writer)
+                # Subscriber không gửi gì thêm, chờ tới khi đóng kết nối
+                await reader.read()
+                return
+
+            while True:
+                frame = _frame(await _read_frame(reader))
+                subscribers = list(self._subscribers)
+                for sub in subscribers:
+                    sub.write(frame)
+                # Backpressure: chờ buffer của subscriber xả bớt, bỏ subscriber đã đứt
+                results = await asyncio.gather(*(sub.drain() for sub in subscribers), return_exceptions=True)
+                for sub, result in zip(subscribers, results):
+                    if isinstance(result, Exception):
+                        self._subscribers.discard(sub)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._subscribers.discard(writer)
+            writer.close()
+
+
+class LocalPubSubManager(AccessChangeMixin, AsyncPubSubManager):
+    """
+    Client manager Socket.IO dùng LocalBroker làm hàng đợi chung giữa các worker.
+    URL dạng unix:///duong/dan/file.sock
+    """
+    name = "localpubsub"
+
+    def __init__(self, url: str, channel: str = "socketio", write_only: bool = False, logger=None):
+        self.path = url[len("unix://"):] if url.startswith("unix://") else url
+        self._broker = LocalBroker(self.path)
+        self._pub_writer: Optional[asyncio.StreamWriter] = None
+        self._pub_lock = asyncio.Lock()
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+    async def _connect(self, role: bytes):
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+                writer.write(role)
+                await writer.drain()
+                return reader, writer
+            except (FileNotFoundError, ConnectionRefusedError):
+                # Chưa có broker (hoặc broker vừa chết) -> thử tự làm broker
+                if not self._broker.running and self._broker.try_acquire():
+                    await self._broker.start()
+                else:
+                    await asyncio.sleep(0.1)
+
+    async def _publish(self, data):
+        payload = _frame(json.dumps(data).encode("utf-8"))
+        async with self._pub_lock:
+            for _ in range(2):
+                if self._pub_writer is None or self._pub_writer.is_closing():
+                    _, self._pub_writer = await self._connect(ROLE_PUBLISHER)
+                try:
+                    self._pub_writer.write(payload)
+                    await self._pub_writer.drain()
+                    return
+                except ConnectionError:
+                    self._pub_writer = None
+            logger.error("Socket.IO local broker publish failed")
+
+    async def _listen(self):
+        while True:
+            reader, writer = await self._connect(ROLE_SUBSCRIBER)
+            try:
+                while True:
+                    yield json.loads(await _read_frame(reader))
+            except (asyncio.IncompleteReadError, ConnectionError):
+                logger.warning("Socket.IO local broker connection lost, reconnecting...")
+            finally:
+                writer.close()
+
+    async def close(self) -> None:
+        if self._pub_writer is not None:
+            self._pub_writer.close()
+            self._pub_writer = None
+        await self._broker.close()
+
+
+async def _run_standalone(path: str) -> None:
+    broker = LocalBroker(path)
+    if not broker.try_acquire():
+        raise SystemExit(f"Another broker is already running on {path}")
+    await broker.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await broker.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_run_standalone(sys.argv[1] if len(sys.argv) > 1 else "/tmp/tlu_chatbot_socketio.sock"))
@@ -1,14 +1,16 @@
 import socketio
 import logging
-from typing import Any
+from typing import Any, Optional
 
 from app.sockets.manager import sio
-from app.database.session import SessionLocal
-from app.services.chat_service import ChatService
+from app.database.session import AsyncSessionLocal
+from app.services.chat_service import AsyncChatService
 from app.schemas.chat_schema import MessageCreate
-# Nếu cần verify token
-# from app.core.security import verify_password, ALGORITHM, SECRET_KEY
-# from jose import jwt
+from app.core.principal_cache import Principal
+from app.services.dashboard_metrics import DASHBOARD_ROOM
+from app.shared.enums import UserRole
+from app.sockets.auth import authenticate, conversation_access, extract_token, load_principal
+from app.sockets.flow_control import emit_typing, message_rate_limiter, typing_coalescer
 
 logger = logging.getLogger(__name__)
 
@@ -16,16 +18,40 @@ logger = logging.getLogger(__name__)
 async def connect(sid, environ, auth):
     """
     Sự kiện khi Client kết nối.
-    Auth có thể nằm trong packet handshake.
+    Access token gửi trong packet handshake: io(url, {auth: {token}}) (hoặc ?token=... / header Authorization).
+    Xác thực token một lần ở đây; các event sau đọc lại principal qua principal_cache
+    nên tài khoản bị khóa / đổi quyền có hiệu lực mà không cần kết nối lại.
     """
-    logger.info(f"Socket connected: {sid}")
-    # TODO: Thực hiện verify token ở đây nếu cần bảo mật chặt chẽ
-    # token = auth.get("token") if auth else None
-    # if not token: raise ConnectionRefusedError("No token provided")
+    principal = await authenticate(extract_token(environ, auth))
+    if principal is None:
+        raise socketio.exceptions.ConnectionRefusedError("Could not validate credentials")
+
+    await sio.save_session(sid, {"principal": principal})
+    # Room cá nhân: nhận thông báo gửi theo user (emit_to_user)
+    await sio.enter_room(sid, f"user_{principal.id}")
+    logger.info(f"Socket connected: {sid} (user {principal.id})")
+
+async def _get_principal(sid) -> Optional[Principal]:
+    """Principal hiện tại của user trong session (None nếu tài khoản đã bị khóa)"""
+    session = await sio.get_session(sid)
+    principal = session.get("principal")
+    if principal is None:
+        return None
+    return await load_principal(principal.id)
+
+async def _can_join(principal: Principal, room_id: str) -> bool:
+    if room_id == DASHBOARD_ROOM:
+        return principal.role == UserRole.ADMIN
+    if room_id.startswith("user_"):
+        return room_id == f"user_{principal.id}"
+    return await conversation_access.can_access(principal, room_id)
 
 @sio.on("disconnect")
 async def disconnect(sid):
     logger.info(f"Socket disconnected: {sid}")
+    message_rate_limiter.drop_sid(sid)
+    for room_id, payload in typing_coalescer.drop_sid(sid):
+        await emit_typing(room_id, payload, skip_sid=sid)
 
 @sio.on("join_room")
 async def handle_join_room(sid, data):
@@ -35,6 +61,11 @@ async def handle_join_room(sid, data):
     """
     room_id = data.get("room_id")
     if room_id:
+        principal = await _get_principal(sid)
+        if principal is None or not await _can_join(principal, room_id):
+            await sio.emit("error", {"detail": "Not allowed to join this room", "code": "forbidden"}, to=sid)
+            return
+
         # --- FIX LỖI TẠI ĐÂY ---
         # Thêm 'await' vì enter_room là hàm bất đồng bộ trong AsyncServer
         await sio.enter_room(sid, room_id)
@@ -48,44 +79,78 @@ async def handle_join_room(sid, data):
 async def handle_send_message(sid, data):
     """
     Nhận tin nhắn từ Client -> Lưu DB -> Broadcast lại
-    Data: {"conversation_id": "...", "content": "...", "sender_id": "...", "msg_type": "TEXT"}
+    Data: {"conversation_id": "...", "content": "...", "msg_type": "TEXT"}
+    Người gửi luôn là user của session (sender_id client gửi lên bị bỏ qua).
     """
-    db = SessionLocal()
-    try:
-        service = ChatService(db)
-        
-        conversation_id = data.get("conversation_id")
-        content = data.get("content")
-        
-        # Validate input cơ bản
-        if not conversation_id and not content:
-            return
+    conversation_id = data.get("conversation_id")
+    content = data.get("content")
+    
+    # Validate input cơ bản
+    if not conversation_id and not content:
+        return
+
+    # Giới hạn tốc độ theo kết nối: báo client chờ thay vì xử lý
+    retry_after = message_rate_limiter.acquire(sid)
+    if retry_after:
+        await sio.emit("error", {
+            "detail": "Too many messages",
+            "code": "rate_limited",
+            "retry_after_ms": int(retry_after * 1000)
+        }, to=sid)
+        return
+
+    principal = await _get_principal(sid)
+    if principal is None:
+        return
+    if conversation_id:
+        allowed = await conversation_access.can_access(principal, conversation_id)
+    else:
+        # Chỉ sinh viên được mở hội thoại mới
+        allowed = principal.role == UserRole.STUDENT
+    if not allowed:
+        await sio.emit("error", {"detail": "Not allowed to send to this conversation", "code": "forbidden"}, to=sid)
+        return
 
+    try:
         # Tạo DTO
         msg_dto = MessageCreate(
             conversation_id=conversation_id,
             content=content,
             msg_type=data.get("msg_type", "TEXT") # Lấy msg_type từ client gửi lên
         )
-        sender_id = data.get("sender_id") 
 
         # Gọi Service xử lý (Lưu DB + Emit socket trong service)
-        # Lưu ý: Hàm send_message trong ChatService phải là async def để dùng await
-        await service.send_message(sender_id, msg_dto)
+        # AsyncSession: query/commit không chặn event loop của các socket khác
+        async with AsyncSessionLocal() as db:
+            service = AsyncChatService(db)
+            new_msg = await service.send_message(principal.id, msg_dto, sid=sid)
+        if not conversation_id:
+            conversation_access.grant(principal.id, new_msg.conversation_id)
+
+        # Tin nhắn đã gửi -> tắt "Đang nhập..." ngay
+        if conversation_id:
+            stop_payload = typing_coalescer.reset(sid, conversation_id)
+            if stop_payload:
+                await emit_typing(conversation_id, stop_payload, skip_sid=sid)
         
     except Exception as e:
         logger.error(f"Error handling message: {e}")
         await sio.emit("error", {"detail": str(e)}, to=sid)
-    finally:
-        db.close()
 
 @sio.on("typing")
 async def handle_typing(sid, data):
     """
     Hiển thị trạng thái 'Đang nhập...'
     Data: {"room_id": "...", "is_typing": true}
+    Chỉ forward khi bắt đầu / dừng gõ và keep-alive định kỳ (xem TypingCoalescer).
     """
     room_id = data.get("room_id")
     if room_id:
-        # Broadcast cho những người khác trong room (skip_sid=sid để không gửi lại cho chính mình)
-        await sio.emit("typing", data, room=room_id, skip_sid=sid)
\ No newline at end of file
+        principal = await _get_principal(sid)
+        if principal is None or not await conversation_access.can_access(principal, room_id):
+            return
+        # user_id lấy từ session, client không giả mạo được người đang gõ
+        payload = typing_coalescer.update(sid, room_id, bool(data.get("is_typing", True)), {**data, "user_id": principal.id})
+        if payload:
+            # Broadcast cho những người khác trong room (skip_sid=sid để không gửi lại cho chính mình)
+            await emit_typing(room_id, payload, skip_sid=sid)
\ No newline at end of file
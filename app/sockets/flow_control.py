@@ -0,0 +1,167 @@
+# Giảm tải Socket.IO: gộp sự kiện typing + giới hạn tốc độ send_message theo từng kết nối
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.sockets.manager import sio
+
+logger = logging.getLogger(__name__)
+
+TypingKey = Tuple[str, str]  # (room_id, sid)
+
+
+@dataclass
+class TypingState:
+    payload: dict
+    last_forwarded: float
+    expires_at: float
+    # Thời điểm client báo dừng gõ; chỉ forward "dừng" nếu không gõ lại trong cửa sổ debounce
+    stop_requested_at: Optional[float] = None
+
+
+class TypingCoalescer:
+    """
+    Client gửi "typing" theo từng phím; server chỉ forward khi trạng thái đổi (bắt đầu / dừng gõ)
+    và một keep-alive mỗi `keepalive_ms` khi vẫn đang gõ.
+    - dừng rồi gõ lại trong `debounce_ms`: không forward gì (tránh nhấp nháy "Đang nhập...")
+    - không nhận được typing trong `expiry_ms` (client mất mạng, đóng app): tự forward "dừng"
+    Trạng thái nằm trong bộ nhớ worker đang giữ kết nối của sid.
+    """
+
+    def __init__(self, keepalive_ms: int, debounce_ms: int, expiry_ms: int):
+        self.keepalive = keepalive_ms / 1000
+        self.debounce = debounce_ms / 1000
+        self.expiry = expiry_ms / 1000
+        self._states: Dict[TypingKey, TypingState] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def update(self, sid: str, room_id: str, is_typing: bool, data: dict) -> Optional[dict]:
+        """Ghi nhận một event typing; trả về payload cần forward cho room (None = bỏ qua)"""
+        now = time.monotonic()
+        key = (room_id, sid)
+        state = self._states.get(key)
+
+        if not is_typing:
+            if state is not None and state.stop_requested_at is None:
+                state.stop_requested_at = now
+            return None
+
+        payload = {**data, "room_id": room_id, "is_typing": True}
+        if state is None:
+            self._states[key] = TypingState(payload, now, now + self.expiry)
+            return payload
+
+        state.payload = payload
+        state.expires_at = now + self.expiry
+        state.stop_requested_at = None
+        if now - state.last_forwarded >= self.keepalive:
+            state.last_forwarded = now
+            return payload
+        return None
+
+    def reset(self, sid: str, room_id: str) -> Optional[dict]:
+        """Gửi tin nhắn xong -> dừng gõ ngay, không chờ debounce"""
+        state = self._states.pop((room_id, sid), None)
+        return self._stop_payload(state) if state is not None else None
+
+    def drop_sid(self, sid: str) -> List[Tuple[str, dict]]:
+        """Ngắt kết nối -> [(room_id, payload dừng gõ)] cho các room sid đang gõ"""
+        keys = [key for key in self._states if key[1] == sid]
+        return [(key[0], self._stop_payload(self._states.pop(key))) for key in keys]
+
+    def sweep(self, now: Optional[float] = None) -> List[Tuple[str, str, dict]]:
+        """Các trạng thái đã hết debounce / hết hạn -> [(room_id, sid, payload dừng gõ)]"""
+        now = time.monotonic() if now is None else now
+        expired = [
+            key for key, state in self._states.items()
+            if state.expires_at <= now
+            or (state.stop_requested_at is not None and now - state.stop_requested_at >= self.debounce)
+        ]
+        return [(room_id, sid, self._stop_payload(self._states.pop((room_id, sid)))) for room_id, sid in expired]
+
+    @staticmethod
+    def _stop_payload(state: TypingState) -> dict:
+        return {**state.payload, "is_typing": False}
+
+    # --- VÒNG LẶP DỌN TRẠNG THÁI ---
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        interval = max(min(self.debounce, self.expiry) / 2, 0.05)
+        while True:
+            await asyncio.sleep(interval)
+            for room_id, sid, payload in self.sweep():
+                await emit_typing(room_id, payload, skip_sid=sid)
+
+
+async def emit_typing(room_id: str, payload: dict, skip_sid: Optional[str] = None) -> None:
+    try:
+        await sio.emit("typing", payload, room=room_id, skip_sid=skip_sid)
+    except Exception as e:
+        logger.error(f"Typing emit error: {e}")
+
+
+class TokenBucket:
+    """Bucket `capacity` token, nạp lại `rate` token/giây"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, cost: float = 1.0) -> float:
+        """Lấy token; trả về 0 nếu được phép, ngược lại số giây cần chờ"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class SocketRateLimiter:
+    """Token bucket theo sid: một client gửi dồn dập không chiếm hết worker (DB, broadcast, bot)"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def acquire(self, sid: str) -> float:
+        """0 = cho qua; > 0 = bị từ chối, số giây client nên chờ"""
+        bucket = self._buckets.get(sid)
+        if bucket is None:
+            bucket = self._buckets[sid] = TokenBucket(self.rate, self.burst)
+        return bucket.take()
+
+    def drop_sid(self, sid: str) -> None:
+        self._buckets.pop(sid, None)
+
+
+typing_coalescer = TypingCoalescer(
+    keepalive_ms=settings.TYPING_KEEPALIVE_MS,
+    debounce_ms=settings.TYPING_DEBOUNCE_MS,
+    expiry_ms=settings.TYPING_EXPIRY_MS
+)
+message_rate_limiter = SocketRateLimiter(
+    rate=settings.SOCKET_MESSAGE_RATE,
+    burst=settings.SOCKET_MESSAGE_BURST
+)
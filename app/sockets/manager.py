@@ -2,11 +2,41 @@ import socketio
 import logging
 from typing import Optional
 
+from app.core.config import settings
+from app.sockets.pubsub import RedisManager, change_access
+
 logger = logging.getLogger(__name__)
 
+def _create_client_manager(url: str) -> Optional[socketio.AsyncManager]:
+    """
+    Chọn backend pub/sub để nhiều worker dùng chung rooms:
+    - ""            : một tiến trình (mặc định)
+    - redis://...   : AsyncRedisManager
+    - unix:///x.sock: broker cục bộ qua Unix socket (không cần dịch vụ ngoài)
+    """
+    if not url:
+        return None
+    if url.startswith(("redis://", "rediss://")):
+        return RedisManager(url)
+    if url.startswith("unix://"):
+        from app.sockets.broker import LocalPubSubManager
+        return LocalPubSubManager(url)
+    raise ValueError(f"Unsupported SOCKETIO_MESSAGE_QUEUE: {url}")
+
+client_manager = _create_client_manager(settings.SOCKETIO_MESSAGE_QUEUE)
+
 # Khởi tạo Socket.IO Server (Async)
 # cors_allowed_origins='*' để dev, production nên config cụ thể
-sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+sio = socketio.AsyncServer(
+    async_mode='asgi',
+    cors_allowed_origins='*',
+    client_manager=client_manager
+)
+
+async def close_client_manager():
+    """Đóng kết nối tới broker (gọi khi tắt server)"""
+    if client_manager is not None and hasattr(client_manager, "close"):
+        await client_manager.close()
 
 class SocketManager:
     """Helper class để quản lý rooms và events"""
@@ -18,12 +48,36 @@ class SocketManager:
         except Exception as e:
             logger.error(f"Socket emit error: {e}")
 
+    @staticmethod
+    async def emit_to_sid(sid: str, event: str, data: dict):
+        """Gửi event tới đúng một kết nối socket"""
+        try:
+            await sio.emit(event, data, to=sid)
+        except Exception as e:
+            logger.error(f"Socket emit sid error: {e}")
+
     @staticmethod
     async def emit_to_user(user_id: str, event: str, data: dict):
-        """Gửi event đến room cá nhân của user"""
+        """Gửi event đến room cá nhân của user (đi qua client manager nên tới được mọi worker)"""
         try:
             await sio.emit(event, data, room=f"user_{user_id}")
         except Exception as e:
             logger.error(f"Socket emit user error: {e}")
 
+    @staticmethod
+    async def revoke_room(user_id: str, room: str):
+        """User mất quyền vào room (vd. hội thoại chuyển cho cán bộ khác): rút mọi kết nối của user khỏi room"""
+        try:
+            await change_access(sio, user_id, room, revoked=True)
+        except Exception as e:
+            logger.error(f"Socket revoke room error: {e}")
+
+    @staticmethod
+    async def grant_room(user_id: str, room: str):
+        """User vừa được cấp quyền vào room: các worker bỏ kết quả 'không có quyền' đã cache"""
+        try:
+            await change_access(sio, user_id, room, revoked=False)
+        except Exception as e:
+            logger.error(f"Socket grant room error: {e}")
+
 socket_manager = SocketManager()
\ No newline at end of file
@@ -0,0 +1,77 @@
+# Đổi quyền vào room của một user trên mọi worker (room + session chỉ nằm trong worker giữ kết nối)
+import logging
+from typing import Callable, List
+
+import socketio
+
+logger = logging.getLogger(__name__)
+
+# Event nội bộ đi qua hàng đợi pub/sub giữa các worker, được xử lý trên server chứ không gửi tới client
+ACCESS_CHANGED_EVENT = "__access_changed"
+
+_access_hooks: List[Callable[[str, str], None]] = []
+
+
+def on_access_changed(hook: Callable[[str, str], None]) -> Callable[[str, str], None]:
+    """Đăng ký hook(user_id, room) chạy trên mọi worker khi quyền của user với room thay đổi"""
+    _access_hooks.append(hook)
+    return hook
+
+
+async def apply_access_change(server: socketio.AsyncServer, user_id: str, room: str, revoked: bool, namespace: str = "/") -> int:
+    """
+    Trên worker hiện tại: chạy hook (vd. xóa cache quyền), nếu mất quyền thì rút các kết nối
+    của user (room cá nhân user_<id>) khỏi room. Trả về số kết nối đã rút.
+    """
+    for hook in _access_hooks:
+        hook(user_id, room)
+    if not revoked:
+        return 0
+    sids = [sid for sid, _ in server.manager.get_participants(namespace, f"user_{user_id}")]
+    for sid in sids:
+        await server.leave_room(sid, room, namespace=namespace)
+    if sids:
+        logger.info(f"Removed {len(sids)} socket(s) of user {user_id} from room {room}")
+    return len(sids)
+
+
+class AccessChangeMixin:
+    """
+    Mixin cho AsyncPubSubManager: phát ACCESS_CHANGED_EVENT tới các worker khác và xử lý khi nhận.
+    Message có dạng một lệnh emit tới room user_<id>: worker cũ chưa có mixin (đang rolling deploy)
+    chỉ chuyển event lạ này tới client của user, không gây hại.
+    """
+
+    async def change_access(self, user_id: str, room: str, revoked: bool, namespace: str = "/") -> None:
+        await apply_access_change(self.server, user_id, room, revoked, namespace)
+        await self._publish({
+            "method": "emit",
+            "event": ACCESS_CHANGED_EVENT,
+            "data": {"user_id": user_id, "room": room, "revoked": revoked},
+            "namespace": namespace,
+            "room": f"user_{user_id}",
+            "skip_sid": None,
+            "callback": None,
+            "host_id": self.host_id
+        })
+
+    async def _handle_emit(self, message):
+        if message.get("event") == ACCESS_CHANGED_EVENT:
+            data = message.get("data") or {}
+            await apply_access_change(
+                self.server, data["user_id"], data["room"], bool(data.get("revoked")), message.get("namespace") or "/"
+            )
+            return
+        await super()._handle_emit(message)
+
+
+class RedisManager(AccessChangeMixin, socketio.AsyncRedisManager):
+    pass
+
+
+async def change_access(server: socketio.AsyncServer, user_id: str, room: str, revoked: bool) -> None:
+    """Áp dụng trên mọi worker nếu có hàng đợi pub/sub, ngược lại chỉ tiến trình hiện tại"""
+    if isinstance(server.manager, AccessChangeMixin):
+        await server.manager.change_access(user_id, room, revoked)
+    else:
+        await apply_access_change(server, user_id, room, revoked)
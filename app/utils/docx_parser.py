@@ -1 +1,195 @@
-# Parser for 'các câu hỏi thường gặp.docx' placeholder
+# Parser cho 'các câu hỏi thường gặp.docx': đọc XML dạng stream (iterparse), không dựng toàn bộ DOM
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import IO, Dict, Iterator, List, Optional, Tuple, Union
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_P, _TBL, _TR, _TC, _BODY = f"{_W}p", f"{_W}tbl", f"{_W}tr", f"{_W}tc", f"{_W}body"
+_HEADING_NAME = re.compile(r"^(heading|tiêu đề|tieu de)\s*(\d)$", re.IGNORECASE)
+
+# "Câu 1:", "Câu hỏi 12.", "Hỏi:", "Q:", "1. ... ?" ...
+_QUESTION_PREFIX = re.compile(r"^\s*(câu\s*hỏi|câu|hỏi|q)\s*\d*\s*[:.)\-]\s*", re.IGNORECASE)
+_ANSWER_PREFIX = re.compile(r"^\s*(trả\s*lời|đáp|tl|a)\s*[:.)\-]\s*", re.IGNORECASE)
+_NUMBERED = re.compile(r"^\s*\d+\s*[.)]\s*")
+
+
+@dataclass
+class FAQRecord:
+    question: str
+    answer: str
+    # Heading cấp 1 gần nhất / heading cấp 2 gần nhất (nếu có)
+    category: Optional[str] = None
+    subcategory: Optional[str] = None
+    # Thứ tự trong tài liệu (bắt đầu từ 0)
+    index: int = 0
+
+
+def _outline_level(element: ET.Element) -> Optional[int]:
+    """w:outlineLvl 0..8 -> heading cấp 1..9; 9 = văn bản thường (không phải heading)"""
+    outline = element.find(f"{_W}pPr/{_W}outlineLvl")
+    if outline is None:
+        return None
+    value = int(outline.get(f"{_W}val", "0"))
+    return value + 1 if 0 <= value < 9 else 0
+
+
+def _load_heading_levels(archive: zipfile.ZipFile) -> Dict[str, int]:
+    """styleId -> cấp heading (1, 2...). styles.xml nhỏ nên parse trọn"""
+    try:
+        root = ET.fromstring(archive.read("word/styles.xml"))
+    except KeyError:
+        return {}
+    levels: Dict[str, int] = {}
+    for style in root.iter(f"{_W}style"):
+        style_id = style.get(f"{_W}styleId")
+        name = style.find(f"{_W}name")
+        match = _HEADING_NAME.match(name.get(f"{_W}val", "")) if name is not None else None
+        if match:
+            levels[style_id] = int(match.group(2))
+        else:
+            outline = _outline_level(style)
+            if outline:
+                levels[style_id] = outline
+    return levels
+
+
+def _paragraph_text(p: ET.Element) -> Tuple[str, bool]:
+    """Ghép text của đoạn văn; trả thêm cờ 'toàn bộ text in đậm'"""
+    parts: List[str] = []
+    all_bold = True
+    for run in p.iter(f"{_W}r"):
+        run_text = []
+        for node in run:
+            if node.tag == f"{_W}t":
+                run_text.append(node.text or "")
+            elif node.tag == f"{_W}tab":
+                run_text.append("\t")
+            elif node.tag in (f"{_W}br", f"{_W}cr"):
+                run_text.append("\n")
+        text = "".join(run_text)
+        if text.strip():
+            bold = run.find(f"{_W}rPr/{_W}b")
+            if bold is None or bold.get(f"{_W}val", "true") in ("0", "false"):
+                all_bold = False
+        parts.append(text)
+    text = "".join(parts).strip()
+    return text, all_bold and bool(text)
+
+
+def _paragraph_level(p: ET.Element, heading_levels: Dict[str, int]) -> Optional[int]:
+    # outlineLvl gắn trực tiếp trên đoạn ghi đè style (kể cả 9 = đoạn thường dù style là heading)
+    outline = _outline_level(p)
+    if outline is not None:
+        return outline or None
+    style = p.find(f"{_W}pPr/{_W}pStyle")
+    if style is not None:
+        return heading_levels.get(style.get(f"{_W}val"))
+    return None
+
+
+class _FAQBuilder:
+    """Máy trạng thái: heading -> category, câu hỏi mới -> đóng record trước, còn lại nối vào câu trả lời"""
+
+    def __init__(self):
+        self.category: Optional[str] = None
+        self.subcategory: Optional[str] = None
+        self.question: Optional[str] = None
+        self.answer: List[str] = []
+        self.count = 0
+
+    def _emit(self) -> Optional[FAQRecord]:
+        record = None
+        if self.question and self.answer:
+            record = FAQRecord(
+                question=self.question,
+                answer="\n".join(self.answer),
+                category=self.category,
+                subcategory=self.subcategory,
+                index=self.count
+            )
+            self.count += 1
+        self.question, self.answer = None, []
+        return record
+
+    def heading(self, level: int, text: str) -> Optional[FAQRecord]:
+        record = self._emit()
+        if level <= 1:
+            self.category, self.subcategory = text, None
+        else:
+            self.subcategory = text
+        return record
+
+    def paragraph(self, text: str, bold: bool) -> Optional[FAQRecord]:
+        prefixed = _QUESTION_PREFIX.match(text)
+        is_question = bool(prefixed) or (text.endswith("?") and (bold or _NUMBERED.match(text) or not self.answer))
+        if prefixed or (is_question and not (self.question and not self.answer)):
+            record = self._emit()
+            self.question = text[prefixed.end():] if prefixed else _NUMBERED.sub("", text)
+            return record
+        if is_question:
+            # Câu hỏi viết trên nhiều đoạn
+            self.question = f"{self.question} {text}"
+        elif self.question:
+            self.answer.append(_ANSWER_PREFIX.sub("", text, count=1) if not self.answer else text)
+        return None
+
+    def pair(self, question: str, answer: str) -> Optional[FAQRecord]:
+        """Dòng bảng dạng | Câu hỏi | Trả lời |"""
+        record = self._emit()
+        self.question = _QUESTION_PREFIX.sub("", question, count=1)
+        self.answer = [_ANSWER_PREFIX.sub("", answer, count=1)]
+        return record or self._emit()
+
+    def finish(self) -> Optional[FAQRecord]:
+        return self._emit()
+
+
+def iter_faq_records(source: Union[str, IO[bytes]]) -> Iterator[FAQRecord]:
+    """
+    Duyệt các cặp hỏi/đáp trong file DOCX (đường dẫn hoặc file object).
+    Bộ nhớ không phụ thuộc độ dài tài liệu: mỗi đoạn / bảng được xử lý xong là xóa khỏi cây XML.
+    """
+    with zipfile.ZipFile(source) as archive:
+        heading_levels = _load_heading_levels(archive)
+        builder = _FAQBuilder()
+        body: Optional[ET.Element] = None
+        table_depth = 0
+
+        with archive.open("word/document.xml") as xml_file:
+            for event, elem in ET.iterparse(xml_file, events=("start", "end")):
+                if event == "start":
+                    if elem.tag == _BODY:
+                        body = elem
+                    elif elem.tag == _TBL:
+                        table_depth += 1
+                    continue
+
+                record = None
+                if elem.tag == _P and table_depth == 0:
+                    text, bold = _paragraph_text(elem)
+                    if text:
+                        level = _paragraph_level(elem, heading_levels)
+                        record = builder.heading(level, text) if level else builder.paragraph(text, bold)
+                elif elem.tag == _TR and table_depth == 1:
+                    cells = ["\n".join(filter(None, (_paragraph_text(p)[0] for p in tc.iter(_P)))) for tc in elem.iter(_TC)]
+                    cells = [c for c in cells if c]
+                    if len(cells) >= 2:
+                        record = builder.pair(cells[0], "\n".join(cells[1:]))
+                    elif cells:
+                        record = builder.paragraph(cells[0], False)
+                    elem.clear()
+                elif elem.tag == _TBL:
+                    table_depth -= 1
+
+                # Phần tử cấp body đã xử lý xong -> bỏ khỏi cây để giữ bộ nhớ cố định
+                if body is not None and table_depth == 0 and elem.tag in (_P, _TBL):
+                    body.clear()
+
+                if record:
+                    yield record
+
+        record = builder.finish()
+        if record:
+            yield record
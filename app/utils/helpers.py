@@ -1 +1,127 @@
-# Helper utilities placeholder
+import base64
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Hashable, Optional, Tuple
+
+
+# --- CHUẨN HÓA TIẾNG VIỆT ---
+def fold_vietnamese(text: str) -> str:
+    """
+    Bỏ dấu tiếng Việt + lowercase để tìm kiếm không phân biệt dấu.
+    Ví dụ: "Nguyễn Văn Đức" -> "nguyen van duc"
+    """
+    text = text.replace("đ", "d").replace("Đ", "D")
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def build_search_text(*parts: Optional[str]) -> str:
+    """Ghép các trường (đã bỏ dấu) thành một chuỗi để đánh index tìm kiếm"""
+    return " ".join(fold_vietnamese(p).strip() for p in parts if p)
+
+
+# --- CURSOR PHÂN TRANG (KEYSET) ---
+def encode_cursor(*parts: Any) -> str:
+    """
+    Mã hóa các giá trị khóa sắp xếp thành cursor "opaque" (base64 url-safe).
+    datetime được chuyển sang ISO format để giữ nguyên độ chính xác microsecond.
+    """
+    raw = "|".join(p.isoformat() if isinstance(p, datetime) else str(p) for p in parts)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, n_parts: int) -> Tuple[str, ...]:
+    """Giải mã cursor, raise ValueError nếu cursor sai định dạng"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+    parts = tuple(raw.split("|", n_parts - 1))
+    if len(parts) != n_parts:
+        raise ValueError("Invalid cursor")
+    return parts
+
+
+def decode_time_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Cursor dạng (created_at, id) dùng chung cho tin nhắn / hội thoại"""
+    created_at, row_id = decode_cursor(cursor, 2)
+    try:
+        return datetime.fromisoformat(created_at), row_id
+    except ValueError:
+        raise ValueError("Invalid cursor")
+
+
+# --- CACHE TRONG TIẾN TRÌNH ---
+class TTLCache:
+    """
+    Cache LRU có giới hạn kích thước + thời gian sống (TTL), an toàn đa luồng.
+    Dùng cho các giá trị đọc nhiều ghi ít trong phạm vi một worker.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, self._MISSING)
+            if item is self._MISSING or item[0] < now:
+                if item is not self._MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def incr(self, key: Hashable, delta: int = 1) -> None:
+        """Cộng dồn giá trị số nếu key còn trong cache (không gia hạn TTL)"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                self._data[key] = (item[0], item[1] + delta)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,80 @@
+"""
+Ảnh phái sinh (thumbnail / medium) cho ảnh chat và avatar.
+
+Quy ước đường dẫn (đảo ngược được, không cần tra DB):
+    static/uploads/avatars/abc.jpeg
+    -> static/uploads/avatars/_d/thumb/abc.jpeg.webp
+    -> static/uploads/avatars/_d/medium/abc.jpeg.webp
+"""
+import os
+from typing import Dict, Optional
+
+# Tên -> (rộng, cao, crop vuông hay giữ tỉ lệ)
+DERIVATIVE_SPECS = {
+    "thumb": (96, 96, True),      # Avatar 48px @2x, preview nhỏ
+    "medium": (640, 640, False),  # Bong bóng chat
+}
+DERIVATIVE_DIR = "_d"
+DERIVATIVE_EXT = ".webp"
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+
+
+def is_image_url(url: Optional[str]) -> bool:
+    return bool(url) and os.path.splitext(url)[1].lower() in IMAGE_EXTENSIONS
+
+
+def derivative_url(url: str, name: str) -> str:
+    """static/uploads/x/abc.jpg -> static/uploads/x/_d/<name>/abc.jpg.webp"""
+    folder, filename = url.rsplit("/", 1)
+    return f"{folder}/{DERIVATIVE_DIR}/{name}/{filename}{DERIVATIVE_EXT}"
+
+
+def derivative_urls(url: Optional[str]) -> Optional[Dict[str, str]]:
+    """URL các ảnh phái sinh của một ảnh upload (None nếu không phải ảnh)"""
+    if not is_image_url(url) or f"/{DERIVATIVE_DIR}/" in url:
+        return None
+    url = url.lstrip("/")
+    return {name: derivative_url(url, name) for name in DERIVATIVE_SPECS}
+
+
+def parse_derivative_url(url: str) -> Optional[tuple]:
+    """Ngược lại của derivative_url: trả về (url ảnh gốc, tên phái sinh) hoặc None"""
+    url = url.lstrip("/")
+    parts = url.split("/")
+    if len(parts) < 4 or parts[-3] != DERIVATIVE_DIR or parts[-2] not in DERIVATIVE_SPECS:
+        return None
+    filename = parts[-1]
+    if not filename.endswith(DERIVATIVE_EXT):
+        return None
+    source = "/".join(parts[:-3] + [filename[:-len(DERIVATIVE_EXT)]])
+    return source, parts[-2]
+
+
+def generate_derivative(source_path: str, name: str) -> str:
+    """
+    Tạo một ảnh phái sinh từ ảnh gốc (chạy trong process pool, CPU-bound).
+    Ghi ra file tạm rồi rename để request khác không đọc phải file dở dang.
+    """
+    from PIL import Image, ImageOps
+
+    width, height, crop = DERIVATIVE_SPECS[name]
+    target_path = derivative_url(source_path.replace(os.sep, "/"), name).replace("/", os.sep)
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+
+    with Image.open(source_path) as img:
+        img = ImageOps.exif_transpose(img)
+        img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+        if crop:
+            img = ImageOps.fit(img, (width, height), Image.LANCZOS)
+        else:
+            img.thumbnail((width, height), Image.LANCZOS)
+
+        tmp_path = f"{target_path}.{os.getpid()}.part"
+        img.save(tmp_path, format="WEBP", quality=80, method=4)
+        os.replace(tmp_path, target_path)
+    return target_path
+
+
+def generate_all_derivatives(source_path: str) -> Dict[str, str]:
+    """Tạo toàn bộ ảnh phái sinh (gọi ngay sau khi upload)"""
+    return {name: generate_derivative(source_path, name) for name in DERIVATIVE_SPECS}
@@ -0,0 +1,179 @@
+import os
+import re
+import stat
+from email.utils import formatdate
+from mimetypes import guess_type
+from typing import Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Receive, Scope, Send
+
+from app.services.file_service import FileService
+
+# Tên file chứa UUID (upload thường) hoặc SHA-256 (blob content-addressed) -> nội dung không bao giờ đổi
+_IMMUTABLE_NAME = re.compile(
+    r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|[0-9a-f]{64}"
+)
+_SHA256_NAME = re.compile(r"^([0-9a-f]{64})\.")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+CHUNK_SIZE = 256 * 1024
+
+
+def _etag_for(full_path: str, stat_result: os.stat_result) -> str:
+    """ETag mạnh: SHA-256 với blob content-addressed, ngược lại inode-size-mtime (file chỉ được ghi atomic)"""
+    match = _SHA256_NAME.match(os.path.basename(full_path))
+    if match:
+        return f'"{match.group(1)}"'
+    return f'"{stat_result.st_ino:x}-{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse Range một đoạn (bytes=a-b | bytes=a- | bytes=-n) -> (start, end) inclusive.
+    Nhiều đoạn -> None (trả về cả file, được phép theo RFC 9110).
+    Raise ValueError nếu không thỏa mãn được (416).
+    """
+    match = _RANGE.match(header.strip())
+    if not match:
+        if header.strip().startswith("bytes=") and "," in header:
+            return None
+        raise ValueError("Invalid range")
+    first, last = match.groups()
+    if first == "":
+        if last == "" or int(last) == 0:
+            raise ValueError("Invalid range")
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+class MediaFileResponse(Response):
+    """
+    Response cho file upload: ETag mạnh, Cache-Control immutable, HTTP Range (206/416),
+    và truyền file zero-copy khi server ASGI hỗ trợ (zerocopysend / pathsend).
+    """
+
+    def __init__(self, full_path: str, stat_result: os.stat_result, scope: Scope, immutable: bool):
+        super().__init__(status_code=200)
+        self.full_path = full_path
+        self.size = stat_result.st_size
+        self.method = scope["method"]
+        self.extensions = scope.get("extensions") or {}
+        self.start, self.end = 0, self.size - 1
+
+        etag = _etag_for(full_path, stat_result)
+        media_type = guess_type(full_path)[0] or "application/octet-stream"
+        self.headers["content-type"] = media_type
+        self.headers["etag"] = etag
+        self.headers["last-modified"] = formatdate(stat_result.st_mtime, usegmt=True)
+        self.headers["accept-ranges"] = "bytes"
+        self.headers["cache-control"] = IMMUTABLE_CACHE_CONTROL if immutable else DEFAULT_CACHE_CONTROL
+
+        request_headers = Headers(scope=scope)
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            if "*" in tags or etag in tags:
+                self.status_code = 304
+                del self.headers["content-length"]
+                return
+
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if range_header and self.size > 0 and (if_range is None or if_range.strip() == etag):
+            try:
+                parsed = _parse_range(range_header, self.size)
+            except ValueError:
+                self.status_code = 416
+                self.headers["content-range"] = f"bytes */{self.size}"
+                self.headers["content-length"] = "0"
+                return
+            if parsed:
+                self.start, self.end = parsed
+                self.status_code = 206
+                self.headers["content-range"] = f"bytes {self.start}-{self.end}/{self.size}"
+
+        self.headers["content-length"] = str(self.end - self.start + 1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if self.method == "HEAD" or self.status_code in (304, 416) or self.size == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        count = self.end - self.start + 1
+        if "http.response.zerocopysend" in self.extensions:
+            # Zero-copy: server dùng sendfile() từ file descriptor
+            with open(self.full_path, "rb") as file:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file, "offset": self.start, "count": count
+                })
+            return
+
+        if "http.response.pathsend" in self.extensions and self.status_code == 200:
+            await send({"type": "http.response.pathsend", "path": self.full_path})
+            return
+
+        async with await anyio.open_file(self.full_path, mode="rb") as file:
+            await file.seek(self.start)
+            remaining = count
+            while remaining > 0:
+                chunk = await file.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            # File bị cắt ngắn giữa chừng: vẫn phải đóng response
+            await send({"type": "http.response.body", "body": b""})
+
+
+class MediaStaticFiles(StaticFiles):
+    """
+    StaticFiles cho thư mục static:
+    - static/uploads/*: phục vụ bằng MediaFileResponse (ETag, immutable, Range, zero-copy)
+    - Request ảnh phái sinh (thumb/medium) chưa tồn tại -> tạo lazy từ ảnh gốc rồi trả về
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.file_service = FileService()
+        self.uploads_dir = os.path.realpath(os.path.join(str(self.directory), "uploads"))
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        real_path = os.path.realpath(full_path)
+        if status_code != 200 or not stat.S_ISREG(stat_result.st_mode) \
+                or not real_path.startswith(self.uploads_dir + os.sep):
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        immutable = bool(_IMMUTABLE_NAME.search(os.path.basename(real_path)))
+        return MediaFileResponse(str(full_path), stat_result, scope, immutable)
+
+    async def get_response(self, path: str, scope: Scope):
+        try:
+            response = await super().get_response(path, scope)
+            if response.status_code != 404:
+                return response
+        except HTTPException as e:
+            if e.status_code != 404:
+                raise
+
+        # Chỉ tạo ảnh phái sinh cho đường dẫn bình thường bên trong static/uploads (chặn ../)
+        if ".." in path.replace("\\", "/").split("/"):
+            raise HTTPException(status_code=404)
+        url = f"{self.directory}/{path}".replace("\\", "/")
+        if await self.file_service.ensure_derivative(url, root=self.uploads_dir):
+            return await super().get_response(path, scope)
+        raise HTTPException(status_code=404)
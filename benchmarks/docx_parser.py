@@ -0,0 +1,153 @@
+"""
+Benchmark parser FAQ .docx: sinh một file DOCX lớn (heading, câu hỏi in đậm, bảng hỏi/đáp,
+đoạn có outlineLvl=9) rồi đo thời gian, số record và bộ nhớ đỉnh (tracemalloc) của
+iter_faq_records. Nếu có python-docx thì đo thêm cách đọc dựng toàn bộ DOM để so sánh.
+
+    python benchmarks/docx_parser.py --faqs 50000
+    python benchmarks/docx_parser.py --file "data/các câu hỏi thường gặp.docx"
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+_NS = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '<Override PartName="/word/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+    '</Types>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/></Relationships>'
+)
+_DOC_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/></Relationships>'
+)
+_STYLES = (
+    f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:styles {_NS}>'
+    '<w:style w:type="paragraph" w:styleId="Heading1"><w:name w:val="heading 1"/></w:style>'
+    '<w:style w:type="paragraph" w:styleId="Heading2"><w:name w:val="heading 2"/></w:style>'
+    '<w:style w:type="paragraph" w:styleId="BodyText"><w:name w:val="Body Text"/>'
+    '<w:pPr><w:outlineLvl w:val="9"/></w:pPr></w:style>'
+    '</w:styles>'
+)
+
+
+def _p(text, style=None, bold=False, outline=None):
+    ppr = ""
+    if style or outline is not None:
+        ppr = "<w:pPr>"
+        ppr += f'<w:pStyle w:val="{style}"/>' if style else ""
+        ppr += f'<w:outlineLvl w:val="{outline}"/>' if outline is not None else ""
+        ppr += "</w:pPr>"
+    rpr = "<w:rPr><w:b/></w:rPr>" if bold else ""
+    return f'<w:p>{ppr}<w:r>{rpr}<w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p>'
+
+
+def _cell(text):
+    return f"<w:tc>{_p(text)}</w:tc>"
+
+
+def generate_docx(path, faqs, answer_paragraphs=3, per_section=50):
+    """Ghi DOCX ~faqs cặp hỏi/đáp; trả về số cặp kỳ vọng"""
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        archive.writestr("_rels/.rels", _RELS)
+        archive.writestr("word/_rels/document.xml.rels", _DOC_RELS)
+        archive.writestr("word/styles.xml", _STYLES)
+        with archive.open("word/document.xml", "w") as doc:
+            doc.write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:document {_NS}><w:body>'.encode())
+            for i in range(faqs):
+                parts = []
+                if i % per_section == 0:
+                    parts.append(_p(f"Phần {i // per_section + 1}: Thủ tục học vụ", style="Heading1"))
+                    parts.append(_p("Mục lục phần (đoạn thường, outlineLvl=9)", outline=9))
+                if i % 10 == 9:
+                    # Một phần câu hỏi nằm trong bảng | Câu hỏi | Trả lời |
+                    parts.append(
+                        f"<w:tbl><w:tr>{_cell(f'Câu {i + 1}: Làm sao để phúc khảo môn {i}?')}"
+                        f"{_cell('Sinh viên nộp đơn phúc khảo trong vòng 7 ngày kể từ khi có điểm.')}</w:tr></w:tbl>"
+                    )
+                else:
+                    parts.append(_p(f"Câu {i + 1}: Thủ tục xin giấy xác nhận sinh viên số {i} như thế nào?", bold=True))
+                    for j in range(answer_paragraphs):
+                        parts.append(_p(
+                            f"Trả lời: đoạn {j + 1}. Sinh viên đăng nhập cổng thông tin, chọn mục dịch vụ "
+                            f"một cửa và gửi yêu cầu; phòng Công tác sinh viên xử lý trong 2 ngày làm việc.",
+                            style="BodyText"
+                        ))
+                doc.write("".join(parts).encode("utf-8"))
+            doc.write(b"</w:body></w:document>")
+    return faqs
+
+
+def measure(name, parse):
+    """Lần 1 đo thời gian; lần 2 đo bộ nhớ đỉnh (tracemalloc làm chậm nên không đo chung)"""
+    started = time.perf_counter()
+    count = parse()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    parse()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<12} records={count:<8} time={elapsed:6.2f}s  peak memory={peak / 1024 / 1024:7.1f}MB")
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faqs", type=int, default=50000)
+    parser.add_argument("--file", help="Đo trên file .docx có sẵn thay vì sinh file")
+    args = parser.parse_args()
+
+    from app.utils.docx_parser import iter_faq_records
+
+    path = args.file
+    expected = None
+    if not path:
+        fd, path = tempfile.mkstemp(suffix=".docx")
+        os.close(fd)
+        started = time.perf_counter()
+        expected = generate_docx(path, args.faqs)
+        print(f"generated {args.faqs} FAQs in {time.perf_counter() - started:.1f}s")
+    try:
+        with zipfile.ZipFile(path) as archive:
+            xml_size = archive.getinfo("word/document.xml").file_size
+        print(f"file={path} size={os.path.getsize(path) / 1024 / 1024:.1f}MB document.xml={xml_size / 1024 / 1024:.1f}MB")
+        count = measure("stream", lambda: sum(1 for _ in iter_faq_records(path)))
+        if expected is not None and count != expected:
+            print(f"WARNING: expected {expected} records")
+        try:
+            import docx
+        except ImportError:
+            print("python-docx not installed: skipping the full-DOM comparison")
+        else:
+            measure("python-docx", lambda: len(docx.Document(path).paragraphs))
+    finally:
+        if not args.file:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Benchmark đăng nhập đồng thời: throughput /auth/login và độ trễ các request khác chạy cùng lúc.
+
+Hai chế độ:
+
+1. In-process (mặc định, không cần server / DB): so sánh bcrypt chạy trong threadpool chung
+   (cách cũ, giống anyio threadpool 40 luồng của route sync) với process pool riêng
+   (app.core.security). Song song có các "request khác" (việc nhỏ trong cùng threadpool) để đo
+   độ trễ của chúng khi có bão đăng nhập.
+
+    python benchmarks/login_throughput.py --logins 200 --concurrency 64
+
+2. Server đang chạy: gọi thật POST /auth/login + GET một endpoint khác, đo req/s và p99.
+
+    python benchmarks/login_throughput.py --url http://localhost:8000 \\
+        --email sv@tlu.edu.vn --password 123456 --other /api/v1/users/me --token <access token>
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))] if values else 0.0
+
+
+def report(name, logins, elapsed, other_latencies):
+    print(
+        f"{name:<14} logins/s={logins / elapsed:7.1f}  other requests: n={len(other_latencies)} "
+        f"p50={percentile(other_latencies, 50):.1f}ms p99={percentile(other_latencies, 99):.1f}ms"
+    )
+
+
+# --- IN-PROCESS ---
+async def _inprocess(verify, threadpool, args, password, hashed):
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    other_latencies = []
+    done = asyncio.Event()
+
+    async def login():
+        async with semaphore:
+            assert await verify(password, hashed)
+
+    async def other_requests():
+        # Route sync nhẹ (đọc DB / serialize) chạy trong cùng threadpool với route đăng nhập cũ
+        while not done.is_set():
+            started = time.perf_counter()
+            await loop.run_in_executor(threadpool, time.sleep, 0.001)
+            other_latencies.append((time.perf_counter() - started) * 1000)
+            await asyncio.sleep(0.005)
+
+    others = [asyncio.create_task(other_requests()) for _ in range(args.other_clients)]
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(args.logins)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await asyncio.gather(*others)
+    return elapsed, other_latencies
+
+
+def run_inprocess(args):
+    from app.core import security
+
+    password = "benchmark-password"
+    hashed = security._hash(password)
+    threadpool = ThreadPoolExecutor(max_workers=40)
+
+    async def threadpool_verify(plain, stored):
+        return await asyncio.get_running_loop().run_in_executor(threadpool, security._verify, plain, stored)
+
+    async def pool_verify(plain, stored):
+        valid, _ = await security.verify_and_update_password(plain, stored)
+        return valid
+
+    print(f"bcrypt rounds={security.settings.BCRYPT_ROUNDS} workers={security.settings.PASSWORD_HASH_WORKERS} logins={args.logins}")
+    for name, verify in (("threadpool", threadpool_verify), ("process pool", pool_verify)):
+        elapsed, other = asyncio.run(_inprocess(verify, threadpool, args, password, hashed))
+        report(name, args.logins, elapsed, other)
+    security.shutdown_password_hasher()
+    threadpool.shutdown()
+
+
+# --- SERVER ---
+def _request(url, data=None, token=None):
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    body = json.dumps(data).encode() if data is not None else None
+    with urllib.request.urlopen(urllib.request.Request(url, data=body, headers=headers), timeout=60) as response:
+        response.read()
+        return response.status
+
+
+def run_server(args):
+    login_url = f"{args.url}/api/v1/auth/login"
+    credentials = {"email": args.email, "password": args.password}
+    other_latencies = []
+    errors = []
+    done = threading.Event()
+
+    def other_requests():
+        while not done.is_set():
+            started = time.perf_counter()
+            try:
+                _request(f"{args.url}{args.other}", token=args.token)
+                other_latencies.append((time.perf_counter() - started) * 1000)
+            except Exception as e:
+                errors.append(e)
+            time.sleep(0.005)
+
+    def login(_):
+        try:
+            _request(login_url, credentials)
+        except Exception as e:
+            errors.append(e)
+
+    others = [threading.Thread(target=other_requests) for _ in range(args.other_clients)]
+    for thread in others:
+        thread.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(login, range(args.logins)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    for thread in others:
+        thread.join()
+    report("server", args.logins, elapsed, other_latencies)
+    if errors:
+        print(f"errors={len(errors)} (first: {errors[0]})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--other-clients", type=int, default=8)
+    parser.add_argument("--url", help="URL server; bỏ trống -> chế độ in-process")
+    parser.add_argument("--email")
+    parser.add_argument("--password")
+    parser.add_argument("--other", default="/", help="Endpoint đo độ trễ song song")
+    parser.add_argument("--token", help="Access token cho endpoint --other (nếu cần)")
+    args = parser.parse_args()
+    if args.url:
+        run_server(args)
+    else:
+        run_inprocess(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Benchmark phục vụ file upload: StaticFiles mặc định của Starlette vs MediaStaticFiles
+(ETag mạnh, Cache-Control immutable, 304, zero-copy).
+
+Script tự tạo thư mục static/uploads tạm với file nhỏ (ảnh chat) và file lớn, chạy hai server
+uvicorn (mỗi loại một process) rồi đo req/s, MB/s và p99 với nhiều client song song:
+- full: GET toàn bộ file
+- revalidate: GET kèm If-None-Match = ETag đã nhận (trình duyệt khi F5)
+
+    python benchmarks/media_throughput.py --requests 2000 --concurrency 32
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+SIZES = {"small": 64 * 1024, "large": 4 * 1024 * 1024}
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))] if values else 0.0
+
+
+def _serve(kind: str, directory: str, port: int) -> None:
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.routing import Mount
+    from starlette.staticfiles import StaticFiles
+
+    if kind == "media":
+        from app.utils.media_files import MediaStaticFiles
+        static = MediaStaticFiles(directory=directory)
+    else:
+        static = StaticFiles(directory=directory)
+    app = Starlette(routes=[Mount("/static", app=static)])
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+
+def _wait_ready(port: int, timeout: float = 20.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/static/")
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def _make_files(root: str, count: int) -> dict:
+    """static/uploads/bench/<uuid>.jpg cho mỗi kích thước -> {tên: [url]}"""
+    folder = os.path.join(root, "uploads", "bench")
+    os.makedirs(folder)
+    files = {}
+    for name, size in SIZES.items():
+        files[name] = []
+        for _ in range(count):
+            filename = f"{uuid.uuid4()}.jpg"
+            with open(os.path.join(folder, filename), "wb") as f:
+                f.write(os.urandom(size))
+            files[name].append(f"/static/uploads/bench/{filename}")
+    return files
+
+
+def _bench(port: int, urls: list, args, revalidate: bool):
+    local = threading.local()
+    etags = {}
+    latencies = []
+    received = [0]
+    lock = threading.Lock()
+
+    def connection():
+        if getattr(local, "conn", None) is None:
+            local.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        return local.conn
+
+    def fetch(url, headers):
+        conn = connection()
+        try:
+            conn.request("GET", url, headers=headers)
+            response = conn.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            local.conn = None
+            raise
+        return response, body
+
+    if revalidate:
+        for url in urls:
+            response, _ = fetch(url, {})
+            etags[url] = response.getheader("etag")
+
+    def one(i):
+        url = urls[i % len(urls)]
+        headers = {"If-None-Match": etags[url]} if revalidate else {}
+        started = time.perf_counter()
+        response, body = fetch(url, headers)
+        elapsed = (time.perf_counter() - started) * 1000
+        assert response.status in (200, 304), response.status
+        with lock:
+            latencies.append(elapsed)
+            received[0] += len(body)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(one, range(args.requests)))
+    elapsed = time.perf_counter() - started
+    return args.requests / elapsed, received[0] / elapsed / 1024 / 1024, percentile(latencies, 50), percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--files", type=int, default=20, help="Số file mỗi kích thước")
+    parser.add_argument("--port", type=int, default=8701)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="media-bench-")
+    ctx = multiprocessing.get_context("spawn")
+    servers = []
+    try:
+        files = _make_files(root, args.files)
+        ports = {"starlette": args.port, "media": args.port + 1}
+        for kind, port in ports.items():
+            process = ctx.Process(target=_serve, args=(kind, root, port), daemon=True)
+            process.start()
+            servers.append(process)
+        for port in ports.values():
+            _wait_ready(port)
+
+        print(f"requests={args.requests} concurrency={args.concurrency}")
+        for size_name, urls in files.items():
+            for mode in ("full", "revalidate"):
+                for kind, port in ports.items():
+                    rps, mbps, p50, p99 = _bench(port, urls, args, mode == "revalidate")
+                    print(
+                        f"{size_name:<6} {mode:<10} {kind:<10} req/s={rps:8.1f}  MB/s={mbps:8.1f}  "
+                        f"p50={p50:6.1f}ms p99={p99:6.1f}ms"
+                    )
+    finally:
+        for process in servers:
+            process.terminate()
+            process.join()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
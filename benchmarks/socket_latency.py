@@ -0,0 +1,82 @@
+"""
+Benchmark độ trễ sự kiện Socket.IO khi nhiều client gửi tin cùng lúc (p50 / p95 / p99).
+
+Mỗi client kết nối, join room hội thoại rồi gửi tin liên tục; độ trễ = từ lúc emit
+send_message tới lúc chính client đó nhận lại new_message của tin đó (đi qua DB + fan-out).
+Chạy với server đang bật, so sánh khi DB chậm (vd. thêm độ trễ mạng tới DB) để thấy
+độ trễ fan-out không phụ thuộc tốc độ DB.
+
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/socket_latency.py --url http://localhost:8000 \\
+        --token <admin access token> --conversation <conversation_id> --clients 50 --messages 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import socketio
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def run_client(args, latencies):
+    client = socketio.AsyncClient()
+    pending = {}
+
+    @client.on("new_message")
+    async def on_new_message(data):
+        sent_at = pending.pop(data.get("content"), None)
+        if sent_at is not None:
+            latencies.append((time.perf_counter() - sent_at) * 1000)
+
+    await client.connect(args.url, auth={"token": args.token}, socketio_path=args.path, transports=["websocket"])
+    await client.emit("join_room", {"room_id": args.conversation})
+    await asyncio.sleep(0.5)
+    for _ in range(args.messages):
+        content = f"bench {uuid.uuid4().hex}"
+        pending[content] = time.perf_counter()
+        await client.emit("send_message", {"conversation_id": args.conversation, "content": content})
+        await asyncio.sleep(args.interval)
+    # Chờ nhận nốt các tin còn lại
+    deadline = time.perf_counter() + args.timeout
+    while pending and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    await client.disconnect()
+    return len(pending)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--path", default="socket.io", help="socketio_path của server")
+    parser.add_argument("--token", required=True, help="Access token (Admin để gửi được vào mọi hội thoại)")
+    parser.add_argument("--conversation", required=True)
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=20, help="Số tin mỗi client")
+    # Mặc định khớp giới hạn SOCKET_MESSAGE_RATE (2 tin/giây mỗi kết nối), gửi nhanh hơn sẽ bị rate_limited
+    parser.add_argument("--interval", type=float, default=0.5, help="Giây giữa 2 tin của một client")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    args = parser.parse_args()
+
+    latencies = []
+    started = time.perf_counter()
+    lost = await asyncio.gather(*(run_client(args, latencies) for _ in range(args.clients)))
+    elapsed = time.perf_counter() - started
+
+    if not latencies:
+        print("No messages received")
+        return
+    print(f"clients={args.clients} messages={len(latencies)} lost={sum(lost)} elapsed={elapsed:.1f}s")
+    print(
+        f"latency ms: p50={percentile(latencies, 50):.1f} p95={percentile(latencies, 95):.1f} "
+        f"p99={percentile(latencies, 99):.1f} max={max(latencies):.1f} mean={statistics.mean(latencies):.1f}"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,155 @@
+"""
+Benchmark upload đồng thời: nhiều client upload file lớn vào /api/v1/chat/upload trong khi
+các client khác gọi một endpoint nhẹ, đo độ trễ của endpoint đó (event loop có bị chặn không).
+
+Body multipart được sinh theo từng chunk (không giữ cả file trong RAM phía client), mỗi upload
+có nội dung khác nhau để không bị gộp chung blob (UPLOAD_CONTENT_ADDRESSED).
+
+    python benchmarks/upload_latency.py --url http://localhost:8000 --token <access token> \\
+        --uploads 32 --concurrency 8 --size-mb 15 --other /
+
+Chạy một lần với code cũ (đọc cả file vào RAM + ghi đồng bộ) và một lần với code hiện tại để so sánh.
+"""
+import argparse
+import http.client
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))] if values else 0.0
+
+
+def _connection(url):
+    parts = urlsplit(url)
+    cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    return cls(parts.hostname, parts.port, timeout=300)
+
+
+def _multipart(size, boundary):
+    """(độ dài body, generator sinh body) cho một file text/plain `size` byte"""
+    head = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="type"\r\n\r\nfile\r\n'
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="bench-{boundary}.txt"\r\n'
+        f"Content-Type: text/plain\r\n\r\n"
+    ).encode()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+
+    def body():
+        yield head
+        # Chunk đầu chứa boundary (duy nhất) -> sha256 khác nhau giữa các upload
+        seed = (boundary.encode() * (CHUNK_SIZE // len(boundary) + 1))[:CHUNK_SIZE]
+        remaining = size
+        while remaining > 0:
+            n = min(CHUNK_SIZE, remaining)
+            yield seed[:n]
+            remaining -= n
+        yield tail
+
+    return len(head) + size + len(tail), body()
+
+
+def upload(args, size):
+    boundary = uuid.uuid4().hex
+    length, body = _multipart(size, boundary)
+    conn = _connection(args.url)
+    started = time.perf_counter()
+    try:
+        conn.request("POST", "/api/v1/chat/upload", body=body, headers={
+            "Authorization": f"Bearer {args.token}",
+            "Content-Type": f"multipart/form-data; boundary={boundary}",
+            "Content-Length": str(length),
+        })
+        response = conn.getresponse()
+        data = response.read()
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}: {data[:200]!r}")
+        json.loads(data)
+    finally:
+        conn.close()
+    return time.perf_counter() - started
+
+
+def run(args):
+    size = int(args.size_mb * 1024 * 1024)
+    other_latencies = []
+    upload_times = []
+    errors = []
+    done = threading.Event()
+
+    def other_requests():
+        conn = _connection(args.url)
+        while not done.is_set():
+            started = time.perf_counter()
+            try:
+                conn.request("GET", args.other)
+                conn.getresponse().read()
+                other_latencies.append((time.perf_counter() - started) * 1000)
+            except Exception as e:
+                errors.append(e)
+                conn.close()
+                conn = _connection(args.url)
+            time.sleep(0.01)
+        conn.close()
+
+    def one_upload(_):
+        try:
+            upload_times.append(upload(args, size))
+        except Exception as e:
+            errors.append(e)
+
+    # Mốc: độ trễ endpoint nhẹ khi không có upload
+    others = [threading.Thread(target=other_requests) for _ in range(args.other_clients)]
+    for thread in others:
+        thread.start()
+    time.sleep(args.baseline_seconds)
+    baseline = list(other_latencies)
+    other_latencies.clear()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(one_upload, range(args.uploads)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    for thread in others:
+        thread.join()
+
+    print(f"uploads={args.uploads} concurrency={args.concurrency} size={args.size_mb}MB")
+    print(
+        f"upload         total={elapsed:.1f}s  throughput={len(upload_times) * size / elapsed / 1024 / 1024:.1f}MB/s "
+        f"p50={percentile(upload_times, 50):.2f}s p99={percentile(upload_times, 99):.2f}s"
+    )
+    for name, values in (("other (idle)", baseline), ("other (upload)", other_latencies)):
+        print(
+            f"{name:<14} n={len(values)} p50={percentile(values, 50):.1f}ms "
+            f"p99={percentile(values, 99):.1f}ms max={max(values, default=0.0):.1f}ms"
+        )
+    if errors:
+        print(f"errors={len(errors)} (first: {errors[0]})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--token", required=True, help="Access token của user bất kỳ")
+    parser.add_argument("--uploads", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--size-mb", type=float, default=15, help="Phải nhỏ hơn UPLOAD_MAX_BYTES")
+    parser.add_argument("--other", default="/", help="Endpoint nhẹ đo độ trễ song song")
+    parser.add_argument("--other-clients", type=int, default=4)
+    parser.add_argument("--baseline-seconds", type=float, default=3.0)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
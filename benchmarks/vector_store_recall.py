@@ -0,0 +1,104 @@
+"""
+Benchmark vector store: recall@k và độ trễ của VectorStore.search (IVF với nhiều nprobe,
+quét toàn bộ) so với brute-force NumPy thuần (vectors @ q + argpartition).
+
+Dữ liệu sinh ngẫu nhiên: --clusters > 0 -> vector tụ quanh các tâm (giống embedding thật),
+--clusters 0 -> phân bố đều (trường hợp xấu nhất cho IVF).
+
+    python benchmarks/vector_store_recall.py --n 20000 --dim 384 --clusters 200
+    python benchmarks/vector_store_recall.py --n 20000 --dim 64 --clusters 0
+    python benchmarks/vector_store_recall.py --n 200000 --dim 384 --nprobe 8 16 32
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def make_data(n, dim, clusters, queries, seed=0):
+    rng = np.random.default_rng(seed)
+    if clusters:
+        centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+        labels = rng.integers(clusters, size=n + queries)
+        data = centers[labels] + 0.35 * rng.standard_normal((n + queries, dim)).astype(np.float32)
+    else:
+        data = rng.standard_normal((n + queries, dim)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    return data[:n], data[n:]
+
+
+def brute_force(vectors, query, k):
+    scores = vectors @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def measure(search, queries, truth, k):
+    latencies, recall = [], 0.0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        found = search(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+        recall += len(set(found) & expected) / k
+    latencies.sort()
+    return recall / len(queries), latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200, help="0 = dữ liệu phân bố đều")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--delta", type=int, default=0, help="Số vector để lại trong delta (chưa compact)")
+    args = parser.parse_args()
+
+    from app.rag.vector_store import VectorStore
+
+    vectors, queries = make_data(args.n, args.dim, args.clusters, args.queries)
+    truth = [set(int(i) for i in brute_force(vectors, q, args.k)) for q in queries]
+
+    path = tempfile.mkdtemp(prefix="vector-bench-")
+    try:
+        store = VectorStore(path, args.dim, compact_threshold=10 ** 12)
+        base_n = args.n - args.delta
+        started = time.perf_counter()
+        store.add([str(i) for i in range(base_n)], vectors[:base_n])
+        store.compact()
+        compact_seconds = time.perf_counter() - started
+        if args.delta:
+            store.add([str(i) for i in range(base_n, args.n)], vectors[base_n:])
+        ivf = f"nlist={len(store._centroids)}" if store._centroids is not None else "off"
+        print(f"n={args.n} dim={args.dim} clusters={args.clusters} k={args.k} delta={args.delta} "
+              f"ivf={ivf} compact={compact_seconds:.1f}s")
+
+        def store_search(nprobe):
+            return lambda q: [int(hit.id) for hit in store.search(q, k=args.k, nprobe=nprobe)]
+
+        rows = [("numpy brute-force", lambda q: [int(i) for i in brute_force(vectors, q, args.k)])]
+        if store._centroids is not None:
+            store.exact_threshold = 0
+            for nprobe in args.nprobe:
+                rows.append((f"ivf nprobe={nprobe}", store_search(nprobe)))
+        for name, search in rows:
+            recall, p50, p99 = measure(search, queries, truth, args.k)
+            print(f"{name:<20} recall@{args.k}={recall:.3f}  p50={p50:.2f}ms p99={p99:.2f}ms")
+
+        # Quét toàn bộ qua VectorStore (mặc định khi base < VECTOR_STORE_EXACT_THRESHOLD)
+        store.exact_threshold = args.n + 1
+        recall, p50, p99 = measure(store_search(None), queries, truth, args.k)
+        print(f"{'store exact':<20} recall@{args.k}={recall:.3f}  p50={p50:.2f}ms p99={p99:.2f}ms")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
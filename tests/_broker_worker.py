@@ -0,0 +1,32 @@
+"""Worker Socket.IO tối giản dùng LocalPubSubManager (tiến trình con của test_socket_broker)"""
+import sys
+
+import socketio
+import uvicorn
+
+from app.sockets.broker import LocalPubSubManager
+from app.sockets.pubsub import change_access
+
+path, port = sys.argv[1], int(sys.argv[2])
+sio = socketio.AsyncServer(async_mode="asgi", client_manager=LocalPubSubManager(f"unix://{path}"))
+
+
+@sio.on("connect")
+async def connect(sid, environ, auth=None):
+    await sio.enter_room(sid, "room")
+    if auth and auth.get("user"):
+        await sio.enter_room(sid, f"user_{auth['user']}")
+
+
+@sio.on("broadcast")
+async def broadcast(sid, data):
+    await sio.emit("delivered", data, room="room")
+
+
+@sio.on("revoke")
+async def revoke(sid, data):
+    await change_access(sio, data["user"], "room", revoked=True)
+    return True
+
+
+uvicorn.run(socketio.ASGIApp(sio), host="127.0.0.1", port=port, log_level="warning")
@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# Test không cần Postgres: app.core.config / app.database.session đọc DATABASE_URL lúc import
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='chatbot-tests-'), 'test.db')}")
@@ -0,0 +1,63 @@
+"""Đổi trạng thái / người phụ trách hội thoại: mỗi chuyển đổi chỉ được cộng vào gauge Dashboard một lần"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+
+@pytest.fixture
+def conversation_id():
+    import app.models  # noqa: F401
+    from app.database.base import Base
+    from app.database.session import SessionLocal, engine
+    from app.models.chat import Conversation
+    from app.shared.enums import ChatStatus
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        conversation = Conversation(student_id="student-1", status=ChatStatus.PENDING_AGENT)
+        db.add(conversation)
+        db.commit()
+        yield conversation.id
+        db.delete(conversation)
+        db.commit()
+
+
+def test_transition_rereads_after_concurrent_change(conversation_id, monkeypatch):
+    from sqlalchemy import update
+
+    from app.database.session import AsyncSessionLocal
+    from app.models.chat import Conversation
+    from app.services import chat_service
+    from app.shared.enums import ChatStatus
+
+    recorded = []
+    monkeypatch.setattr(chat_service.dashboard_metrics, "record_transition", lambda *args: recorded.append(args))
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            execute = db.execute
+            calls = []
+
+            async def racing_execute(statement, *args, **kwargs):
+                result = await execute(statement, *args, **kwargs)
+                calls.append(statement)
+                if len(calls) == 1:
+                    # Admin khác gán agent-2 ngay sau khi request này đọc trạng thái cũ
+                    async with AsyncSessionLocal() as other:
+                        await other.execute(
+                            update(Conversation).where(Conversation.id == conversation_id)
+                            .values(status=ChatStatus.AGENT_PROCESSING, agent_id="agent-2")
+                        )
+                        await other.commit()
+                return result
+
+            db.execute = racing_execute
+            return await chat_service.AsyncChatService(db).update_status(conversation_id, ChatStatus.CLOSED)
+
+    conversation = asyncio.run(scenario())
+    assert conversation.status == ChatStatus.CLOSED
+    assert conversation.agent_id == "agent-2"
+    # Chỉ ghi một chuyển đổi, tính từ trạng thái đọc lại sau khi UPDATE có điều kiện thất bại
+    assert recorded == [(ChatStatus.AGENT_PROCESSING, ChatStatus.CLOSED, "agent-2", "agent-2")]
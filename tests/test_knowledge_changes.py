@@ -0,0 +1,36 @@
+"""/knowledge/changes: người dùng thường không nhận tombstone của bài nháp chưa từng xuất bản"""
+import pytest
+
+pytest.importorskip("fastapi")
+
+
+@pytest.fixture
+def db():
+    import app.models  # noqa: F401
+    from app.database.base import Base
+    from app.database.session import SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as session:
+        yield session
+
+
+def test_changes_hide_never_published_articles(db):
+    from app.schemas.rag_schema import KnowledgeArticleCreate, KnowledgeArticleUpdate
+    from app.services.knowledge_service import KnowledgeService
+    from app.shared.enums import ArticleStatus
+
+    service = KnowledgeService(db)
+    since = service.get_changes(0, 1000, include_unpublished=True).version
+    draft = service.create_article(KnowledgeArticleCreate(title="Nháp", content="..."))
+    published = service.create_article(KnowledgeArticleCreate(title="Học phí", content="...", status=ArticleStatus.PUBLISHED))
+    service.delete_article(draft.id)
+    service.update_article(published.id, KnowledgeArticleUpdate(status=ArticleStatus.DRAFT))
+
+    changes = service.get_changes(since, 1000)
+    assert [(item.id, item.deleted) for item in changes.items] == [(published.id, True)]
+    # version vẫn vượt qua các bài bị bỏ qua
+    assert changes.version == service.get_changes(since, 1000, include_unpublished=True).version
+
+    admin = service.get_changes(since, 1000, include_unpublished=True)
+    assert {item.id for item in admin.items} == {draft.id, published.id}
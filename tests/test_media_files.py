@@ -0,0 +1,66 @@
+"""MediaStaticFiles: ảnh phái sinh tạo lazy không được đọc / ghi ra ngoài static/uploads"""
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip("starlette")
+Image = pytest.importorskip("PIL.Image")
+
+
+def _request(app, path: str) -> int:
+    scope = {
+        "type": "http", "method": "GET", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": [], "scheme": "http", "server": ("test", 80),
+    }
+    status = {}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+
+    asyncio.run(app(scope, receive, send))
+    return status["code"]
+
+
+@pytest.fixture
+def static_app(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from app.services.file_service import shutdown_image_pool
+    from app.utils.media_files import MediaStaticFiles
+
+    os.makedirs("static/uploads/chat", exist_ok=True)
+    os.makedirs("outside", exist_ok=True)
+    Image.new("RGB", (200, 200), "red").save("static/uploads/chat/photo.jpg")
+    Image.new("RGB", (200, 200), "blue").save("outside/secret.jpg")
+    from starlette.applications import Starlette
+    from starlette.routing import Mount
+
+    static = MediaStaticFiles(directory="static")
+    yield Starlette(routes=[Mount("/static", app=static, name="static")]), static
+    shutdown_image_pool()
+
+
+def test_derivative_path_traversal_is_rejected(static_app):
+    app, _ = static_app
+    assert _request(app, "/static/../outside/_d/thumb/secret.jpg.webp") == 404
+    assert _request(app, "/static/uploads/../../outside/_d/thumb/secret.jpg.webp") == 404
+    assert not os.path.exists("outside/_d")
+
+
+def test_derivative_outside_uploads_is_rejected(static_app):
+    from app.services.file_service import FileService
+
+    _, static = static_app
+    ok = asyncio.run(FileService().ensure_derivative("outside/_d/thumb/secret.jpg.webp", root=static.uploads_dir))
+    assert not ok
+    assert not os.path.exists("outside/_d")
+
+
+def test_missing_derivative_is_generated(static_app):
+    app, _ = static_app
+    assert _request(app, "/static/uploads/chat/_d/thumb/photo.jpg.webp") == 200
+    assert os.path.exists("static/uploads/chat/_d/thumb/photo.jpg.webp")
@@ -0,0 +1,44 @@
+"""SemanticCache.lookup: validate (nạp lại vector store) chạy ngoài lock"""
+import numpy as np
+import pytest
+
+pytest.importorskip("pydantic_settings")
+
+
+def _cache():
+    from app.rag.semantic_cache import SemanticCache
+
+    return SemanticCache(dim=4, maxsize=4, ttl=60, threshold=0.9)
+
+
+VECTOR = np.array([1, 0, 0, 0], dtype=np.float32)
+
+
+def test_validate_runs_without_the_lock():
+    cache = _cache()
+    cache.put(VECTOR, "q", "a", {"doc:1": "f"})
+
+    def validate(sources):
+        # put / lookup khác không bị chặn trong lúc validate
+        assert cache._lock.acquire(blocking=False)
+        cache._lock.release()
+        return True
+
+    hit = cache.lookup(VECTOR, validate=validate)
+    assert hit is not None and hit.answer == "a"
+    assert cache.hits == 1
+
+
+def test_stale_entry_replaced_during_validate_is_kept():
+    cache = _cache()
+    cache.put(VECTOR, "q", "old", {"doc:1": "f"})
+
+    def validate(sources):
+        # Worker khác vừa sửa bài viết: entry cũ bị gỡ và slot được dùng cho câu trả lời mới
+        cache.invalidate_documents(["doc"])
+        cache.put(VECTOR, "q", "new", {"doc:1": "g"})
+        return False
+
+    assert cache.lookup(VECTOR, validate=validate) is None
+    assert len(cache) == 1
+    assert cache.lookup(VECTOR).answer == "new"
@@ -0,0 +1,29 @@
+"""Socket.IO: tài khoản bị khóa sau khi kết nối không dùng tiếp được session cũ"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("socketio")
+pytest.importorskip("aiosqlite")
+
+
+def test_deactivated_user_is_rejected_on_next_event(monkeypatch):
+    from app.core.principal_cache import Principal, invalidate_principal, principal_cache
+    from app.shared.enums import UserRole
+    from app.sockets import events
+
+    principal = Principal(id="u-1", role=UserRole.STUDENT, is_active=True)
+
+    async def get_session(sid):
+        return {"principal": principal}
+
+    monkeypatch.setattr(events.sio, "get_session", get_session)
+    try:
+        principal_cache.set(principal.id, principal)
+        assert asyncio.run(events._get_principal("sid-1")) == principal
+
+        # Tài khoản bị khóa sau khi kết nối: session của socket vẫn giữ principal cũ (is_active=True)
+        principal_cache.set(principal.id, Principal(id=principal.id, role=principal.role, is_active=False))
+        assert asyncio.run(events._get_principal("sid-1")) is None
+    finally:
+        invalidate_principal(principal.id)
@@ -0,0 +1,144 @@
+"""
+Kiểm tra LocalPubSubManager với nhiều tiến trình thật:
+- emit ở worker A tới được client đang kết nối worker B
+- worker giữ broker chết -> worker còn lại tự bầu làm broker, worker mới vẫn nhận được
+- rút quyền một user ở worker A -> kết nối của user đó trên worker B rời room
+"""
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import uuid
+
+import pytest
+
+socketio = pytest.importorskip("socketio")
+pytest.importorskip("uvicorn")
+pytest.importorskip("aiohttp")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKER = os.path.join(ROOT, "tests", "_broker_worker.py")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_worker(path: str) -> tuple:
+    port = _free_port()
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    return subprocess.Popen([sys.executable, WORKER, path, str(port)], cwd=ROOT, env=env), port
+
+
+async def _connect(port: int, timeout: float = 15.0, user: str = None):
+    client = socketio.AsyncClient()
+    received: asyncio.Queue = asyncio.Queue()
+    client.on("delivered", received.put_nowait)
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        try:
+            await client.connect(f"http://127.0.0.1:{port}", transports=["websocket"], auth={"user": user} if user else None)
+            return client, received
+        except socketio.exceptions.ConnectionError:
+            if asyncio.get_running_loop().time() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+async def _delivered(sender, received: asyncio.Queue, timeout: float = 10.0) -> bool:
+    """Emit lặp lại tới khi phía nhận thấy (subscriber của worker mới có thể chưa kịp nối broker)"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        nonce = uuid.uuid4().hex
+        await sender.emit("broadcast", {"nonce": nonce})
+        try:
+            while True:
+                data = await asyncio.wait_for(received.get(), timeout=0.3)
+                if data.get("nonce") == nonce:
+                    return True
+        except asyncio.TimeoutError:
+            continue
+    return False
+
+
+def test_cross_worker_delivery_and_reelection(tmp_path):
+    path = str(tmp_path / "broker.sock")
+    workers = []
+
+    async def scenario():
+        # A khởi tạo manager đầu tiên -> A giữ lock và chạy broker
+        worker_a, port_a = _start_worker(path)
+        workers.append(worker_a)
+        client_a, received_a = await _connect(port_a)
+        for _ in range(100):
+            if os.path.exists(path):
+                break
+            await asyncio.sleep(0.1)
+        assert os.path.exists(path), "worker A did not start the broker"
+        worker_b, port_b = _start_worker(path)
+        workers.append(worker_b)
+        client_b, received_b = await _connect(port_b)
+
+        assert await _delivered(client_a, received_b), "A -> B not delivered"
+        assert await _delivered(client_b, received_a), "B -> A not delivered"
+
+        # Worker giữ broker chết đột ngột (không dọn file socket / lock)
+        worker_a.send_signal(signal.SIGKILL)
+        worker_a.wait()
+        await client_a.disconnect()
+
+        worker_c, port_c = _start_worker(path)
+        workers.append(worker_c)
+        client_c, received_c = await _connect(port_c)
+        assert await _delivered(client_b, received_c, timeout=15.0), "B -> C not delivered after re-election"
+        assert await _delivered(client_c, received_b), "C -> B not delivered after re-election"
+
+        await client_b.disconnect()
+        await client_c.disconnect()
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        _stop(workers)
+
+
+def _stop(workers) -> None:
+    for worker in workers:
+        if worker.poll() is None:
+            worker.terminate()
+            worker.wait(timeout=10)
+
+
+def test_revoke_room_across_workers(tmp_path):
+    path = str(tmp_path / "broker.sock")
+    workers = []
+
+    async def scenario():
+        worker_a, port_a = _start_worker(path)
+        workers.append(worker_a)
+        client_a, received_a = await _connect(port_a)
+        worker_b, port_b = _start_worker(path)
+        workers.append(worker_b)
+        client_b, received_b = await _connect(port_b, user="agent-1")
+        client_other, received_other = await _connect(port_b, user="agent-2")
+        assert await _delivered(client_a, received_b), "A -> B not delivered"
+
+        assert await client_a.call("revoke", {"user": "agent-1"})
+        # Người còn quyền vẫn nhận; agent-1 không còn nhận tin của room
+        assert await _delivered(client_a, received_other), "revoke removed the wrong user"
+        await asyncio.sleep(0.5)
+        while not received_b.empty():
+            received_b.get_nowait()
+        assert not await _delivered(client_a, received_b, timeout=2.0), "revoked user still receives room events"
+
+        for client in (client_a, client_b, client_other):
+            await client.disconnect()
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        _stop(workers)
@@ -0,0 +1,53 @@
+"""TrainingMiner._save_candidates: hai cụm khớp cùng một candidate NEW không ghi đè lên nhau"""
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+
+class _Embedder:
+    dim = 2
+
+    def embed_batch(self, texts):
+        return np.tile(np.array([1.0, 0.0], dtype=np.float32), (len(texts), 1))
+
+
+def test_clusters_matching_the_same_candidate(monkeypatch):
+    import app.models  # noqa: F401
+    from app.database.base import Base
+    from app.database.session import SessionLocal, engine
+    from app.models.training import AITrainingCandidate
+    from app.services import training_miner
+    from app.shared.enums import TrainingStatus
+
+    monkeypatch.setattr(training_miner, "get_embedding_service", lambda: _Embedder())
+    monkeypatch.setattr(training_miner.TrainingMiner, "_coverage", lambda self, centroids: np.zeros(len(centroids)))
+    Base.metadata.create_all(bind=engine)
+
+    with SessionLocal() as db:
+        db.query(AITrainingCandidate).delete()
+        db.add(AITrainingCandidate(question="Học phí đóng khi nào?", status=TrainingStatus.NEW))
+        db.commit()
+
+        miner = training_miner.TrainingMiner(db)
+        miner.threshold = 0.9
+        now = time.time()
+        clusterer = SimpleNamespace(
+            centroids=np.array([[1.0, 0.0], [0.95, 0.31]], dtype=np.float32),
+            weights=np.array([10, 4]),
+            best_idx=np.array([0, 1]),
+            first_seen=np.array([now, now]),
+            last_seen=np.array([now, now])
+        )
+        questions = [SimpleNamespace(text="Khi nào đóng học phí?"), SimpleNamespace(text="Hạn đóng học phí kỳ này?")]
+        stats = training_miner.MiningStats()
+        miner._save_candidates(clusterer, np.array([0, 1]), questions, {}, stats)
+
+        assert (stats.updated, stats.created) == (1, 1)
+        rows = {c.question: c.frequency for c in db.query(AITrainingCandidate).all()}
+        assert rows == {"Khi nào đóng học phí?": 10, "Hạn đóng học phí kỳ này?": 4}
+        db.query(AITrainingCandidate).delete()
+        db.commit()